@@ -0,0 +1,104 @@
+"""
+Micro-benchmark das etapas de decodificação de uma imagem enviada para análise.
+
+Compara o caminho antigo (base64 -> PIL -> np.array -> cvtColor, e imdecode
+em BGR seguido de cvtColor no upload) com src/services/image_decode.py
+(imdecode direto para RGB, reduzido quando a foto é maior que POSTURE_MAX_SIDE),
+e mostra o tamanho do que é enviado ao pool de inferência em cada caso.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_decode.py --image ../frontend/assets/postura.jpg --upscale 4032
+"""
+import os
+import io
+import sys
+import time
+import base64
+import pickle
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from src.services.image_decode import MAX_SIDE, data_from_base64, image_size, decode_image
+
+
+def timed(func, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        value = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help='foto a decodificar')
+    parser.add_argument('--upscale', type=int, default=0, help='amplia a foto até este maior lado (px)')
+    parser.add_argument('--max-side', type=int, default=MAX_SIDE, help='POSTURE_MAX_SIDE usado na decodificação')
+    parser.add_argument('--quality', type=int, default=92, help='qualidade JPEG da foto ampliada')
+    parser.add_argument('--repeats', type=int, default=20, help='execuções por etapa')
+    args = parser.parse_args()
+
+    data = open(args.image, 'rb').read()
+    if args.upscale:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        scale = args.upscale / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        data = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), args.quality])[1].tobytes()
+    image_base64 = 'data:image/jpeg;base64,' + base64.b64encode(data).decode()
+    width, height = image_size(data)
+    print(f"Imagem {width}x{height}, {len(data) / 1024:.0f} KiB, max_side={args.max_side}\n")
+
+    rows = []
+    ms, _ = timed(lambda: data_from_base64(image_base64), args.repeats)
+    rows.append(('base64 -> bytes', ms))
+    ms, _ = timed(lambda: image_size(data), args.repeats)
+    rows.append(('dimensões pelo cabeçalho', ms))
+
+    try:
+        from PIL import Image
+
+        def pil_path():
+            pil_image = Image.open(io.BytesIO(data))
+            return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+        ms, _ = timed(pil_path, args.repeats)
+        rows.append(('antigo: PIL + np.array + cvtColor', ms))
+    except ImportError:
+        pass
+
+    def imdecode_bgr():
+        bgr = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    ms, full_rgb = timed(imdecode_bgr, args.repeats)
+    rows.append(('antigo: imdecode BGR + cvtColor', ms))
+
+    ms, _ = timed(lambda: decode_image(data, 0), args.repeats)
+    rows.append(('novo: imdecode RGB', ms))
+    ms, decoded = timed(lambda: decode_image(data, args.max_side), args.repeats)
+    rows.append((f'novo: imdecode RGB reduzido ({decoded.rgb.shape[1]}x{decoded.rgb.shape[0]})', ms))
+
+    def resize(rgb):
+        scale = args.max_side / max(rgb.shape[:2])
+        if scale >= 1:
+            return rgb
+        return cv2.resize(rgb, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ms, _ = timed(lambda: resize(full_rgb), args.repeats)
+    rows.append(('redução até max_side (imagem cheia)', ms))
+    ms, _ = timed(lambda: resize(decoded.rgb), args.repeats)
+    rows.append(('redução até max_side (já reduzida)', ms))
+
+    print(f"{'etapa':<52} {'ms':>9}")
+    for name, ms in rows:
+        print(f"{name:<52} {ms:>9.2f}")
+
+    print(f"\nEnviado ao pool de inferência: imagem decodificada {len(pickle.dumps(full_rgb)) / 1e6:.1f} MB, "
+          f"bytes do arquivo {len(pickle.dumps(data)) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
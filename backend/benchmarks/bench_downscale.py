@@ -0,0 +1,95 @@
+"""
+Benchmark da redução da imagem antes da inferência (POSTURE_MAX_SIDE).
+
+Analisa a mesma foto com vários limites para o maior lado e compara a
+latência de analyze_posture e o desvio das métricas em pixels em relação
+à análise em resolução cheia. Com --upscale, a foto é ampliada antes para
+simular uma foto de celular (ex.: 4032 px = 12MP em 4:3).
+
+Uso (a partir de backend/):
+    python benchmarks/bench_downscale.py --image ../frontend/assets/postura.jpg --upscale 4032
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+
+from src.services.posture_analysis_v2 import PostureAnalyzerV2
+
+METRICS = ['head_forward_distance', 'shoulder_height_difference', 'hip_height_difference',
+           'trunk_rotation_offset', 'overall_posture_score']
+VISIBILITY = 0.5
+
+
+def analyze(analyzer, image, max_side: int, quality: str, repeats: int):
+    analyzer.max_side = max_side
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = analyzer.analyze_posture(image, quality=quality)
+        timings.append((time.perf_counter() - started) * 1000)
+        if 'error' in result:
+            raise SystemExit(f"max_side={max_side}: {result['error']}")
+    return statistics.median(timings), result
+
+
+def landmark_drift(reference, result, width: int, height: int) -> float:
+    """
+    Deslocamento médio (px na imagem original) dos landmarks em relação à
+    referência, considerando só os visíveis nela: pontos fora do quadro são
+    estimados pelo modelo e variam mesmo sem redução da imagem.
+    """
+    visible = [lm['visibility'] >= VISIBILITY for lm in reference['landmarks']]
+    a = np.array([(lm['x'] * width, lm['y'] * height) for lm in reference['landmarks']])[visible]
+    b = np.array([(lm['x'] * width, lm['y'] * height) for lm in result['landmarks']])[visible]
+    return float(np.linalg.norm(a - b, axis=1).mean()) if len(a) else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help='foto com uma pessoa de corpo inteiro')
+    parser.add_argument('--upscale', type=int, default=0, help='amplia a foto até este maior lado (px)')
+    parser.add_argument('--sizes', default='1920,1280,960,640,480', help='limites do maior lado a medir')
+    parser.add_argument('--quality', default='accurate', help='fast, balanced ou accurate')
+    parser.add_argument('--repeats', type=int, default=5, help='execuções por tamanho')
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Não foi possível ler {args.image}")
+    if args.upscale:
+        scale = args.upscale / max(image.shape[:2])
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    height, width = image.shape[:2]
+    print(f"Imagem {width}x{height} ({width * height / 1e6:.1f} MP), qualidade {args.quality}\n")
+
+    analyzer = PostureAnalyzerV2()
+    analyzer.result_cache = None
+    # Aquecimento: carrega o modelo e estabiliza os caches do OpenCV
+    analyze(analyzer, image, 0, args.quality, 1)
+
+    base_ms, reference = analyze(analyzer, image, 0, args.quality, args.repeats)
+    rows = [('original', base_ms, reference)]
+    for size in (int(s) for s in args.sizes.split(',') if s):
+        if size < max(height, width):
+            rows.append((str(size),) + analyze(analyzer, image, size, args.quality, args.repeats))
+
+    header = f"{'maior lado':>10} {'ms':>9} {'ganho':>7} {'landmarks (px)':>15}"
+    header += ''.join(f" {name[:18]:>19}" for name in METRICS)
+    print(header)
+    for label, elapsed, result in rows:
+        line = f"{label:>10} {elapsed:>9.1f} {base_ms / elapsed:>6.1f}x {landmark_drift(reference, result, width, height):>15.2f}"
+        for name in METRICS:
+            drift = result['metrics'][name] - reference['metrics'][name]
+            line += f" {result['metrics'][name]:>10.2f} ({drift:+6.2f})"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark das consultas por chave estrangeira antes e depois da migração de índices.
+
+Gera um banco SQLite temporário com o esquema dos modelos, sem os índices
+da migração 1, mede as consultas mais usadas pelas rotas, aplica as
+migrações e mede novamente.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_indexes.py --rows 500000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+from src.models.user import db
+from src.models.migrations import MIGRATIONS, apply_migrations
+
+QUERIES = {
+    'avaliacoes do estudante (página)':
+        'SELECT * FROM avaliacao_postural WHERE id_estudante = :estudante AND id > 0 ORDER BY id LIMIT 100',
+    'sessoes do estudante (estatísticas)':
+        'SELECT COUNT(*), SUM(duracao_minutos) FROM sessao_rv WHERE id_estudante = :estudante',
+    'estudante do usuário':
+        'SELECT * FROM estudante WHERE id_usuario = :usuario LIMIT 1',
+    'estudantes da escola':
+        'SELECT id FROM estudante WHERE escola_id = :escola',
+    'histórico de análises (/history)':
+        'SELECT id, score_geral FROM avaliacao WHERE usuario_id = :usuario ORDER BY data_criacao DESC',
+}
+
+
+def populate(engine, rows: int, seed: int = 42):
+    rng = random.Random(seed)
+    num_users = max(10, rows // 100)
+    num_schools = max(1, rows // 5000)
+    num_students = max(10, rows // 10)
+    start = datetime(2023, 1, 1)
+
+    def moment():
+        return (start + timedelta(minutes=rng.randrange(1_000_000))).isoformat(sep=' ')
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.executemany(
+            'INSERT INTO user (id, nome, email, senha_hash, tipo_usuario) VALUES (?, ?, ?, ?, ?)',
+            [(i, f'usuario {i}', f'u{i}@exemplo.com', '-', 'estudante') for i in range(1, num_users + 1)]
+        )
+        cur.executemany(
+            'INSERT INTO escola (id, nome) VALUES (?, ?)',
+            [(i, f'escola {i}') for i in range(1, num_schools + 1)]
+        )
+        cur.executemany(
+            'INSERT INTO estudante (id, id_usuario, nome, escola_id) VALUES (?, ?, ?, ?)',
+            [(i, rng.randint(1, num_users), f'estudante {i}', rng.randint(1, num_schools))
+             for i in range(1, num_students + 1)]
+        )
+        cur.executemany(
+            'INSERT INTO avaliacao_postural (id_estudante, data_avaliacao, dados_alinhamento_json) VALUES (?, ?, ?)',
+            ((rng.randint(1, num_students), moment(), '{}') for _ in range(rows))
+        )
+        cur.executemany(
+            'INSERT INTO sessao_rv (id_estudante, data_sessao, tipo_sessao, duracao_minutos, pontuacao) '
+            'VALUES (?, ?, ?, ?, ?)',
+            ((rng.randint(1, num_students), moment(), rng.choice(['jogo', 'alongamento']),
+              rng.randint(5, 60), rng.randint(0, 100)) for _ in range(rows))
+        )
+        cur.executemany(
+            'INSERT INTO avaliacao (usuario_id, estudante_id, data_criacao, score_geral) VALUES (?, ?, ?, ?)',
+            ((rng.randint(1, num_users), rng.randint(1, num_students), moment(), rng.uniform(0, 100))
+             for _ in range(rows))
+        )
+        raw.commit()
+    finally:
+        raw.close()
+    return num_users, num_schools, num_students
+
+
+def drop_migration_indexes(engine):
+    with engine.begin() as conn:
+        for _, _, statements in MIGRATIONS:
+            for statement in statements:
+                # Passos em Python (ex.: add_column) não criam índices
+                if isinstance(statement, str) and statement.startswith('CREATE INDEX IF NOT EXISTS '):
+                    name = statement.split()[5]
+                    conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+
+def measure(engine, sizes, repeats: int, seed: int = 7):
+    num_users, num_schools, num_students = sizes
+    rng = random.Random(seed)
+    params = [{'usuario': rng.randint(1, num_users), 'escola': rng.randint(1, num_schools),
+               'estudante': rng.randint(1, num_students)} for _ in range(repeats)]
+    timings = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            statement = text(sql)
+            started = time.perf_counter()
+            for p in params:
+                conn.execute(statement, {k: v for k, v in p.items() if f':{k}' in sql}).fetchall()
+            timings[name] = (time.perf_counter() - started) / repeats * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500_000, help='linhas por tabela de avaliações/sessões')
+    parser.add_argument('--repeats', type=int, default=50, help='execuções de cada consulta')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine)
+        drop_migration_indexes(engine)
+
+        started = time.perf_counter()
+        sizes = populate(engine, args.rows)
+        print(f"{args.rows} linhas por tabela geradas em {time.perf_counter() - started:.1f}s")
+
+        before = measure(engine, sizes, args.repeats)
+        started = time.perf_counter()
+        apply_migrations(engine)
+        print(f"Migrações aplicadas em {time.perf_counter() - started:.1f}s\n")
+        after = measure(engine, sizes, args.repeats)
+
+        print(f"{'consulta':<40} {'antes (ms)':>12} {'depois (ms)':>12} {'ganho':>8}")
+        for name in QUERIES:
+            print(f"{name:<40} {before[name]:>12.3f} {after[name]:>12.3f} {before[name] / after[name]:>7.0f}x")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark da gravação dos landmarks.
+
+Compara a lista de dicts em JSON (formato usado antes de avaliacao.landmarks_bin)
+com as codificações binárias de src/services/landmarks.py: tamanho por
+esqueleto, tempo para decodificar todos um por vez e em lote (decode_batch),
+e o erro máximo de cada codificação em relação ao array original.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_landmark_codec.py --count 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.services import landmarks as lm
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=20000, help='número de esqueletos')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    skeletons = rng.uniform(0, 1, (args.count, lm.NUM_LANDMARKS, 4)).astype(np.float32)
+    skeletons[:, :, lm.Z] = rng.normal(0, 0.3, (args.count, lm.NUM_LANDMARKS))
+
+    payloads = [json.dumps(lm.to_dicts(skeleton)) for skeleton in skeletons]
+    _, decode_ms = timed(lambda: [lm.from_dicts(json.loads(payload)) for payload in payloads])
+    size = sum(len(payload.encode()) for payload in payloads) / args.count
+    print(f"{args.count} esqueletos")
+    print(f"{'formato':<8} {'bytes':>8} {'um por vez':>12} {'em lote':>10} {'erro máx.':>10}")
+    print(f"{'json':<8} {size:>8.0f} {decode_ms:>9.1f} ms {'-':>10} {0:>10.2g}")
+
+    for encoding in lm.ENCODINGS:
+        payloads = [lm.encode_landmarks(skeleton, encoding) for skeleton in skeletons]
+        _, single_ms = timed(lambda: [lm.decode_landmarks(payload) for payload in payloads])
+        decoded, batch_ms = timed(lambda: lm.decode_batch(payloads))
+        error = float(np.max(np.abs(decoded - skeletons)))
+        print(f"{encoding:<8} {len(payloads[0]):>8} {single_ms:>9.1f} ms {batch_ms:>7.1f} ms {error:>10.2g}")
+
+
+if __name__ == '__main__':
+    main()
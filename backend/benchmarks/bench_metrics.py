@@ -0,0 +1,144 @@
+"""
+Benchmark do cálculo das métricas posturais.
+
+Compara o cálculo original, feito ponto a ponto sobre a lista de landmarks
+(getattr em PoseLandmark, get_coords e np.array a cada ângulo), com
+compute_metrics de src/services/posture_metrics.py aplicado ao lote inteiro.
+Confere que cada esqueleto calculado sozinho dá exatamente o mesmo valor que
+no lote e mostra a diferença de arredondamento em relação ao cálculo original.
+Os esqueletos são gerados a partir de uma pose em pé com ruído aleatório,
+com dimensões de imagem variadas.
+
+Uso (a partir de backend/):
+    python benchmarks/bench_metrics.py --count 10000
+"""
+import os
+import sys
+import math
+import time
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from src.services import landmarks as lm
+from src.services.posture_metrics import compute_metrics
+
+# Pose em pé, de frente (x, y normalizados) dos landmarks usados nas métricas
+STANDING = {
+    lm.NOSE: (0.50, 0.12), lm.LEFT_EAR: (0.53, 0.11), lm.RIGHT_EAR: (0.47, 0.11),
+    lm.LEFT_SHOULDER: (0.58, 0.25), lm.RIGHT_SHOULDER: (0.42, 0.25),
+    lm.LEFT_HIP: (0.55, 0.52), lm.RIGHT_HIP: (0.45, 0.52),
+    lm.LEFT_KNEE: (0.55, 0.72), lm.RIGHT_KNEE: (0.45, 0.72),
+    lm.LEFT_ANKLE: (0.55, 0.92), lm.RIGHT_ANKLE: (0.45, 0.92),
+}
+
+
+def make_skeletons(count: int, seed: int):
+    rng = np.random.default_rng(seed)
+    skeletons = rng.uniform(0, 1, (count, lm.NUM_LANDMARKS, 4)).astype(np.float32)
+    for index, (x, y) in STANDING.items():
+        skeletons[:, index, lm.X] = x + rng.normal(0, 0.01, count)
+        skeletons[:, index, lm.Y] = y + rng.normal(0, 0.01, count)
+    widths = rng.integers(480, 1280, count)
+    heights = rng.integers(640, 1920, count)
+    return skeletons, widths, heights
+
+
+def reference_metrics(landmarks, width, height):
+    """Cálculo original de _calculate_enhanced_posture_metrics (só a parte numérica)"""
+    def get_coords(index):
+        return (landmarks[index].x * width, landmarks[index].y * height)
+
+    def calculate_angle(p1, p2, p3):
+        p1, p2, p3 = np.array(p1), np.array(p2), np.array(p3)
+        v1, v2 = p1 - p2, p3 - p2
+        norm_v1, norm_v2 = np.linalg.norm(v1), np.linalg.norm(v2)
+        if norm_v1 == 0 or norm_v2 == 0:
+            return 0.0
+        return np.degrees(np.arccos(np.clip(np.dot(v1, v2) / (norm_v1 * norm_v2), -1.0, 1.0)))
+
+    metrics = {}
+    ear_avg = ((landmarks[lm.LEFT_EAR].x + landmarks[lm.RIGHT_EAR].x) / 2,)
+    shoulder_avg = ((landmarks[lm.LEFT_SHOULDER].x + landmarks[lm.RIGHT_SHOULDER].x) / 2,)
+    metrics['head_forward_distance'] = abs(ear_avg[0] - shoulder_avg[0]) * width
+    metrics['head_alignment_score'] = max(0, 100 - (metrics['head_forward_distance'] * 1.5))
+    left_ear_c, right_ear_c = get_coords(lm.LEFT_EAR), get_coords(lm.RIGHT_EAR)
+    metrics['head_tilt_angle'] = abs(math.degrees(math.atan2(right_ear_c[1] - left_ear_c[1],
+                                                             right_ear_c[0] - left_ear_c[0])))
+    left_shoulder_c, right_shoulder_c = get_coords(lm.LEFT_SHOULDER), get_coords(lm.RIGHT_SHOULDER)
+    metrics['shoulder_height_difference'] = abs(left_shoulder_c[1] - right_shoulder_c[1])
+    left_hip_c, right_hip_c = get_coords(lm.LEFT_HIP), get_coords(lm.RIGHT_HIP)
+    hip_mid_x = (left_hip_c[0] + right_hip_c[0]) / 2
+    metrics['trunk_rotation_offset'] = abs((left_shoulder_c[0] + right_shoulder_c[0]) / 2 - hip_mid_x)
+    metrics['hip_height_difference'] = abs(left_hip_c[1] - right_hip_c[1])
+    metrics['left_knee_angle'] = calculate_angle(left_hip_c, get_coords(lm.LEFT_KNEE), get_coords(lm.LEFT_ANKLE))
+    metrics['right_knee_angle'] = calculate_angle(right_hip_c, get_coords(lm.RIGHT_KNEE),
+                                                  get_coords(lm.RIGHT_ANKLE))
+    metrics['spinal_lateral_deviation'] = (metrics['shoulder_height_difference'] +
+                                           metrics['hip_height_difference']) / 2
+    lateral_misalignment = (metrics['head_tilt_angle'] + metrics['shoulder_height_difference'] +
+                            metrics['hip_height_difference'] + metrics['trunk_rotation_offset'])
+    metrics['lateral_alignment_score'] = max(0, 100 - (lateral_misalignment * 5))
+    head_x, shoulder_x, hip_x = landmarks[lm.NOSE].x, shoulder_avg[0], hip_mid_x / width
+    ankle_x = (landmarks[lm.LEFT_ANKLE].x + landmarks[lm.RIGHT_ANKLE].x) / 2
+    total_vertical_deviation = (abs(head_x - shoulder_x) * width + abs(shoulder_x - hip_x) * width +
+                                abs(hip_x - ankle_x) * width)
+    metrics['vertical_alignment_score'] = max(0, 100 - (total_vertical_deviation * 2))
+    knee_deviation = abs(180 - metrics['left_knee_angle']) + abs(180 - metrics['right_knee_angle'])
+    metrics['lower_limb_score'] = max(0, 100 - (knee_deviation * 5))
+    scores = [metrics['head_alignment_score'], metrics['lateral_alignment_score'],
+              metrics['vertical_alignment_score'], metrics['lower_limb_score']]
+    metrics['overall_posture_score'] = sum(score * weight for score, weight in zip(scores, [0.25, 0.30, 0.30, 0.15]))
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=10000, help='número de esqueletos')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    skeletons, widths, heights = make_skeletons(args.count, args.seed)
+    # O cálculo original lia os landmarks do protobuf (campos float32 lidos como float do Python)
+    protos = [[SimpleNamespace(x=float(x), y=float(y)) for x, y, _, _ in skeleton.tolist()]
+              for skeleton in skeletons]
+
+    started = time.perf_counter()
+    reference = [reference_metrics(proto, int(w), int(h)) for proto, w, h in zip(protos, widths, heights)]
+    reference_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    single = [compute_metrics(skeleton, w, h) for skeleton, w, h in zip(skeletons[:1000], widths, heights)]
+    single_ms = (time.perf_counter() - started) * 1000 * args.count / min(args.count, 1000)
+
+    started = time.perf_counter()
+    batch = compute_metrics(skeletons, widths, heights)
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    mismatches = {}
+    for name, values in batch.items():
+        expected = np.array([float(metrics[name]) for metrics in reference])
+        different = np.count_nonzero(values != expected)
+        if different:
+            mismatches[name] = (different, float(np.max(np.abs(values - expected))))
+    for i, metrics in enumerate(single):
+        assert all(float(values[0]) == batch[name][i] for name, values in metrics.items())
+
+    print(f"{args.count} esqueletos")
+    print(f"{'original (um por vez)':<28} {reference_ms:>10.1f} ms")
+    print(f"{'compute_metrics (um por vez)':<28} {single_ms:>10.1f} ms (estimado)")
+    print(f"{'compute_metrics (lote)':<28} {batch_ms:>10.1f} ms")
+    print("\nUm por vez e em lote: valores idênticos")
+    if mismatches:
+        print("Diferenças de arredondamento em relação ao cálculo original:")
+        for name, (different, max_diff) in mismatches.items():
+            print(f"  {name}: {different} valores (máx. {max_diff:.3g})")
+    else:
+        print("Valores idênticos ao cálculo original")
+
+
+if __name__ == '__main__':
+    main()
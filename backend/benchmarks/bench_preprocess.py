@@ -0,0 +1,118 @@
+"""
+Benchmark do pré-processamento (CLAHE) por etapa: latência e memória alocada.
+
+Compara a cadeia antiga (RGB -> LAB, split, createCLAHE, apply, merge,
+LAB -> RGB, e RGB -> BGR para codificar a imagem anotada), que aloca uma
+cópia da imagem a cada etapa, com ImagePreprocessor, que reaproveita
+buffers. A memória é o pico alocado medido com tracemalloc (o OpenCV aloca
+os arrays de saída pelo NumPy, que informa essas alocações ao tracemalloc).
+
+Uso (a partir de backend/):
+    python benchmarks/bench_preprocess.py --image ../frontend/assets/postura.jpg --size 1280
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+
+from src.services.preprocessing import ImagePreprocessor
+
+
+def old_stages(image):
+    """Cadeia original de _preprocess_image + conversão de _image_to_base64"""
+    state = {}
+
+    def to_lab():
+        state['lab'] = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
+        state['l'], state['a'], state['b'] = cv2.split(state['lab'])
+
+    def clahe():
+        state['l'] = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(state['l'])
+
+    def to_rgb():
+        state['rgb'] = cv2.cvtColor(cv2.merge([state['l'], state['a'], state['b']]), cv2.COLOR_LAB2RGB)
+
+    def to_bgr():
+        state['bgr'] = cv2.cvtColor(state['rgb'], cv2.COLOR_RGB2BGR)
+
+    return [('to_lab', to_lab), ('clahe', clahe), ('to_rgb', to_rgb), ('encode_bgr', to_bgr)]
+
+
+def measure(stages, repeats: int):
+    """Mediana (ms) e pico de memória alocada (KiB) de cada etapa"""
+    timings = {name: [] for name, _ in stages}
+    peaks = {}
+    for i in range(repeats):
+        for name, stage in stages:
+            tracemalloc.start()
+            started = time.perf_counter()
+            stage()
+            timings[name].append((time.perf_counter() - started) * 1000)
+            peaks[name] = max(peaks.get(name, 0), tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+    return {name: (statistics.median(values), peaks[name]) for name, values in timings.items()}
+
+
+def new_stages(preprocessor, image):
+    """ImagePreprocessor dividido nas mesmas etapas (process() mede os tempos internamente)"""
+    annotated = image.copy()
+    results = {}
+
+    def process():
+        results['timings'] = {}
+        preprocessor.process(image, results['timings'])
+
+    def to_bgr():
+        # Em annotation.encode_image a conversão é feita no próprio buffer da imagem anotada
+        cv2.cvtColor(annotated, cv2.COLOR_RGB2BGR, dst=annotated)
+
+    return [('process', process), ('encode_bgr', to_bgr)], results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', required=True, help='foto a pré-processar')
+    parser.add_argument('--size', type=int, default=1280, help='maior lado da imagem (como após POSTURE_MAX_SIDE)')
+    parser.add_argument('--repeats', type=int, default=30, help='execuções por etapa')
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Não foi possível ler {args.image}")
+    scale = args.size / max(image.shape[:2])
+    image = cv2.cvtColor(cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA),
+                         cv2.COLOR_BGR2RGB)
+    print(f"Imagem {image.shape[1]}x{image.shape[0]} ({image.nbytes / 1024:.0f} KiB por cópia)\n")
+
+    old = measure(old_stages(image), args.repeats)
+
+    preprocessor = ImagePreprocessor('always')
+    preprocessor.process(image)  # Aloca os buffers da thread antes de medir
+    stages, results = new_stages(preprocessor, image)
+    new = measure(stages, args.repeats)
+    inner = results['timings']
+
+    print(f"{'etapa':<14} {'antigo ms':>10} {'antigo KiB':>11} {'novo ms':>10} {'novo KiB':>10}")
+    for name in ('to_lab', 'clahe', 'to_rgb'):
+        print(f"{name:<14} {old[name][0]:>10.2f} {old[name][1]:>11.0f} {inner[name]:>10.2f} {'':>10}")
+    print(f"{'  (total)':<14} {sum(old[n][0] for n in ('to_lab', 'clahe', 'to_rgb')):>10.2f} "
+          f"{max(old[n][1] for n in ('to_lab', 'clahe', 'to_rgb')):>11.0f} "
+          f"{new['process'][0]:>10.2f} {new['process'][1]:>10.0f}")
+    print(f"{'encode_bgr':<14} {old['encode_bgr'][0]:>10.2f} {old['encode_bgr'][1]:>11.0f} "
+          f"{new['encode_bgr'][0]:>10.2f} {new['encode_bgr'][1]:>10.0f}")
+
+    auto = ImagePreprocessor('auto')
+    timings = {}
+    skipped = auto.process(image, timings) is image
+    print(f"\nModo auto: equalização {'pulada' if skipped else 'aplicada'} "
+          f"(estatísticas em {timings['stats']:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
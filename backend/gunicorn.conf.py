@@ -0,0 +1,74 @@
+"""
+Configuração do gunicorn para produção.
+
+Uso (a partir da raiz do repositório):
+    gunicorn -c backend/gunicorn.conf.py --chdir backend/src main:app
+
+Com preload_app, a aplicação (e, com GUNICORN_PRELOAD_ML=1, o OpenCV e o
+MediaPipe) é importada uma única vez no master; os workers herdam essas
+páginas de memória via copy-on-write em vez de cada um carregar sua cópia.
+O grafo do MediaPipe, as conexões do banco e as threads da fila de tarefas
+não sobrevivem ao fork, então são criados em cada worker no post_fork.
+
+Os próprios workers do gunicorn fazem o papel do pool de inferência: cada
+um carrega um analisador ao iniciar e o usa para uma análise por vez. A fila
+de cada worker é limitada como a do pool: com POSTURE_LOCAL_MAX_PENDING
+análises em andamento ou aguardando, novas requisições recebem 429 com
+Retry-After (estado em /api/posture/pool/health). Para usar o pool de
+processos (src/services/inference_pool.py) em vez disso, defina
+POSTURE_POOL_WORKERS.
+"""
+import gc
+import os
+import multiprocessing
+
+cores = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Threads atendem as rotas de CRUD enquanto uma análise está em andamento
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, cores)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+preload_app = True
+
+# Uma análise com model_complexity=2 pode levar vários segundos em CPU
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Reciclar workers periodicamente limita o crescimento de memória; o jitter
+# evita que todos reiniciem ao mesmo tempo
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+accesslog = '-'
+
+# Lidas por main.py durante o preload
+os.environ.setdefault('DEFER_BACKGROUND_START', '1')
+os.environ.setdefault('POSTURE_WARMUP', '1')
+# Análise no próprio worker, com o modelo carregado no post_fork. A fila de cada
+# worker é limitada (429 acima disso) a metade das threads, para que as demais
+# continuem livres para as rotas de CRUD
+os.environ.setdefault('POSTURE_POOL_WORKERS', '0')
+os.environ.setdefault('POSTURE_LOCAL_MAX_PENDING', str(max(1, threads // 2)))
+
+
+def when_ready(server):
+    if os.environ.get('GUNICORN_PRELOAD_ML', '1') == '1':
+        # Importa as bibliotecas (sem criar o grafo do MediaPipe) para compartilhá-las com os workers
+        import cv2  # noqa: F401
+        import mediapipe  # noqa: F401
+        import src.services.posture_analysis_v2  # noqa: F401
+
+    # Move os objetos já criados para fora do coletor de lixo, para que ele não
+    # toque (e copie) as páginas compartilhadas em cada worker
+    gc.freeze()
+    server.log.info(f"Aplicação carregada no master; iniciando {workers} workers x {threads} threads")
+
+
+def post_fork(server, worker):
+    import main
+    main.init_worker_process(first_worker=worker.age == 1)
+    server.log.info(f"Worker {worker.pid} inicializado")
@@ -1,26 +1,40 @@
 import os
 import sys
+import time
+import logging
+import threading
+
+# Início da importação da aplicação, para o relatório de tempo de inicialização
+_startup_started = time.perf_counter()
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, send_from_directory, jsonify, request, abort
 from dotenv import load_dotenv
 from flask_cors import CORS
 from src.models.user import db
+from src.models.migrations import apply_migrations, schema_cli
+from src.models.database import init_database
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.estudantes import estudantes_bp
 from src.routes.avaliacoes import avaliacoes_bp
 from src.routes.escolas import escolas_bp
 from src.routes.sessoes_rv import sessoes_rv_bp
-from src.routes.posture_analysis import posture_bp
+from src.routes.posture_analysis import posture_bp, warm_up_analysis
 from src.routes.auth import init_jwt
+from src.services.job_queue import job_queue
+from src.services.audio_generator import prewarm_exercise_audio
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
+# Delegar o envio de imagens ao servidor web (nginx/Apache) quando disponível
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+# Tamanho máximo de uma requisição (uploads e lotes de imagens); acima dele a resposta é 413
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH_MB', 200)) * 1024 * 1024
 
 # Habilitar CORS para todas as rotas
 CORS(app)
@@ -34,11 +48,15 @@ app.register_blueprint(escolas_bp, url_prefix='/api/escolas')
 app.register_blueprint(sessoes_rv_bp, url_prefix='/api/sessoes-rv')
 app.register_blueprint(posture_bp, url_prefix='/api/posture')
 
-# Configuração do banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+# Configuração do banco de dados (DATABASE_URL; SQLite local por padrão)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+init_database(app)
 init_jwt(app)
+# Sob o gunicorn com preload_app (gunicorn.conf.py), threads e processos auxiliares
+# não podem ser iniciados no master: cada worker os inicia depois do fork
+DEFER_BACKGROUND_START = os.environ.get('DEFER_BACKGROUND_START') == '1'
+job_queue.init_app(app, start=not DEFER_BACKGROUND_START)
+app.cli.add_command(schema_cli)
 
 # Criar diretório de uploads
 uploads_dir = os.path.join(os.path.dirname(__file__), '..', 'uploads')
@@ -51,6 +69,53 @@ def uploaded_file(filename):
 
 with app.app_context():
     db.create_all()
+    apply_migrations(db.engine)
+
+# Relatório de inicialização: rotas de CRUD não devem carregar as bibliotecas de ML
+app.config['STARTUP_REPORT'] = {
+    'startup_seconds': round(time.perf_counter() - _startup_started, 3),
+    'heavy_modules_loaded': [name for name in ('cv2', 'mediapipe', 'openai') if name in sys.modules]
+}
+logging.getLogger(__name__).info(f"Aplicação iniciada: {app.config['STARTUP_REPORT']}")
+
+def start_background_services(prewarm_audio=True):
+    """Inicia a fila de tarefas e, se habilitados, a pré-geração de áudios e o aquecimento do modelo"""
+    job_queue.start()
+
+    # Pré-gerar em segundo plano os áudios de todas as narrativas de exercício
+    if prewarm_audio and os.environ.get('AUDIO_PREWARM') == '1':
+        threading.Thread(target=prewarm_exercise_audio, name='audio-prewarm', daemon=True).start()
+
+    # O modelo de pose é carregado no primeiro uso; POSTURE_WARMUP=1 o carrega em segundo plano
+    if os.environ.get('POSTURE_WARMUP') == '1':
+        threading.Thread(target=warm_up_analysis, name='posture-warmup', daemon=True).start()
+
+def init_worker_process(first_worker=True):
+    """Chamado pelo gunicorn em cada worker logo após o fork"""
+    with app.app_context():
+        # As conexões abertas no master (create_all, migrações) não podem ser usadas pelos filhos
+        db.engine.dispose(close=False)
+    # Os áudios são compartilhados em disco: basta um worker pré-gerá-los
+    start_background_services(prewarm_audio=first_worker)
+
+if not DEFER_BACKGROUND_START:
+    start_background_services()
+
+@app.before_request
+def reject_large_requests():
+    # Rejeitar pelo Content-Length antes que as rotas leiam o corpo (muitas tratam
+    # qualquer exceção da leitura como erro interno)
+    if request.content_length is not None and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        abort(413)
+
+@app.errorhandler(413)
+def request_too_large(error):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'Requisição excede o limite de {limit_mb} MB'}), 413
+
+@app.route('/api/health')
+def health():
+    return {'status': 'ok', 'startup': app.config['STARTUP_REPORT']}, 200
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,150 @@
+"""
+Configuração do engine do banco de dados.
+
+O banco é definido por DATABASE_URL (SQLite por padrão; PostgreSQL quando
+vários nós da aplicação compartilham os dados). Um único engine com pool
+de conexões é usado tanto pelo ORM quanto pelas consultas SQL das rotas.
+No SQLite, cada conexão nova do pool recebe os PRAGMAs abaixo: WAL permite
+leituras simultâneas a uma escrita, e busy_timeout faz o SQLite esperar
+pelo lock em vez de falhar com "database is locked".
+"""
+import io
+import os
+import time
+import random
+import sqlite3
+import logging
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAs aplicados a cada conexão SQLite (configuráveis por variável de ambiente)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Valor negativo = tamanho em KiB (64 MiB por conexão)
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+}
+
+# Novas tentativas quando o lock não é obtido nem depois do busy_timeout
+DB_BUSY_RETRIES = int(os.environ.get('DB_BUSY_RETRIES', 5))
+DB_BUSY_RETRY_DELAY = float(os.environ.get('DB_BUSY_RETRY_DELAY', 0.05))
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def database_url() -> str:
+    """URI do banco a partir de DATABASE_URL, ou o SQLite local em src/database/app.db"""
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        # Heroku/Railway ainda fornecem o esquema antigo, que o SQLAlchemy 2 não aceita
+        if url.startswith('postgres://'):
+            url = 'postgresql://' + url[len('postgres://'):]
+        return url
+    directory = os.path.join(os.path.dirname(__file__), '..', 'database')
+    os.makedirs(directory, exist_ok=True)
+    return f"sqlite:///{os.path.join(directory, 'app.db')}"
+
+
+def init_database(app):
+    """Configura o pool de conexões, inicializa o Flask-SQLAlchemy e registra os PRAGMAs do SQLite"""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', database_url())
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # Descarta conexões derrubadas pelo servidor (sem efeito prático no SQLite)
+        'pool_pre_ping': True,
+    })
+    db.init_app(app)
+    with app.app_context():
+        event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+
+
+def _copy_csv_value(value) -> str:
+    """
+    Valor no CSV do COPY: texto sempre entre aspas e NULL como campo vazio sem
+    aspas (o csv do Python, com QUOTE_NONNUMERIC, também põe aspas em None, e
+    o PostgreSQL leria uma string vazia)
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    if isinstance(value, bytes):
+        return '\\x' + value.hex()
+    return str(value)
+
+
+def bulk_insert(conn, table, rows):
+    """
+    Insere muitas linhas (lista de dicts com as mesmas chaves) na conexão `conn`.
+
+    No PostgreSQL com psycopg2 usa COPY FROM STDIN; nos demais bancos, um
+    único executemany.
+    """
+    if not rows:
+        return
+    if conn.dialect.name == 'postgresql' and conn.dialect.driver == 'psycopg2':
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        buffer.writelines(
+            ','.join(_copy_csv_value(row[column]) for column in columns) + '\n' for row in rows
+        )
+        buffer.seek(0)
+        quote = conn.dialect.identifier_preparer.quote
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {quote(table.name)} ({', '.join(quote(c) for c in columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
+    else:
+        conn.execute(table.insert(), rows)
+
+
+def is_busy_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_on_busy(func=None, *, retries: int = None, delay: float = None):
+    """
+    Executa novamente a função quando o banco está ocupado, com espera
+    exponencial e variação aleatória. A função deve conter a transação
+    inteira (abrir, escrever e fazer commit), para poder ser repetida.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            attempts = DB_BUSY_RETRIES if retries is None else retries
+            wait = DB_BUSY_RETRY_DELAY if delay is None else delay
+            for attempt in range(attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except (sqlite3.OperationalError, OperationalError) as e:
+                    if attempt == attempts or not is_busy_error(e):
+                        raise
+                    logger.warning(f"Banco ocupado em {func.__name__}, tentativa {attempt + 1}/{attempts}")
+                    time.sleep(wait * (2 ** attempt) * (1 + random.random()))
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
@@ -0,0 +1,117 @@
+"""
+Migrações incrementais do esquema.
+
+`db.create_all()` cria apenas tabelas que ainda não existem; mudanças em
+tabelas já criadas (como novos índices) ficam registradas aqui, numeradas,
+e a versão aplicada é guardada na tabela schema_version. Cada migração é
+aplicada uma única vez, em ordem, e deve ser idempotente (IF NOT EXISTS),
+pois vários processos podem iniciar ao mesmo tempo. Um passo pode ser um
+comando SQL ou uma função que recebe a conexão (ex.: add_column, já que o
+SQLite não aceita ADD COLUMN IF NOT EXISTS).
+"""
+import logging
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import LargeBinary, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+
+def add_column(table: str, column: str, ddl):
+    """
+    Passo de migração que adiciona a coluna se ela ainda não existir (create_all
+    já pode tê-la criado). `ddl` é o tipo em SQL ou um tipo do SQLAlchemy,
+    compilado para o banco em uso (ex.: LargeBinary vira BLOB ou BYTEA).
+    """
+    def step(conn):
+        if column not in {col['name'] for col in inspect(conn).get_columns(table)}:
+            column_type = ddl if isinstance(ddl, str) else ddl.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+    return step
+
+
+# (versão, descrição, comandos SQL ou funções)
+MIGRATIONS = [
+    (1, 'Índices das chaves estrangeiras e do histórico de avaliações', [
+        'CREATE INDEX IF NOT EXISTS ix_avaliacao_postural_estudante ON avaliacao_postural (id_estudante, id)',
+        'CREATE INDEX IF NOT EXISTS ix_sessao_rv_estudante ON sessao_rv (id_estudante, id)',
+        'CREATE INDEX IF NOT EXISTS ix_estudante_usuario ON estudante (id_usuario, id)',
+        'CREATE INDEX IF NOT EXISTS ix_estudante_escola ON estudante (escola_id, id)',
+        'CREATE INDEX IF NOT EXISTS ix_avaliacao_usuario_data ON avaliacao (usuario_id, data_criacao)',
+        'CREATE INDEX IF NOT EXISTS ix_avaliacao_estudante ON avaliacao (estudante_id)',
+        # Atualiza as estatísticas usadas pelo planejador de consultas
+        'ANALYZE',
+    ]),
+    (2, 'Landmarks da análise na avaliação (imagem anotada sob demanda)', [
+        add_column('avaliacao', 'landmarks', 'TEXT'),
+    ]),
+    (3, 'Dimensões da imagem e versão das regras de pontuação (recálculo das avaliações)', [
+        add_column('avaliacao', 'largura_imagem', 'INTEGER'),
+        add_column('avaliacao', 'altura_imagem', 'INTEGER'),
+        add_column('avaliacao', 'versao_pontuacao', 'INTEGER'),
+    ]),
+    (4, 'Landmarks em formato binário compacto', [
+        add_column('avaliacao', 'landmarks_bin', LargeBinary()),
+    ]),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        'version INTEGER PRIMARY KEY, '
+        'descricao VARCHAR(200), '
+        'aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'
+    ))
+
+
+def current_version(engine) -> int:
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text('SELECT COALESCE(MAX(version), 0) FROM schema_version')).scalar()
+
+
+def apply_migrations(engine) -> int:
+    """Aplica as migrações pendentes e retorna a versão final do esquema"""
+    version = current_version(engine)
+    for number, descricao, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            with engine.begin() as conn:
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(text(statement))
+                conn.execute(text('INSERT INTO schema_version (version, descricao) VALUES (:v, :d)'),
+                             {'v': number, 'd': descricao})
+            logger.info(f"Migração {number} aplicada: {descricao}")
+        except IntegrityError:
+            # Outro processo aplicou a mesma migração ao mesmo tempo
+            logger.info(f"Migração {number} já aplicada por outro processo")
+        version = number
+    return version
+
+
+schema_cli = AppGroup('schema', help='Migrações do esquema do banco de dados.')
+
+
+@schema_cli.command('upgrade')
+def upgrade_command():
+    """Aplica as migrações pendentes"""
+    from src.models.user import db
+    click.echo(f"Esquema na versão {apply_migrations(db.engine)}")
+
+
+@schema_cli.command('status')
+def status_command():
+    """Mostra a versão atual do esquema e as migrações pendentes"""
+    from src.models.user import db
+    version = current_version(db.engine)
+    click.echo(f"Versão atual: {version}")
+    for number, descricao, _ in MIGRATIONS:
+        if number > version:
+            click.echo(f"  pendente: {number} - {descricao}")
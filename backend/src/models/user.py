@@ -12,9 +12,9 @@ class User(db.Model):
     tipo_usuario = db.Column(db.String(50), nullable=False)  # admin, profissional_saude, gestor_educacional, estudante, comunidade, profissional_educacao_fisica
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     ativo = db.Column(db.Boolean, default=True)
-	    pontuacao_total = db.Column(db.Integer, default=0)
-	    nivel = db.Column(db.Integer, default=1)
-	    ultima_atividade = db.Column(db.DateTime, default=datetime.utcnow)
+    pontuacao_total = db.Column(db.Integer, default=0)
+    nivel = db.Column(db.Integer, default=1)
+    ultima_atividade = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
         return f'<User {self.nome}>'
@@ -33,9 +33,9 @@ class User(db.Model):
             'tipo_usuario': self.tipo_usuario,
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
             'ativo': self.ativo,
-	            'pontuacao_total': self.pontuacao_total,
-	            'nivel': self.nivel,
-	            'ultima_atividade': self.ultima_atividade.isoformat() if self.ultima_atividade else None
+            'pontuacao_total': self.pontuacao_total,
+            'nivel': self.nivel,
+            'ultima_atividade': self.ultima_atividade.isoformat() if self.ultima_atividade else None
         }
 
 class Escola(db.Model):
@@ -70,6 +70,12 @@ class Estudante(db.Model):
     usuario = db.relationship('User', backref=db.backref('estudante', uselist=False))
     escola = db.relationship('Escola', backref=db.backref('estudantes', lazy=True))
 
+    # Também criados em bancos existentes pela migração 1 (models/migrations.py)
+    __table_args__ = (
+        db.Index('ix_estudante_usuario', 'id_usuario', 'id'),
+        db.Index('ix_estudante_escola', 'escola_id', 'id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -82,44 +88,44 @@ class Estudante(db.Model):
             'responsavel_telefone': self.responsavel_telefone,
             'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
         }
-	
-	class Comunidade(db.Model):
-	    id = db.Column(db.Integer, primary_key=True)
-	    id_usuario = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-	    data_nascimento = db.Column(db.Date)
-	    genero = db.Column(db.String(20))
-	    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
-	
-	    usuario = db.relationship('User', backref=db.backref('comunidade', uselist=False))
-	
-	    def to_dict(self):
-	        return {
-	            'id': self.id,
-	            'id_usuario': self.id_usuario,
-	            'data_nascimento': self.data_nascimento.isoformat() if self.data_nascimento else None,
-	            'genero': self.genero,
-	            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
-	        }
-	
-	class ProfissionalEducacaoFisica(db.Model):
-	    id = db.Column(db.Integer, primary_key=True)
-	    id_usuario = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-	    cref = db.Column(db.String(50), unique=True) # Conselho Regional de Educação Física
-	    especializacao = db.Column(db.String(100))
-	    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
-	
-	    usuario = db.relationship('User', backref=db.backref('profissional_educacao_fisica', uselist=False))
-	
-	    def to_dict(self):
-	        return {
-	            'id': self.id,
-	            'id_usuario': self.id_usuario,
-	            'cref': self.cref,
-	            'especializacao': self.especializacao,
-	            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
-	        }
-	
-	class AvaliacaoPostural(db.Model):
+
+class Comunidade(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    id_usuario = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    data_nascimento = db.Column(db.Date)
+    genero = db.Column(db.String(20))
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+    usuario = db.relationship('User', backref=db.backref('comunidade', uselist=False))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'id_usuario': self.id_usuario,
+            'data_nascimento': self.data_nascimento.isoformat() if self.data_nascimento else None,
+            'genero': self.genero,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
+        }
+
+class ProfissionalEducacaoFisica(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    id_usuario = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    cref = db.Column(db.String(50), unique=True) # Conselho Regional de Educação Física
+    especializacao = db.Column(db.String(100))
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+    usuario = db.relationship('User', backref=db.backref('profissional_educacao_fisica', uselist=False))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'id_usuario': self.id_usuario,
+            'cref': self.cref,
+            'especializacao': self.especializacao,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
+        }
+
+class AvaliacaoPostural(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     id_estudante = db.Column(db.Integer, db.ForeignKey('estudante.id'), nullable=False)
     data_avaliacao = db.Column(db.DateTime, default=datetime.utcnow)
@@ -135,6 +141,8 @@ class Estudante(db.Model):
     estudante = db.relationship('Estudante', backref=db.backref('avaliacoes', lazy=True))
     profissional = db.relationship('User', backref=db.backref('avaliacoes_realizadas', lazy=True))
 
+    __table_args__ = (db.Index('ix_avaliacao_postural_estudante', 'id_estudante', 'id'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -161,6 +169,8 @@ class SessaoRV(db.Model):
 
     estudante = db.relationship('Estudante', backref=db.backref('sessoes_rv', lazy=True))
 
+    __table_args__ = (db.Index('ix_sessao_rv_estudante', 'id_estudante', 'id'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -169,40 +179,84 @@ class SessaoRV(db.Model):
             'tipo_sessao': self.tipo_sessao,
             'duracao_minutos': self.duracao_minutos,
             'progresso_json': self.progresso_json,
-	            'pontuacao': self.pontuacao
-	        }
-	
-	class Conquista(db.Model):
-	    id = db.Column(db.Integer, primary_key=True)
-	    nome = db.Column(db.String(100), nullable=False, unique=True)
-	    descricao = db.Column(db.Text)
-	    pontos_recompensa = db.Column(db.Integer, default=0)
-	    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
-	
-	    def to_dict(self):
-	        return {
-	            'id': self.id,
-	            'nome': self.nome,
-	            'descricao': self.descricao,
-	            'pontos_recompensa': self.pontos_recompensa,
-	            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
-	        }
-	
-	class UserConquista(db.Model):
-	    id = db.Column(db.Integer, primary_key=True)
-	    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-	    conquista_id = db.Column(db.Integer, db.ForeignKey('conquista.id'), nullable=False)
-	    data_conquista = db.Column(db.DateTime, default=datetime.utcnow)
-	
-	    user = db.relationship('User', backref=db.backref('conquistas', lazy=True))
-	    conquista = db.relationship('Conquista', backref=db.backref('usuarios', lazy=True))
-	
-	    __table_args__ = (db.UniqueConstraint('user_id', 'conquista_id', name='_user_conquista_uc'),)
-	
-	    def to_dict(self):
-	        return {
-	            'id': self.id,
-	            'user_id': self.user_id,
-	            'conquista_id': self.conquista_id,
-	            'data_conquista': self.data_conquista.isoformat() if self.data_conquista else None
-	        }
+            'pontuacao': self.pontuacao
+        }
+
+class Conquista(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False, unique=True)
+    descricao = db.Column(db.Text)
+    pontos_recompensa = db.Column(db.Integer, default=0)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'descricao': self.descricao,
+            'pontos_recompensa': self.pontos_recompensa,
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
+        }
+
+class UserConquista(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    conquista_id = db.Column(db.Integer, db.ForeignKey('conquista.id'), nullable=False)
+    data_conquista = db.Column(db.DateTime, default=datetime.utcnow)
+
+    user = db.relationship('User', backref=db.backref('conquistas', lazy=True))
+    conquista = db.relationship('Conquista', backref=db.backref('usuarios', lazy=True))
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'conquista_id', name='_user_conquista_uc'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'conquista_id': self.conquista_id,
+            'data_conquista': self.data_conquista.isoformat() if self.data_conquista else None
+        }
+
+class Avaliacao(db.Model):
+    # Resultado de uma análise postural automática (usada pelas rotas /api/posture)
+    __tablename__ = 'avaliacao'
+
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    estudante_id = db.Column(db.Integer, db.ForeignKey('estudante.id'))
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow, server_default=db.func.current_timestamp())
+    imagem_original = db.Column(db.Text)  # Chave no armazenamento de imagens
+    imagem_anotada = db.Column(db.Text)  # Chave no armazenamento de imagens
+    score_geral = db.Column(db.Float)
+    classificacao_postura = db.Column(db.String(50))
+    metricas_detalhadas = db.Column(db.Text)  # JSON com todas as métricas
+    relatorio_completo = db.Column(db.Text)  # JSON com o relatório
+    landmarks = db.Column(db.Text)  # JSON com os landmarks (avaliações antigas; ver landmarks_bin)
+    landmarks_bin = db.Column(db.LargeBinary)  # Landmarks empacotados (services/landmarks.py)
+    largura_imagem = db.Column(db.Integer)  # Dimensões da foto original (as métricas são em pixels)
+    altura_imagem = db.Column(db.Integer)
+    versao_pontuacao = db.Column(db.Integer)  # SCORING_VERSION das regras usadas nas métricas
+    observacoes = db.Column(db.Text)
+    audio_exercicio_path = db.Column(db.String(255))
+
+    __table_args__ = (
+        db.Index('ix_avaliacao_usuario_data', 'usuario_id', 'data_criacao'),
+        db.Index('ix_avaliacao_estudante', 'estudante_id'),
+    )
+
+class AvaliacaoMetrica(db.Model):
+    # Uma linha por métrica numérica de cada avaliação, para comparações e agregações em SQL
+    __tablename__ = 'avaliacao_metrica'
+
+    avaliacao_id = db.Column(db.Integer, db.ForeignKey('avaliacao.id', ondelete='CASCADE'), primary_key=True)
+    metrica = db.Column(db.String(64), primary_key=True)
+    valor = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (db.Index('ix_avaliacao_metrica_metrica_valor', 'metrica', 'valor'),)
+
+    def to_dict(self):
+        return {
+            'avaliacao_id': self.avaliacao_id,
+            'metrica': self.metrica,
+            'valor': self.valor
+        }
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db, AvaliacaoPostural, Estudante
 from src.routes.auth import token_required
+from src.routes.pagination import keyset_page, PaginationError
 from datetime import datetime
 import json
 
@@ -22,24 +23,25 @@ def listar_avaliacoes(current_user):
                 estudante.id_usuario != current_user.id):
                 return jsonify({'message': 'Acesso negado!'}), 403
             
-            avaliacoes = AvaliacaoPostural.query.filter_by(id_estudante=estudante_id).all()
+            avaliacoes = AvaliacaoPostural.query.filter_by(id_estudante=estudante_id)
         else:
             # Listar todas as avaliações baseado no tipo de usuário
             if current_user.tipo_usuario == 'admin':
-                avaliacoes = AvaliacaoPostural.query.all()
+                avaliacoes = AvaliacaoPostural.query
             elif current_user.tipo_usuario in ['profissional_saude', 'gestor_educacional']:
-                avaliacoes = AvaliacaoPostural.query.all()  # Simplificado por enquanto
+                avaliacoes = AvaliacaoPostural.query  # Simplificado por enquanto
             else:
                 # Estudantes só veem suas próprias avaliações
                 estudante = Estudante.query.filter_by(id_usuario=current_user.id).first()
                 if estudante:
-                    avaliacoes = AvaliacaoPostural.query.filter_by(id_estudante=estudante.id).all()
+                    avaliacoes = AvaliacaoPostural.query.filter_by(id_estudante=estudante.id)
                 else:
-                    avaliacoes = []
+                    avaliacoes = AvaliacaoPostural.query.filter(db.false())
         
-        return jsonify({
-            'avaliacoes': [avaliacao.to_dict() for avaliacao in avaliacoes]
-        }), 200
+        return jsonify(keyset_page(avaliacoes, AvaliacaoPostural, 'avaliacoes')), 200
+        
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
         
     except Exception as e:
         return jsonify({'message': f'Erro ao listar avaliações: {str(e)}'}), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db, Escola
 from src.routes.auth import token_required
+from src.routes.pagination import keyset_page, PaginationError
 
 escolas_bp = Blueprint('escolas', __name__)
 
@@ -8,11 +9,10 @@ escolas_bp = Blueprint('escolas', __name__)
 @token_required
 def listar_escolas(current_user):
     try:
-        escolas = Escola.query.all()
+        return jsonify(keyset_page(Escola.query, Escola, 'escolas')), 200
         
-        return jsonify({
-            'escolas': [escola.to_dict() for escola in escolas]
-        }), 200
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
         
     except Exception as e:
         return jsonify({'message': f'Erro ao listar escolas: {str(e)}'}), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.models.user import db, Estudante, User, Escola
 from src.routes.auth import token_required
+from src.routes.pagination import keyset_page, PaginationError
 from datetime import datetime
 
 estudantes_bp = Blueprint('estudantes', __name__)
@@ -11,17 +12,18 @@ def listar_estudantes(current_user):
     try:
         # Filtrar estudantes baseado no tipo de usuário
         if current_user.tipo_usuario == 'admin':
-            estudantes = Estudante.query.all()
+            estudantes = Estudante.query
         elif current_user.tipo_usuario in ['profissional_saude', 'gestor_educacional']:
             # Profissionais podem ver estudantes de suas escolas/clínicas
-            estudantes = Estudante.query.all()  # Simplificado por enquanto
+            estudantes = Estudante.query  # Simplificado por enquanto
         else:
             # Estudantes só veem seus próprios dados
-            estudantes = Estudante.query.filter_by(id_usuario=current_user.id).all()
+            estudantes = Estudante.query.filter_by(id_usuario=current_user.id)
         
-        return jsonify({
-            'estudantes': [estudante.to_dict() for estudante in estudantes]
-        }), 200
+        return jsonify(keyset_page(estudantes, Estudante, 'estudantes')), 200
+        
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
         
     except Exception as e:
         return jsonify({'message': f'Erro ao listar estudantes: {str(e)}'}), 500
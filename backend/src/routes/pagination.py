@@ -0,0 +1,85 @@
+"""
+Paginação por cursor (keyset) para as rotas de listagem.
+
+Em vez de OFFSET, cada página continua a partir do último ID retornado
+(`?after=<id>&limit=<n>`), então o custo de uma página não cresce com o
+tamanho da tabela. `fields=` limita as colunas carregadas do banco e
+`include_total=1` calcula o total apenas quando pedido.
+"""
+from datetime import date, datetime
+
+from flask import request
+from sqlalchemy.orm import load_only
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class PaginationError(ValueError):
+    """Parâmetros de paginação inválidos."""
+
+
+def _parse_int(name, default=None, minimum=0):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise PaginationError(f"Parâmetro '{name}' deve ser um número inteiro")
+    if number < minimum:
+        raise PaginationError(f"Parâmetro '{name}' deve ser maior ou igual a {minimum}")
+    return number
+
+
+def _parse_fields(model):
+    """Colunas pedidas em `fields=` (o id é sempre incluído), ou None para todas"""
+    value = request.args.get('fields')
+    if not value:
+        return None
+    columns = model.__table__.columns.keys()
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    invalid = [field for field in fields if field not in columns]
+    if invalid:
+        raise PaginationError(f"Campos inválidos: {', '.join(invalid)}")
+    return ['id'] + [field for field in fields if field != 'id']
+
+
+def _serialize(obj, fields):
+    if fields is None:
+        return obj.to_dict()
+    data = {}
+    for field in fields:
+        value = getattr(obj, field)
+        data[field] = value.isoformat() if isinstance(value, (date, datetime)) and value else value
+    return data
+
+
+def keyset_page(query, model, key):
+    """
+    Executa uma página da consulta ordenada por ID.
+
+    Retorna o corpo da resposta: {key: [...], 'paginacao': {...}}.
+    Levanta PaginationError se os parâmetros forem inválidos.
+    """
+    after = _parse_int('after')
+    limit = min(_parse_int('limit', DEFAULT_LIMIT, minimum=1), MAX_LIMIT)
+    fields = _parse_fields(model)
+    include_total = request.args.get('include_total', '').lower() in ('1', 'true', 'sim')
+
+    paginacao = {'limit': limit}
+    if include_total:
+        paginacao['total'] = query.order_by(None).count()
+
+    if fields is not None:
+        query = query.options(load_only(*[getattr(model, field) for field in fields]))
+    if after is not None:
+        query = query.filter(model.id > after)
+
+    # Uma linha a mais indica se existe próxima página
+    rows = query.order_by(model.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    paginacao['next_after'] = rows[-1].id if has_more else None
+    return {key: [_serialize(row, fields) for row in rows], 'paginacao': paginacao}
@@ -1,28 +1,54 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, url_for, has_request_context, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
+import click
 from werkzeug.utils import secure_filename
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 import os
-import cv2
-import numpy as np
-from PIL import Image
-import base64
-from io import BytesIO
-import sqlite3
-from ..services.posture_analysis_v2 import posture_analyzer_v2 as posture_analyzer
-from ..models.user import User
-from ..services.audio_generator import generate_and_save_exercise_audio
+import ast
+import json
+import time
+import threading
+from datetime import datetime, timedelta
+import zipfile
+from ..services.inference_pool import inference_pool, InferencePoolFull, InferenceTimeout
+from ..services.result_cache import analysis_cache
+from ..services.job_queue import job_queue
+from ..services.image_store import image_store, is_image_key, decode_data_uri, migrate_inline_images
+from ..models.user import db, User, Estudante, Avaliacao, AvaliacaoMetrica, AvaliacaoPostural
+from ..models.database import retry_on_busy, bulk_insert
+from ..services.audio_generator import generate_and_save_exercise_audio, find_exercise_audio
+from ..services.scoring import VIEWS, metric_rows, scoring_rules, merge_views, generate_report, SCORING_VERSION
+from ..services.rescore import rescore_avaliacoes
+from ..services.landmark_store import landmark_columns, load_landmarks, pack_stored_landmarks
+from ..services import landmarks as lm
 
 posture_bp = Blueprint('posture', __name__)
 
-def get_db_connection():
-    """Conecta ao banco de dados SQLite"""
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'app.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 UPLOAD_FOLDER = 'uploads/posture_images'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+BATCH_MAX_IMAGES = int(os.environ.get('POSTURE_BATCH_MAX_IMAGES', 60))
+# Limites do lote descompactado: por imagem e no total (o .zip enviado é limitado por MAX_CONTENT_LENGTH)
+BATCH_MAX_IMAGE_BYTES = int(os.environ.get('POSTURE_BATCH_MAX_IMAGE_MB', 20)) * 1024 * 1024
+BATCH_MAX_TOTAL_BYTES = int(os.environ.get('POSTURE_BATCH_MAX_TOTAL_MB', 300)) * 1024 * 1024
+# Métricas usadas para apontar áreas que melhoraram ou pioraram em /compare
+# (shoulder_alignment_score só existe em avaliações do analisador antigo)
+METRICAS_COMPARACAO = ['head_alignment_score', 'lateral_alignment_score', 'shoulder_alignment_score',
+                       'vertical_alignment_score', 'lower_limb_score']
+# Qualidades aceitas em `quality` (os modelos de cada uma ficam em QUALITY_TIERS do analisador)
+QUALITIES = ('fast', 'balanced', 'accurate', 'auto')
+DEFAULT_REQUEST_QUALITY = os.environ.get('POSTURE_REQUEST_QUALITY', 'auto')
+# Com `quality=auto`, análises na fila por processo de inferência a partir das quais
+# um modelo mais leve é usado
+AUTO_BALANCED_LOAD = float(os.environ.get('POSTURE_AUTO_BALANCED_LOAD', 1))
+AUTO_FAST_LOAD = float(os.environ.get('POSTURE_AUTO_FAST_LOAD', 3))
+# Imagem anotada na resposta (`render`): nenhuma, miniatura ou completa. Sem ela a
+# anotação continua disponível em /images/<id>/anotada, gerada a partir dos landmarks
+RENDER_MODES = ('none', 'thumbnail', 'full')
+DEFAULT_RENDER = os.environ.get('POSTURE_DEFAULT_RENDER', 'none')
+# Formato dos landmarks na resposta (`landmarks_format`): lista de objetos, um por
+# landmark, ou colunar (nomes uma vez só e um array por coordenada)
+LANDMARK_FORMATS = ('objects', 'columnar')
 
 # Criar diretório de upload se não existir
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -30,6 +56,177 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def get_analyzer():
+    """Analisador do próprio processo; OpenCV e MediaPipe só são importados no primeiro uso"""
+    from ..services.posture_analysis_v2 import get_posture_analyzer
+    return get_posture_analyzer()
+
+def warm_up_analysis():
+    """Carrega o modelo antecipadamente: inicia o pool de inferência ou o analisador local"""
+    if inference_pool is not None:
+        inference_pool.start()
+    else:
+        get_analyzer()
+
+# O grafo do MediaPipe não aceita chamadas simultâneas: sem o pool, as análises
+# do processo (threads do servidor e da fila de tarefas) são feitas uma por vez
+local_analysis_lock = threading.Lock()
+# Análises em andamento ou aguardando o lock acima
+local_analysis_count = 0
+local_analysis_count_lock = threading.Lock()
+# Sem o pool (ex.: sob o gunicorn), o mesmo limite de fila do pool: a partir de
+# LOCAL_MAX_PENDING análises no processo, novas requisições recebem 429 com Retry-After
+LOCAL_MAX_PENDING = int(os.environ.get('POSTURE_LOCAL_MAX_PENDING', 4))
+# Média móvel do tempo de uma análise no processo, usada para estimar o Retry-After
+local_avg_seconds = 2.0
+# Sem o pool, as vistas de /analyze-multiview são analisadas ao mesmo tempo, em
+# threads com um analisador cada (criados no primeiro uso de cada thread)
+view_executor = None
+view_executor_lock = threading.Lock()
+view_analyzers = threading.local()
+
+@contextmanager
+def local_analysis_slots(count=1):
+    """
+    Reserva `count` vagas na fila de análises do processo (sem o pool).
+    Levanta InferencePoolFull se ela estiver cheia; um pedido maior que o
+    limite só é aceito com a fila vazia.
+    """
+    global local_analysis_count
+    with local_analysis_count_lock:
+        if local_analysis_count and local_analysis_count + count > LOCAL_MAX_PENDING:
+            raise InferencePoolFull(max(1, int(round(local_analysis_count * local_avg_seconds))))
+        local_analysis_count += count
+    try:
+        yield
+    finally:
+        with local_analysis_count_lock:
+            local_analysis_count -= count
+
+def run_analysis(method, *args, **kwargs):
+    """
+    Executa a análise no pool de inferência (ou no próprio processo, se o pool
+    estiver desabilitado). Levanta InferencePoolFull se a fila estiver cheia.
+    """
+    if inference_pool is None:
+        global local_avg_seconds
+        with local_analysis_slots():
+            with local_analysis_lock:
+                started = time.perf_counter()
+                try:
+                    return getattr(get_analyzer(), method)(*args, **kwargs)
+                finally:
+                    local_avg_seconds = 0.8 * local_avg_seconds + 0.2 * (time.perf_counter() - started)
+    return inference_pool.analyze(method, *args, **kwargs)
+
+def analyze_view(image_bytes, quality, render):
+    """Análise de uma vista, executada em uma thread de view_executor com o analisador da thread"""
+    if not hasattr(view_analyzers, 'analyzer'):
+        from ..services.posture_analysis_v2 import PostureAnalyzerV2
+        view_analyzers.analyzer = PostureAnalyzerV2()
+    return view_analyzers.analyzer.analyze_image_bytes(image_bytes, quality=quality, render=render)
+
+def analyze_views_locally(images, quality, render):
+    """
+    Analisa as vistas (dict vista -> bytes) ao mesmo tempo no próprio processo.
+    Levanta InferencePoolFull se a fila de análises do processo estiver cheia.
+    """
+    global view_executor
+    with view_executor_lock:
+        if view_executor is None:
+            view_executor = ThreadPoolExecutor(max_workers=len(VIEWS), thread_name_prefix='posture-view')
+
+    with local_analysis_slots(len(images)):
+        futures = {
+            view: view_executor.submit(analyze_view, image_bytes, quality, render)
+            for view, image_bytes in images.items()
+        }
+        results = {}
+        for view, future in futures.items():
+            try:
+                results[view] = future.result()
+            except Exception as e:
+                results[view] = {'error': f'Erro na análise postural: {str(e)}'}
+        return results
+
+def analysis_load():
+    """Análises em andamento ou na fila por processo de inferência"""
+    if inference_pool is None:
+        return local_analysis_count
+    return inference_pool.pending() / inference_pool.num_workers
+
+def requested_quality(data):
+    """
+    Qualidade pedida no parâmetro `quality` (corpo JSON, formulário ou query string).
+    Levanta ValueError se o valor não for reconhecido.
+    """
+    quality = (data.get('quality') or request.args.get('quality') or DEFAULT_REQUEST_QUALITY).lower()
+    if quality not in QUALITIES:
+        raise ValueError(f"Qualidade inválida: {quality}. Use {', '.join(QUALITIES)}")
+    return quality
+
+def requested_render(data):
+    """
+    Modo de renderização pedido no parâmetro `render`.
+    Levanta ValueError se o valor não for reconhecido.
+    """
+    render = (data.get('render') or request.args.get('render') or DEFAULT_RENDER).lower()
+    if render not in RENDER_MODES:
+        raise ValueError(f"Modo de renderização inválido: {render}. Use {', '.join(RENDER_MODES)}")
+    return render
+
+def requested_landmarks_format(data, default='objects'):
+    """
+    Formato dos landmarks pedido no parâmetro `landmarks_format`.
+    Levanta ValueError se o valor não for reconhecido.
+    """
+    landmarks_format = (data.get('landmarks_format') or request.args.get('landmarks_format') or default)
+    if landmarks_format is None:
+        return None
+    landmarks_format = landmarks_format.lower()
+    if landmarks_format not in LANDMARK_FORMATS:
+        raise ValueError(f"Formato de landmarks inválido: {landmarks_format}. Use {', '.join(LANDMARK_FORMATS)}")
+    return landmarks_format
+
+def format_landmarks(landmarks, landmarks_format):
+    """Landmarks (array (33, 4)) no formato de resposta pedido"""
+    if landmarks_format == 'columnar':
+        return lm.to_columns(landmarks)
+    return lm.to_dicts(landmarks)
+
+def with_landmarks_format(analysis_result, landmarks_format):
+    """Resultado da análise com os landmarks no formato pedido (o padrão já vem do analisador)"""
+    if landmarks_format == 'objects' or 'landmarks' not in analysis_result:
+        return analysis_result
+    return dict(analysis_result,
+                landmarks=format_landmarks(lm.from_dicts(analysis_result['landmarks']), landmarks_format))
+
+def choose_quality(quality, extra=0):
+    """
+    Resolve `quality=auto` pela carga atual: sem fila usa o modelo padrão do
+    analisador (None); com fila, troca para modelos mais leves. `extra` são
+    análises que a própria requisição vai enfileirar (ex.: um lote).
+    """
+    if quality != 'auto':
+        return quality
+    load = analysis_load() + extra
+    if load >= AUTO_FAST_LOAD:
+        return 'fast'
+    if load >= AUTO_BALANCED_LOAD:
+        return 'balanced'
+    return None
+
+def report_quality(analysis_result, requested):
+    """Indica no resultado se o modelo foi escolhido pela requisição ou automaticamente"""
+    if 'model' in analysis_result:
+        analysis_result['model']['auto'] = requested == 'auto'
+
+def pool_full_response(error):
+    """Resposta 429 quando a fila de inferência está cheia"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
 @posture_bp.route('/analyze', methods=['POST'])
 @jwt_required()
 def analyze_posture():
@@ -39,6 +236,13 @@ def analyze_posture():
     """
     try:
         current_user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or request.form
+        try:
+            quality = requested_quality(data)
+            render = requested_render(data)
+            landmarks_format = requested_landmarks_format(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Verificar se é upload de arquivo ou base64
         if 'image' in request.files:
@@ -46,46 +250,21 @@ def analyze_posture():
             file = request.files['image']
             if file.filename == '':
                 return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+            if not allowed_file(file.filename):
+                return jsonify({'error': 'Formato de arquivo não permitido'}), 400
             
-            if file and allowed_file(file.filename):
-                # Salvar arquivo temporariamente
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(filepath)
-                
-                # Carregar imagem
-                image = cv2.imread(filepath)
-                if image is None:
-                    return jsonify({'error': 'Erro ao carregar imagem'}), 400
-                
-                # Analisar postura
-                analysis_result = posture_analyzer.analyze_posture(image)
-        
-                # Geração do áudio do exercício
-                if 'risk_factors' in analysis_result['metrics']:
-                    audio_path = generate_and_save_exercise_audio(
-                        analysis_result['metrics']['risk_factors'], current_user_id
-                    )
-                    analysis_result['exercise_audio_path'] = audio_path
-                else:
-                    analysis_result['exercise_audio_path'] = None
-
-                # Remover arquivo temporário
-                os.remove(filepath)
+            # Os bytes são decodificados pelo analisador, direto para RGB
+            analysis_result = analyze_and_save(
+                current_user_id, data.get('estudante_id'), data.get('observacoes', ''),
+                image_bytes=file.read(), quality=quality, render=render
+            )
                 
-        elif 'image_base64' in request.json:
+        elif 'image_base64' in data:
             # Imagem em base64
-            image_base64 = request.json['image_base64']
-            analysis_result = posture_analyzer.analyze_posture_from_base64(image_base64)
-            
-            # Geração do áudio do exercício
-            if 'risk_factors' in analysis_result['metrics']:
-                audio_path = generate_and_save_exercise_audio(
-                    analysis_result['metrics']['risk_factors'], current_user_id
-                )
-                analysis_result['exercise_audio_path'] = audio_path
-            else:
-                analysis_result['exercise_audio_path'] = None
+            analysis_result = analyze_and_save(
+                current_user_id, data.get('estudante_id'), data.get('observacoes', ''),
+                image_base64=data['image_base64'], quality=quality, render=render
+            )
             
         else:
             return jsonify({'error': 'Imagem não fornecida'}), 400
@@ -93,46 +272,711 @@ def analyze_posture():
         if 'error' in analysis_result:
             return jsonify(analysis_result), 400
         
-        # Salvar resultado no banco de dados
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Dados adicionais do request
-        estudante_id = request.json.get('estudante_id') if request.json else None
-        observacoes = request.json.get('observacoes', '') if request.json else ''
-        
-        cursor.execute('''
-            INSERT INTO avaliacao (
-                usuario_id, estudante_id, imagem_original, imagem_anotada,
-                score_geral, classificacao_postura, metricas_detalhadas,
-                relatorio_completo, observacoes, audio_exercicio_path
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            current_user_id,
-            estudante_id,
-            request.json.get('image_base64', '') if request.json else '',
-            analysis_result['annotated_image'],
-            analysis_result['metrics']['overall_posture_score'],
-            analysis_result['metrics']['posture_classification'],
-            str(analysis_result['metrics']),
-            str(analysis_result['report']),
-            observacoes,
-            analysis_result.get('exercise_audio_path')
-        ))
-        
-        avaliacao_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        # Adicionar ID da avaliação ao resultado
-        analysis_result['avaliacao_id'] = avaliacao_id
-        
-        return jsonify(analysis_result), 200
+        return jsonify(with_landmarks_format(analysis_result, landmarks_format)), 200
         
+    except InferencePoolFull as e:
+        return pool_full_response(e)
+    except InferenceTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
+
+
+def analyze_and_save(usuario_id, estudante_id, observacoes, image_base64=None, image_bytes=None,
+                     quality='auto', render=DEFAULT_RENDER):
+    """
+    Executa a análise completa de uma imagem (inferência, áudio do exercício e
+    gravação no banco) e retorna o resultado com o ID da avaliação
+    """
+    model_quality = choose_quality(quality)
+    if image_bytes is not None:
+        # Os bytes (menores que a imagem decodificada) é que vão para o pool de inferência
+        analysis_result = run_analysis('analyze_image_bytes', image_bytes, quality=model_quality, render=render)
+    else:
+        analysis_result = run_analysis('analyze_posture_from_base64', image_base64, quality=model_quality,
+                                       render=render)
+
+    if 'error' in analysis_result:
+        return analysis_result
+    report_quality(analysis_result, quality)
+
+    # Áudio já sintetizado é usado direto; caso contrário é gerado em segundo plano
+    analysis_result['exercise_audio_path'] = cached_exercise_audio(analysis_result)
+
+    # O banco guarda só a chave da imagem original; o arquivo é gravado depois do commit
+    if image_bytes is None:
+        image_bytes = decode_data_uri(image_base64)
+
+    # Salvar resultado no banco de dados
+    avaliacao_id, = save_avaliacoes(
+        usuario_id, [(estudante_id, image_store.key_for(image_bytes), analysis_result)], observacoes
+    )
+    store_images([image_bytes], [analysis_result])
+
+    # Adicionar ID da avaliação ao resultado
+    analysis_result['avaliacao_id'] = avaliacao_id
+    analysis_result['annotated_image_url'] = (
+        url_for('posture.get_posture_image', avaliacao_id=avaliacao_id, tipo='anotada')
+        if has_request_context() else f'/api/posture/images/{avaliacao_id}/anotada'
+    )
+    schedule_exercise_audio(analysis_result, avaliacao_id, usuario_id)
+    return analysis_result
+
+
+def cached_exercise_audio(analysis_result):
+    """Caminho do áudio do exercício, se ele já existir no armazenamento de áudios"""
+    if 'risk_factors' not in analysis_result.get('metrics', {}):
+        return None
+    return find_exercise_audio(analysis_result['metrics']['risk_factors'])
+
+
+def schedule_exercise_audio(analysis_result, avaliacao_id, user_id, avaliacao_postural_id=None):
+    """
+    Agenda a geração do áudio do exercício na fila de tarefas. Quando concluída,
+    a tarefa preenche avaliacao.audio_exercicio_path (e o da AvaliacaoPostural,
+    na avaliação com várias vistas).
+    """
+    if analysis_result.get('exercise_audio_path'):
+        analysis_result['exercise_audio_status'] = 'ready'
+        return
+    if 'risk_factors' not in analysis_result.get('metrics', {}):
+        analysis_result['exercise_audio_status'] = None
+        return
+
+    job_id = job_queue.enqueue('exercise_audio', {
+        'avaliacao_id': avaliacao_id,
+        'avaliacao_postural_id': avaliacao_postural_id,
+        'risk_factors': analysis_result['metrics']['risk_factors']
+    }, user_id=user_id)
+
+    analysis_result['exercise_audio_status'] = 'pending'
+    analysis_result['exercise_audio_job_id'] = job_id
+    analysis_result['exercise_audio_status_url'] = (
+        url_for('posture.get_exercise_audio_status', job_id=job_id)
+        if has_request_context() else f'/api/posture/audio/{job_id}'
+    )
+
+
+def run_exercise_audio_job(payload, blob):
+    """Handler da fila de tarefas: gera o áudio do exercício e o associa à avaliação"""
+    audio_path = generate_and_save_exercise_audio(payload['risk_factors'], payload['user_id'])
+    if audio_path is None:
+        raise RuntimeError('Falha ao gerar o áudio do exercício')
+
+    set_exercise_audio_path(payload['avaliacao_id'], audio_path, payload.get('avaliacao_postural_id'))
+    return {'avaliacao_id': payload['avaliacao_id'], 'avaliacao_postural_id': payload.get('avaliacao_postural_id'),
+            'audio_path': audio_path}
+
+job_queue.register_handler('exercise_audio', run_exercise_audio_job)
+
+
+@retry_on_busy
+def save_avaliacoes(usuario_id, entries, observacoes=''):
+    """
+    Grava várias análises em uma única transação e retorna os IDs na mesma ordem.
+    entries: lista de (estudante_id, imagem_original, analysis_result)
+    """
+    if not entries:
+        return []
+
+    with db.engine.begin() as conn:
+        return insert_avaliacoes(conn, usuario_id, entries, observacoes)
+
+
+def insert_avaliacoes(conn, usuario_id, entries, observacoes=''):
+    """Insere as avaliações (e suas métricas) na transação de `conn`; retorna os IDs na mesma ordem"""
+    rows = [
+        avaliacao_row(usuario_id, estudante_id, imagem_original, analysis_result, observacoes)
+        for estudante_id, imagem_original, analysis_result in entries
+    ]
+    ids = conn.execute(
+        db.insert(Avaliacao).returning(Avaliacao.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    bulk_insert(conn, AvaliacaoMetrica.__table__, [
+        metric for avaliacao_id, (_, _, analysis_result) in zip(ids, entries)
+        for metric in metric_rows(avaliacao_id, analysis_result['metrics'])
+    ])
+    return ids
+
+
+@retry_on_busy
+def set_exercise_audio_path(avaliacao_id, audio_path, avaliacao_postural_id=None):
+    with db.engine.begin() as conn:
+        if avaliacao_id is not None:
+            conn.execute(
+                db.update(Avaliacao).where(Avaliacao.id == avaliacao_id).values(audio_exercicio_path=audio_path)
+            )
+        if avaliacao_postural_id is not None:
+            conn.execute(
+                db.update(AvaliacaoPostural).where(AvaliacaoPostural.id == avaliacao_postural_id)
+                .values(audio_exercicio_path=audio_path)
+            )
+
+
+def avaliacao_row(usuario_id, estudante_id, imagem_original, analysis_result, observacoes=''):
+    """
+    Colunas da tabela avaliacao para o resultado de uma análise.
+    As imagens são gravadas como chaves do armazenamento de imagens; a anotada
+    só existe se a análise foi feita com render=full (senão é gerada sob demanda
+    a partir dos landmarks).
+    """
+    annotated_image = annotated_image_data(analysis_result)
+    return {
+        'usuario_id': usuario_id,
+        'estudante_id': estudante_id,
+        'imagem_original': imagem_original,
+        'imagem_anotada': image_store.key_for(annotated_image) if annotated_image else None,
+        'score_geral': analysis_result['metrics']['overall_posture_score'],
+        'classificacao_postura': analysis_result['metrics']['posture_classification'],
+        'metricas_detalhadas': json.dumps(analysis_result['metrics'], default=float),
+        'relatorio_completo': json.dumps(analysis_result['report'], default=float),
+        **landmark_columns(analysis_result['landmarks']),
+        'largura_imagem': analysis_result['image_size'][0],
+        'altura_imagem': analysis_result['image_size'][1],
+        'versao_pontuacao': analysis_result['scoring_version'],
+        'observacoes': observacoes,
+        'audio_exercicio_path': analysis_result.get('exercise_audio_path')
+    }
+
+
+def annotated_image_data(analysis_result):
+    """Bytes da imagem anotada a gravar com a avaliação (só existe com render=full)"""
+    annotated_image = analysis_result.get('annotated_image') if analysis_result.get('render') == 'full' else None
+    return decode_data_uri(annotated_image) if annotated_image else None
+
+
+def store_images(originals, analysis_results):
+    """
+    Grava no armazenamento as imagens (original e anotada) de avaliações já
+    salvas. É chamada depois do commit, para que uma gravação que falhe não
+    deixe arquivos órfãos; as chaves já foram calculadas por image_store.key_for.
+    """
+    for image_bytes, analysis_result in zip(originals, analysis_results):
+        image_store.put(image_bytes)
+        annotated_image = annotated_image_data(analysis_result)
+        if annotated_image:
+            image_store.put(annotated_image)
+
+
+def format_timestamp(value):
+    """Data no formato 'AAAA-MM-DD HH:MM:SS' usado pela API desde o início"""
+    return value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+
+
+def load_json_column(value):
+    """Lê uma coluna JSON; avaliações antigas foram gravadas com str() e são lidas com literal_eval"""
+    if not value:
+        return {}
+    try:
+        return json.loads(value)
+    except ValueError:
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return {}
+
+
+class BatchTooLarge(ValueError):
+    """Lote com imagens demais ou grandes demais"""
+
+
+def check_batch_sizes(sizes):
+    """
+    Confere o número de imagens e os tamanhos (descompactados) antes de ler
+    qualquer uma. Levanta BatchTooLarge se algum limite for excedido.
+    """
+    if len(sizes) > BATCH_MAX_IMAGES:
+        raise BatchTooLarge(f'O lote excede o limite de {BATCH_MAX_IMAGES} imagens')
+    if any(size > BATCH_MAX_IMAGE_BYTES for size in sizes):
+        raise BatchTooLarge(f'Imagem excede o limite de {BATCH_MAX_IMAGE_BYTES // (1024 * 1024)} MB')
+    if sum(sizes) > BATCH_MAX_TOTAL_BYTES:
+        raise BatchTooLarge(f'O lote excede o limite de {BATCH_MAX_TOTAL_BYTES // (1024 * 1024)} MB')
+
+
+def read_batch_items():
+    """
+    Lê as imagens de um lote enviado via multipart.
+
+    Formatos aceitos:
+    - campos 'images' (vários arquivos) e 'estudante_id' (um valor por imagem, na mesma ordem)
+    - campo 'arquivo' com um .zip cujas entradas se chamam '<estudante_id>.jpg'
+      ou '<estudante_id>_<qualquer coisa>.jpg'
+
+    O número de imagens e os tamanhos são conferidos antes de qualquer entrada
+    do .zip ser descompactada (ver check_batch_sizes).
+    Retorna uma lista de dicts com filename, estudante_id e os bytes da imagem.
+    """
+    items = []
+
+    if 'arquivo' in request.files:
+        with zipfile.ZipFile(request.files['arquivo'].stream) as archive:
+            entries = [
+                info for info in archive.infolist()
+                if not info.is_dir() and allowed_file(os.path.basename(info.filename))
+            ]
+            # file_size é o tamanho declarado no .zip; o zipfile não lê além dele
+            check_batch_sizes([info.file_size for info in entries])
+            for info in entries:
+                name = os.path.basename(info.filename)
+                stem = name.rsplit('.', 1)[0]
+                estudante_id = stem.split('_', 1)[0]
+                items.append({
+                    'filename': name,
+                    'estudante_id': int(estudante_id) if estudante_id.isdigit() else None,
+                    'data': archive.read(info)
+                })
+    else:
+        files = request.files.getlist('images')
+        estudante_ids = request.form.getlist('estudante_id')
+        check_batch_sizes([0] * sum(1 for file in files if file.filename and allowed_file(file.filename)))
+        for i, file in enumerate(files):
+            if not file.filename or not allowed_file(file.filename):
+                continue
+            estudante_id = estudante_ids[i] if i < len(estudante_ids) else ''
+            data = file.read(BATCH_MAX_IMAGE_BYTES + 1)
+            check_batch_sizes([len(data)])
+            items.append({
+                'filename': secure_filename(file.filename),
+                'estudante_id': int(estudante_id) if estudante_id.isdigit() else None,
+                'data': data
+            })
+
+    return items
+
+
+def iter_batch_results(indexed_images, quality=None, render='none'):
+    """
+    Distribui as imagens (pares índice, bytes da imagem) entre os processos de
+    inferência e gera (índice, resultado) na ordem em que as análises terminam.
+    """
+    if inference_pool is None:
+        for index, image_bytes in indexed_images:
+            # O lote já foi aceito: com a fila do processo cheia, espera uma vaga
+            while True:
+                try:
+                    result = run_analysis('analyze_image_bytes', image_bytes, quality=quality, render=render)
+                    break
+                except InferencePoolFull as e:
+                    time.sleep(min(e.retry_after, 1))
+            yield index, result
+        return
+
+    pending = {}
+    remaining = list(indexed_images)
+    while remaining or pending:
+        # Enviar o máximo possível sem estourar a fila do pool
+        while remaining:
+            index, image_bytes = remaining[0]
+            try:
+                pending[inference_pool.submit('analyze_image_bytes', image_bytes,
+                                              quality=quality, render=render)] = index
+            except InferencePoolFull as e:
+                if not pending:
+                    time.sleep(min(e.retry_after, 1))
+                break
+            remaining.pop(0)
+
+        if not pending:
+            continue
+
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                yield index, future.result()
+            except Exception as e:
+                yield index, {'error': f'Erro na análise postural: {str(e)}'}
+
+
+@posture_bp.route('/analyze-batch', methods=['POST'])
+@jwt_required()
+def analyze_posture_batch():
+    """
+    Análise postural de um lote de imagens (ex.: uma turma inteira)
+
+    Os resultados são enviados como NDJSON à medida que cada imagem termina;
+    todas as avaliações bem-sucedidas são gravadas em uma única transação e a
+    última linha traz o resumo com os IDs gerados.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        items = read_batch_items()
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except (zipfile.BadZipFile, ValueError) as e:
+        return jsonify({'error': f'Lote inválido: {str(e)}'}), 400
+
+    if not items:
+        return jsonify({'error': 'Nenhuma imagem válida no lote'}), 400
+
+    observacoes = request.form.get('observacoes', '')
+    try:
+        quality = requested_quality(request.form)
+        render = requested_render(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Estudantes do lote conferidos em uma única consulta; imagens de estudantes
+    # inexistentes não são analisadas e aparecem como falhas no resultado
+    estudante_ids = {item['estudante_id'] for item in items if item['estudante_id'] is not None}
+    known_ids = set(db.session.execute(
+        db.select(Estudante.id).where(Estudante.id.in_(estudante_ids))
+    ).scalars()) if estudante_ids else set()
+
+    def generate():
+        for index, item in enumerate(items):
+            if item['estudante_id'] is not None and item['estudante_id'] not in known_ids:
+                item.pop('data')
+                yield json.dumps({'index': index, 'filename': item['filename'], 'estudante_id': item['estudante_id'],
+                                  'success': False, 'error': 'Estudante não encontrado'}) + '\n'
+        indexed_images = [(index, item.pop('data')) for index, item in enumerate(items) if 'data' in item]
+
+        # O lote inteiro usa o mesmo modelo, para que os resultados sejam comparáveis
+        model_quality = choose_quality(quality, extra=len(indexed_images))
+
+        # Os bytes das imagens analisadas ficam em memória até o commit (ver store_images)
+        images = dict(indexed_images)
+        completed = []
+        for index, analysis_result in iter_batch_results(indexed_images, model_quality, render):
+            item = items[index]
+            line = {'index': index, 'filename': item['filename'], 'estudante_id': item['estudante_id']}
+
+            if 'error' in analysis_result:
+                images.pop(index)
+                line.update({'success': False, 'error': analysis_result['error']})
+            else:
+                item['imagem_original'] = image_store.key_for(images[index])
+                analysis_result['exercise_audio_path'] = cached_exercise_audio(analysis_result)
+                report_quality(analysis_result, quality)
+                completed.append((index, analysis_result))
+                line.update({
+                    'success': True,
+                    'metrics': analysis_result['metrics'],
+                    'report': analysis_result['report'],
+                    'confidence_scores': analysis_result.get('confidence_scores'),
+                    'model': analysis_result.get('model'),
+                    'exercise_audio_path': analysis_result.get('exercise_audio_path')
+                })
+                if 'annotated_image' in analysis_result:
+                    line['annotated_image'] = analysis_result['annotated_image']
+            yield json.dumps(line, default=str) + '\n'
+
+        # Gravar todas as avaliações do lote em uma única transação
+        try:
+            ids = save_avaliacoes(current_user_id, [
+                (items[index]['estudante_id'], items[index]['imagem_original'], analysis_result)
+                for index, analysis_result in completed
+            ], observacoes)
+        except Exception as e:
+            yield json.dumps({'summary': True, 'success': False,
+                              'error': f'Erro ao salvar avaliações: {str(e)}'}) + '\n'
+            return
+        store_images([images[index] for index, _ in completed], [result for _, result in completed])
+        avaliacao_ids = {index: avaliacao_id for (index, _), avaliacao_id in zip(completed, ids)}
+
+        # Áudios que ainda não existem são gerados em segundo plano
+        audio_jobs = {}
+        for index, analysis_result in completed:
+            schedule_exercise_audio(analysis_result, avaliacao_ids[index], current_user_id)
+            if analysis_result.get('exercise_audio_job_id'):
+                audio_jobs[str(index)] = analysis_result['exercise_audio_job_id']
+
+        yield json.dumps({
+            'summary': True,
+            'success': True,
+            'total': len(items),
+            'analisadas': len(completed),
+            'falhas': len(items) - len(completed),
+            'avaliacao_ids': {str(index): avaliacao_id for index, avaliacao_id in avaliacao_ids.items()},
+            'audio_jobs': audio_jobs
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def read_view_images(data):
+    """
+    Bytes das fotos de cada vista de uma avaliação completa: arquivos multipart
+    'frontal', 'lateral' e 'posterior' ou campos '<vista>_base64'.
+    Levanta ValueError se alguma imagem for inválida.
+    """
+    from ..services.image_decode import ImageDecodeError, data_from_base64
+
+    images = {}
+    for view in VIEWS:
+        if view in request.files:
+            file = request.files[view]
+            if file.filename == '' or not allowed_file(file.filename):
+                raise ValueError(f'Arquivo de imagem inválido ({view})')
+            images[view] = file.read()
+        elif data.get(f'{view}_base64'):
+            try:
+                images[view] = data_from_base64(data[f'{view}_base64'])
+            except ImageDecodeError:
+                raise ValueError(f'Formato de imagem inválido ({view})')
+    return images
+
+
+@posture_bp.route('/analyze-multiview', methods=['POST'])
+@jwt_required()
+def analyze_posture_multiview():
+    """
+    Avaliação postural completa de um estudante com as fotos frontal, lateral e posterior
+
+    As vistas são analisadas ao mesmo tempo, cada uma em um processo de
+    inferência (ou, sem o pool, em uma thread do próprio processo), sempre com
+    o seu próprio analisador, de modo que a avaliação leva o tempo da vista
+    mais lenta e não a soma das três. Cada métrica vem da vista
+    em que ela é medida (ver merge_views em services/scoring.py). Cada foto é
+    gravada como uma avaliação, e o resultado combinado como uma
+    AvaliacaoPostural do estudante, tudo em uma única transação.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or request.form
+        try:
+            quality = requested_quality(data)
+            render = requested_render(data)
+            landmarks_format = requested_landmarks_format(data)
+            images = read_view_images(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not images:
+            return jsonify({'error': f"Nenhuma imagem fornecida. Envie as vistas {', '.join(VIEWS)}"}), 400
+        estudante_id = str(data.get('estudante_id') or '')
+        if not estudante_id.isdigit():
+            return jsonify({'error': 'ID do estudante é obrigatório'}), 400
+        estudante = db.session.get(Estudante, int(estudante_id))
+        if estudante is None:
+            return jsonify({'error': 'Estudante não encontrado'}), 404
+        estudante_id = estudante.id
+
+        # Mesmas regras de /api/avaliacoes: estudantes só acessam os próprios dados,
+        # e apenas profissionais de saúde criam avaliações
+        current_user = db.session.get(User, int(current_user_id))
+        if current_user is None:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        if current_user.tipo_usuario == 'estudante' and estudante.id_usuario != current_user.id:
+            return jsonify({'error': 'Acesso negado!'}), 403
+        if current_user.tipo_usuario not in ['admin', 'profissional_saude']:
+            return jsonify({'error': 'Acesso negado! Apenas profissionais de saúde podem criar avaliações.'}), 403
+
+        # As vistas usam o mesmo modelo, para que as métricas combinadas sejam comparáveis
+        model_quality = choose_quality(quality, extra=len(images))
+        if inference_pool is None:
+            results = analyze_views_locally(images, model_quality, render)
+        else:
+            results = dict(iter_batch_results(list(images.items()), model_quality, render))
+        errors = {view: result['error'] for view, result in results.items() if 'error' in result}
+        if errors:
+            return jsonify({'error': 'Falha na análise de uma ou mais vistas', 'views': errors}), 400
+
+        views = [view for view in VIEWS if view in results]
+        for view in views:
+            report_quality(results[view], quality)
+            results[view]['exercise_audio_path'] = cached_exercise_audio(results[view])
+        metrics, metric_views = merge_views({view: results[view]['metrics'] for view in views})
+        assessment = {
+            'metrics': metrics,
+            'report': generate_report(metrics),
+            'metric_views': metric_views,
+            'scoring_version': SCORING_VERSION
+        }
+        assessment['exercise_audio_path'] = cached_exercise_audio(assessment)
+
+        entries = [(view, image_store.key_for(images[view]), results[view]) for view in views]
+        avaliacao_ids, avaliacao_postural_id = save_multiview(
+            current_user_id, estudante_id, entries, assessment, data.get('observacoes', '')
+        )
+        store_images([images[view] for view in views], [results[view] for view in views])
+
+        # Áudios que ainda não existem são gerados em segundo plano, como em /analyze
+        for view, avaliacao_id in zip(views, avaliacao_ids):
+            schedule_exercise_audio(results[view], avaliacao_id, current_user_id)
+        schedule_exercise_audio(assessment, None, current_user_id, avaliacao_postural_id)
+
+        return jsonify(dict(
+            assessment,
+            success=True,
+            avaliacao_postural_id=avaliacao_postural_id,
+            estudante_id=estudante_id,
+            views={
+                view: dict(with_landmarks_format(results[view], landmarks_format), avaliacao_id=avaliacao_id,
+                           annotated_image_url=url_for('posture.get_posture_image', avaliacao_id=avaliacao_id,
+                                                       tipo='anotada'))
+                for view, avaliacao_id in zip(views, avaliacao_ids)
+            }
+        )), 200
+
+    except InferencePoolFull as e:
+        return pool_full_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
+
+
+@retry_on_busy
+def save_multiview(usuario_id, estudante_id, entries, assessment, observacoes=''):
+    """
+    Grava as avaliações de cada vista e a AvaliacaoPostural que as combina em
+    uma única transação. entries: lista de (vista, imagem_original, analysis_result).
+    Retorna (IDs das avaliações na ordem de entries, ID da AvaliacaoPostural).
+    """
+    with db.engine.begin() as conn:
+        ids = insert_avaliacoes(conn, usuario_id, [
+            (estudante_id, imagem_original, analysis_result) for _, imagem_original, analysis_result in entries
+        ], observacoes)
+        avaliacao_ids = {view: avaliacao_id for (view, _, _), avaliacao_id in zip(entries, ids)}
+        avaliacao_postural_id = conn.execute(db.insert(AvaliacaoPostural).returning(AvaliacaoPostural.id), {
+            'id_estudante': estudante_id,
+            **{
+                f'imagem_{view}_url': image_url(avaliacao_id, 'original', imagem_original)
+                for (view, imagem_original, _), avaliacao_id in zip(entries, ids)
+            },
+            'dados_alinhamento_json': json.dumps(dict(assessment, avaliacao_ids=avaliacao_ids), default=float),
+            'audio_exercicio_path': assessment.get('exercise_audio_path'),
+            'observacoes': observacoes,
+            'profissional_id': int(usuario_id)
+        }).scalar_one()
+    return ids, avaliacao_postural_id
+
+
+def run_analysis_job(payload, blob):
+    """Handler da fila de tarefas: análise postural completa fora da requisição HTTP"""
+    analysis_result = analyze_and_save(
+        payload['user_id'], payload.get('estudante_id'), payload.get('observacoes', ''),
+        image_base64=payload.get('image_base64'), image_bytes=blob,
+        quality=payload.get('quality', 'auto'), render=payload.get('render', 'full')
+    )
+    return with_landmarks_format(analysis_result, payload.get('landmarks_format', 'objects'))
+
+job_queue.register_handler('posture_analysis', run_analysis_job)
+
+
+@posture_bp.route('/jobs', methods=['POST'])
+@jwt_required()
+def create_analysis_job():
+    """
+    Cria uma tarefa de análise postural assíncrona
+    Aceita os mesmos formatos de /analyze e retorna imediatamente o ID da tarefa
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or request.form
+        try:
+            quality = requested_quality(data)
+            render = requested_render(data)
+            landmarks_format = requested_landmarks_format(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        payload = {
+            'estudante_id': data.get('estudante_id'),
+            'observacoes': data.get('observacoes', ''),
+            'quality': quality,
+            'render': render,
+            'landmarks_format': landmarks_format
+        }
+        blob = None
+
+        if 'image' in request.files:
+            file = request.files['image']
+            if file.filename == '' or not allowed_file(file.filename):
+                return jsonify({'error': 'Arquivo de imagem inválido'}), 400
+            blob = file.read()
+        elif 'image_base64' in data:
+            payload['image_base64'] = data['image_base64']
+        else:
+            return jsonify({'error': 'Imagem não fornecida'}), 400
+
+        job_id = job_queue.enqueue('posture_analysis', payload, user_id=current_user_id, blob=blob)
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'pending',
+            'status_url': url_for('posture.get_analysis_job', job_id=job_id)
+        }), 202
+
     except Exception as e:
         return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
 
 
+@posture_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_analysis_job(job_id):
+    """
+    Retorna o status de uma tarefa de análise e, quando concluída, o resultado
+    """
+    current_user_id = get_jwt_identity()
+    job = job_queue.get(job_id)
+
+    if job is None or job['user_id'] != str(current_user_id):
+        return jsonify({'error': 'Tarefa não encontrada'}), 404
+
+    job.pop('user_id')
+    return jsonify({'success': True, 'job': job}), 200
+
+
+@posture_bp.route('/audio/<job_id>', methods=['GET'])
+@jwt_required()
+def get_exercise_audio_status(job_id):
+    """
+    Retorna o status da geração do áudio do exercício de uma avaliação
+    """
+    current_user_id = get_jwt_identity()
+    job = job_queue.get(job_id)
+
+    if job is None or job['kind'] != 'exercise_audio' or job['user_id'] != str(current_user_id):
+        return jsonify({'error': 'Tarefa de áudio não encontrada'}), 404
+
+    result = job['result'] or {}
+    return jsonify({
+        'success': True,
+        'status': job['status'],
+        'avaliacao_id': result.get('avaliacao_id'),
+        'avaliacao_postural_id': result.get('avaliacao_postural_id'),
+        'audio_path': result.get('audio_path'),
+        'error': job['error']
+    }), 200
+
+
+@posture_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """
+    Retorna os contadores de acerto/erro do cache de resultados de análise
+    """
+    if inference_pool is not None:
+        return jsonify({'success': True, 'cache': inference_pool.cache_stats()}), 200
+
+    if analysis_cache is None:
+        return jsonify({'success': True, 'cache': None}), 200
+
+    return jsonify({'success': True, 'cache': analysis_cache.stats()}), 200
+
+
+@posture_bp.route('/pool/health', methods=['GET'])
+@jwt_required()
+def get_pool_health():
+    """
+    Retorna o estado dos processos do pool de inferência
+    """
+    if inference_pool is None:
+        # Análise no próprio processo (cada worker do gunicorn responde pela sua fila)
+        return jsonify({
+            'status': 'disabled',
+            'pid': os.getpid(),
+            'pending': local_analysis_count,
+            'max_pending': LOCAL_MAX_PENDING,
+            'avg_task_seconds': round(local_avg_seconds, 3),
+            'workers': []
+        }), 200
+
+    health = inference_pool.health()
+    status_code = 200 if health['status'] in ('healthy', 'degraded') or not health['started'] else 503
+    return jsonify(health), status_code
+
+
 @posture_bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_posture_history():
@@ -142,33 +986,30 @@ def get_posture_history():
     try:
         current_user_id = get_jwt_identity()
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Buscar avaliações do usuário
-        cursor.execute('''
-            SELECT a.*, e.nome as estudante_nome
-            FROM avaliacao a
-            LEFT JOIN estudante e ON a.estudante_id = e.id
-            WHERE a.usuario_id = ?
-            ORDER BY a.data_criacao DESC
-        ''', (current_user_id,))
+        # Buscar avaliações do usuário (sem as colunas grandes, que não são exibidas na listagem)
+        query = (
+            db.select(Avaliacao.id, Avaliacao.estudante_id, Avaliacao.data_criacao, Avaliacao.score_geral,
+                      Avaliacao.classificacao_postura, Avaliacao.observacoes, Estudante.nome.label('estudante_nome'))
+            .outerjoin(Estudante, Avaliacao.estudante_id == Estudante.id)
+            .where(Avaliacao.usuario_id == current_user_id)
+            .order_by(Avaliacao.data_criacao.desc())
+        )
+        with db.engine.connect() as conn:
+            rows = conn.execute(query).all()
         
         avaliacoes = []
-        for row in cursor.fetchall():
+        for row in rows:
             avaliacao = {
-                'id': row[0],
-                'estudante_id': row[2],
-                'estudante_nome': row[-1],
-                'data_criacao': row[3],
-                'score_geral': row[6],
-                'classificacao_postura': row[7],
-                'observacoes': row[10]
+                'id': row.id,
+                'estudante_id': row.estudante_id,
+                'estudante_nome': row.estudante_nome,
+                'data_criacao': format_timestamp(row.data_criacao),
+                'score_geral': row.score_geral,
+                'classificacao_postura': row.classificacao_postura,
+                'observacoes': row.observacoes
             }
             avaliacoes.append(avaliacao)
         
-        conn.close()
-        
         return jsonify({
             'success': True,
             'avaliacoes': avaliacoes
@@ -183,53 +1024,53 @@ def get_posture_history():
 def get_posture_details(avaliacao_id):
     """
     Retorna detalhes completos de uma avaliação específica
+    Com ?landmarks_format=objects|columnar, inclui os landmarks gravados
     """
     try:
         current_user_id = get_jwt_identity()
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        try:
+            landmarks_format = requested_landmarks_format(request.args, default=None)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Buscar avaliação específica
-        cursor.execute('''
-            SELECT a.*, e.nome as estudante_nome, u.nome as avaliador_nome
-            FROM avaliacao a
-            LEFT JOIN estudante e ON a.estudante_id = e.id
-            LEFT JOIN user u ON a.usuario_id = u.id
-            WHERE a.id = ? AND a.usuario_id = ?
-        ''', (avaliacao_id, current_user_id))
-        
-        row = cursor.fetchone()
+        query = (
+            db.select(Avaliacao, Estudante.nome.label('estudante_nome'), User.nome.label('avaliador_nome'))
+            .outerjoin(Estudante, Avaliacao.estudante_id == Estudante.id)
+            .outerjoin(User, Avaliacao.usuario_id == User.id)
+            .where(Avaliacao.id == avaliacao_id, Avaliacao.usuario_id == current_user_id)
+        )
+        row = db.session.execute(query).first()
         if not row:
             return jsonify({'error': 'Avaliação não encontrada'}), 404
-        
-        # Converter strings de volta para objetos Python
-        import ast
-        try:
-            metricas = ast.literal_eval(row[8]) if row[8] else {}
-            relatorio = ast.literal_eval(row[9]) if row[9] else {}
-        except:
-            metricas = {}
-            relatorio = {}
+        avaliacao = row.Avaliacao
         
         avaliacao_detalhada = {
-            'id': row[0],
-            'usuario_id': row[1],
-            'estudante_id': row[2],
-            'data_criacao': row[3],
-            'imagem_original': row[4],
-            'imagem_anotada': row[5],
-            'score_geral': row[6],
-            'classificacao_postura': row[7],
-            'metricas_detalhadas': metricas,
-            'relatorio_completo': relatorio,
-            'observacoes': row[10],
-            'audio_exercicio_path': row[11],
-            'estudante_nome': row[-2],
-            'avaliador_nome': row[-1]
+            'id': avaliacao.id,
+            'usuario_id': avaliacao.usuario_id,
+            'estudante_id': avaliacao.estudante_id,
+            'data_criacao': format_timestamp(avaliacao.data_criacao),
+            'imagem_original': avaliacao.imagem_original,
+            'imagem_anotada': avaliacao.imagem_anotada,
+            'imagem_original_url': image_url(avaliacao_id, 'original', avaliacao.imagem_original),
+            'imagem_anotada_url': image_url(avaliacao_id, 'anotada', avaliacao.imagem_anotada or
+                                            ((avaliacao.landmarks_bin or avaliacao.landmarks) and
+                                             avaliacao.imagem_original)),
+            'score_geral': avaliacao.score_geral,
+            'classificacao_postura': avaliacao.classificacao_postura,
+            # Converter o JSON de volta para objetos Python
+            'metricas_detalhadas': load_json_column(avaliacao.metricas_detalhadas),
+            'relatorio_completo': load_json_column(avaliacao.relatorio_completo),
+            'observacoes': avaliacao.observacoes,
+            'audio_exercicio_path': avaliacao.audio_exercicio_path,
+            'estudante_nome': row.estudante_nome,
+            'avaliador_nome': row.avaliador_nome
         }
-        
-        conn.close()
+        if landmarks_format is not None:
+            landmarks = load_landmarks(avaliacao.landmarks_bin, avaliacao.landmarks)
+            avaliacao_detalhada['landmarks'] = (
+                format_landmarks(landmarks, landmarks_format) if landmarks is not None else None
+            )
         
         return jsonify({
             'success': True,
@@ -240,11 +1081,229 @@ def get_posture_details(avaliacao_id):
         return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
 
 
+def image_url(avaliacao_id, tipo, value):
+    """URL da imagem de uma avaliação (None para avaliações antigas com a imagem embutida)"""
+    if not is_image_key(value):
+        return None
+    return url_for('posture.get_posture_image', avaliacao_id=avaliacao_id, tipo=tipo)
+
+
+@posture_bp.route('/images/<int:avaliacao_id>/<tipo>', methods=['GET'])
+@jwt_required()
+def get_posture_image(avaliacao_id, tipo):
+    """
+    Retorna a imagem original ou anotada de uma avaliação.
+    Com USE_X_SENDFILE habilitado, o envio do arquivo é delegado ao servidor web.
+
+    A anotada aceita ?render=full|thumbnail, ?format=jpeg|webp e ?quality=1-100.
+    Se ainda não existir (análise feita sem render=full) ou se for pedida em
+    outro formato, é desenhada a partir dos landmarks gravados, sem executar
+    o modelo; a versão padrão gerada assim fica guardada para os próximos pedidos.
+    """
+    if tipo not in ('original', 'anotada'):
+        return jsonify({'error': 'Tipo de imagem inválido'}), 400
+
+    current_user_id = get_jwt_identity()
+    with db.engine.connect() as conn:
+        row = conn.execute(
+            db.select(Avaliacao.imagem_original, Avaliacao.imagem_anotada, Avaliacao.landmarks_bin,
+                      Avaliacao.landmarks, Avaliacao.metricas_detalhadas)
+            .where(Avaliacao.id == avaliacao_id, Avaliacao.usuario_id == current_user_id)
+        ).first()
+    if row is None:
+        return jsonify({'error': 'Imagem não encontrada'}), 404
+
+    if tipo == 'anotada':
+        render = request.args.get('render', 'full').lower()
+        image_format = request.args.get('format')
+        quality = request.args.get('quality', type=int)
+        if render not in ('full', 'thumbnail'):
+            return jsonify({'error': f"Modo de renderização inválido: {render}. Use full, thumbnail"}), 400
+        if quality is not None and not 1 <= quality <= 100:
+            return jsonify({'error': 'Qualidade deve estar entre 1 e 100'}), 400
+        default_version = render == 'full' and image_format is None and quality is None
+        if not (default_version and image_store.exists(row.imagem_anotada)):
+            return render_annotated_image(avaliacao_id, row, render, image_format, quality, default_version)
+        key = row.imagem_anotada
+    else:
+        key = row.imagem_original
+
+    if not image_store.exists(key):
+        return jsonify({'error': 'Imagem não encontrada'}), 404
+
+    return send_image(*image_store.location(key))
+
+
+def send_image(directory, filename):
+    response = send_from_directory(os.path.abspath(directory), filename, max_age=31536000)
+    # O conteúdo nunca muda (chave = hash), mas a imagem é privada do usuário
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+def render_annotated_image(avaliacao_id, row, render, image_format, quality, store):
+    """Desenha a imagem anotada a partir da imagem original e dos landmarks gravados"""
+    # OpenCV e MediaPipe só são importados quando uma anotação é realmente gerada
+    from ..services import annotation
+    from ..services.image_decode import ImageDecodeError, decode_image
+
+    if image_format is not None and image_format not in annotation.IMAGE_FORMATS:
+        return jsonify({'error': f"Formato de imagem inválido: {image_format}. "
+                                 f"Use {', '.join(annotation.IMAGE_FORMATS)}"}), 400
+    landmarks = load_landmarks(row.landmarks_bin, row.landmarks)
+    if landmarks is None or not image_store.exists(row.imagem_original):
+        return jsonify({'error': 'Imagem não encontrada'}), 404
+
+    # A anotação completa é desenhada na foto em tamanho original (0 = sem redução)
+    max_side = annotation.THUMBNAIL_SIDE if render == 'thumbnail' else 0
+    try:
+        image = decode_image(image_store.read(row.imagem_original), max_side)
+    except ImageDecodeError:
+        return jsonify({'error': 'Imagem original inválida'}), 500
+    data = annotation.render_annotation(image.rgb, landmarks, load_json_column(row.metricas_detalhadas),
+                                        render, image_format, quality)
+
+    if store:
+        key = image_store.put(data, annotation.extension())
+        set_annotated_image(avaliacao_id, key)
+        return send_image(*image_store.location(key))
+
+    response = Response(data, mimetype=annotation.mimetype(image_format))
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000
+    return response
+
+
+@retry_on_busy
+def set_annotated_image(avaliacao_id, key):
+    with db.engine.begin() as conn:
+        conn.execute(db.update(Avaliacao).where(Avaliacao.id == avaliacao_id).values(imagem_anotada=key))
+
+
+@posture_bp.cli.command('migrate-inline-images')
+def migrate_inline_images_command():
+    """Move as imagens base64 antigas da tabela avaliacao para o armazenamento de imagens"""
+    migrated = migrate_inline_images(db.engine)
+    # Devolver ao sistema o espaço ocupado pelas imagens (VACUUM não roda dentro de transação)
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(db.text('VACUUM'))
+    print(f'{migrated} avaliações migradas')
+
+
+@posture_bp.cli.command('pack-landmarks')
+@click.option('--encoding', type=click.Choice(list(lm.ENCODINGS)), default=lm.STORAGE_ENCODING,
+              help='f32 (sem perda), f16 ou q16')
+def pack_landmarks_command(encoding):
+    """Converte os landmarks em JSON das avaliações antigas para o formato binário"""
+    packed = pack_stored_landmarks(db.engine, encoding)
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(db.text('VACUUM'))
+    print(f'{packed} avaliações convertidas ({encoding})')
+
+
+@posture_bp.cli.command('backfill-metrics')
+@click.option('--batch-size', type=int, default=1000, help='Avaliações por transação')
+def backfill_metrics_command(batch_size):
+    """Preenche avaliacao_metrica para avaliações gravadas antes da tabela existir"""
+    sem_metricas = ~db.exists().where(AvaliacaoMetrica.avaliacao_id == Avaliacao.id)
+    processed = 0
+    last_id = 0
+    while True:
+        # Um lote por transação, percorrendo as avaliações pelo ID
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                db.select(Avaliacao.id, Avaliacao.metricas_detalhadas)
+                .where(Avaliacao.id > last_id, sem_metricas)
+                .order_by(Avaliacao.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            bulk_insert(conn, AvaliacaoMetrica.__table__, [
+                metric for avaliacao_id, metricas in rows
+                for metric in metric_rows(avaliacao_id, load_json_column(metricas))
+            ])
+        processed += len(rows)
+        print(f'  {processed} avaliações processadas...')
+    print(f'{processed} avaliações processadas')
+
+
+def run_rescore_job(payload, blob):
+    """Handler da fila de tarefas: recalcula as avaliações gravadas com as regras de pontuação atuais"""
+    since = payload.get('desde')
+    return rescore_avaliacoes(
+        db.engine, usuario_id=payload.get('usuario_id'), estudante_id=payload.get('estudante_id'),
+        since=datetime.fromisoformat(since) if since else None, force=payload.get('force', False)
+    )
+
+job_queue.register_handler('rescore', run_rescore_job)
+
+
+@posture_bp.route('/rescore', methods=['POST'])
+@jwt_required()
+def create_rescore_job():
+    """
+    Agenda o recálculo das avaliações a partir dos landmarks gravados (apenas administradores).
+    Filtros opcionais no corpo JSON: usuario_id, estudante_id, desde (data ISO) e
+    force (recalcula também as avaliações já na versão atual das regras).
+    """
+    current_user_id = get_jwt_identity()
+    user = db.session.get(User, int(current_user_id))
+    if user is None or user.tipo_usuario != 'admin':
+        return jsonify({'error': 'Acesso negado! Apenas administradores podem recalcular avaliações.'}), 403
+
+    data = request.get_json(silent=True) or {}
+    payload = {'force': bool(data.get('force', False))}
+    try:
+        for campo in ('usuario_id', 'estudante_id'):
+            if data.get(campo) is not None:
+                payload[campo] = int(data[campo])
+        if data.get('desde'):
+            payload['desde'] = datetime.fromisoformat(data['desde']).isoformat()
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Filtro inválido: {str(e)}'}), 400
+
+    job_id = job_queue.enqueue('rescore', payload, user_id=current_user_id)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'pending',
+        'status_url': url_for('posture.get_analysis_job', job_id=job_id),
+        'scoring_rules': scoring_rules()
+    }), 202
+
+
+@posture_bp.cli.command('rescore')
+@click.option('--usuario-id', type=int, help='Apenas as avaliações deste usuário')
+@click.option('--estudante-id', type=int, help='Apenas as avaliações deste estudante')
+@click.option('--desde', type=click.DateTime(), help='Apenas as avaliações criadas a partir desta data')
+@click.option('--force', is_flag=True, help='Recalcula também as avaliações já na versão atual das regras')
+def rescore_command(usuario_id, estudante_id, desde, force):
+    """Recalcula métricas, fatores de risco e classificação a partir dos landmarks gravados"""
+    started = time.perf_counter()
+    counts = rescore_avaliacoes(
+        db.engine, usuario_id=usuario_id, estudante_id=estudante_id, since=desde, force=force,
+        progress=lambda counts: print(f"  {counts['rescored']} avaliações recalculadas...")
+    )
+    print(f"Regras v{counts['version']}: {counts['rescored']} avaliações recalculadas "
+          f"({counts['reclassified']} reclassificadas, {counts['unchanged']} sem mudanças, "
+          f"{counts['skipped']} ignoradas) "
+          f"em {time.perf_counter() - started:.1f}s")
+
+
 @posture_bp.route('/compare', methods=['POST'])
 @jwt_required()
 def compare_postures():
     """
     Compara duas avaliações posturais
+
+    `metricas` de cada avaliação traz o conteúdo completo de
+    metricas_detalhadas (scores, classificação e fatores de risco), como antes
+    da tabela avaliacao_metrica. As áreas que melhoraram ou pioraram (mais de
+    5 pontos nas métricas de METRICAS_COMPARACAO) são calculadas no banco a
+    partir de avaliacao_metrica; avaliações ainda não incluídas nela (ver
+    `flask posture backfill-metrics`) são comparadas pelas métricas gravadas.
     """
     try:
         current_user_id = get_jwt_identity()
@@ -256,39 +1315,53 @@ def compare_postures():
         if not avaliacao1_id or not avaliacao2_id:
             return jsonify({'error': 'IDs das avaliações são obrigatórios'}), 400
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Buscar ambas as avaliações
-        cursor.execute('''
-            SELECT id, data_criacao, score_geral, classificacao_postura, metricas_detalhadas
-            FROM avaliacao
-            WHERE id IN (?, ?) AND usuario_id = ?
-        ''', (avaliacao1_id, avaliacao2_id, current_user_id))
-        
-        rows = cursor.fetchall()
-        if len(rows) != 2:
-            return jsonify({'error': 'Uma ou ambas avaliações não foram encontradas'}), 404
-        
-        # Processar dados das avaliações
-        avaliacoes = []
-        for row in rows:
-            import ast
-            try:
-                metricas = ast.literal_eval(row[4]) if row[4] else {}
-            except:
-                metricas = {}
+        with db.engine.connect() as conn:
+            # Buscar ambas as avaliações
+            rows = conn.execute(
+                db.select(Avaliacao.id, Avaliacao.data_criacao, Avaliacao.score_geral, Avaliacao.classificacao_postura,
+                          Avaliacao.metricas_detalhadas)
+                .where(Avaliacao.id.in_([avaliacao1_id, avaliacao2_id]), Avaliacao.usuario_id == current_user_id)
+                .order_by(Avaliacao.id)
+            ).all()
+            if len(rows) != 2:
+                return jsonify({'error': 'Uma ou ambas avaliações não foram encontradas'}), 404
             
-            avaliacoes.append({
-                'id': row[0],
-                'data_criacao': row[1],
-                'score_geral': row[2],
-                'classificacao_postura': row[3],
-                'metricas': metricas
-            })
+            metricas = {row.id: load_json_column(row.metricas_detalhadas) for row in rows}
+            com_tabela = set(conn.execute(
+                db.select(AvaliacaoMetrica.avaliacao_id.distinct())
+                .where(AvaliacaoMetrica.avaliacao_id.in_([rows[0].id, rows[1].id]))
+            ).scalars())
+            
+            if len(com_tabela) == 2:
+                # Diferenças significativas (mais de 5 pontos) calculadas no banco
+                anterior = db.aliased(AvaliacaoMetrica)
+                atual = db.aliased(AvaliacaoMetrica)
+                diferenca = (atual.valor - anterior.valor).label('diferenca')
+                diferencas = conn.execute(
+                    db.select(anterior.metrica, diferenca)
+                    .join(atual, db.and_(atual.metrica == anterior.metrica, atual.avaliacao_id == rows[1].id))
+                    .where(anterior.avaliacao_id == rows[0].id,
+                           anterior.metrica.in_(METRICAS_COMPARACAO),
+                           db.func.abs(diferenca) > 5)
+                    .order_by(anterior.metrica)
+                ).all()
+            else:
+                anteriores, atuais = metricas[rows[0].id], metricas[rows[1].id]
+                diferencas = [
+                    (metrica, atuais[metrica] - anteriores[metrica])
+                    for metrica in sorted(METRICAS_COMPARACAO)
+                    if metrica in anteriores and metrica in atuais
+                    and abs(atuais[metrica] - anteriores[metrica]) > 5
+                ]
         
-        # Ordenar por ID para manter consistência
-        avaliacoes.sort(key=lambda x: x['id'])
+        # Ordenadas por ID para manter consistência
+        avaliacoes = [{
+            'id': row.id,
+            'data_criacao': format_timestamp(row.data_criacao),
+            'score_geral': row.score_geral,
+            'classificacao_postura': row.classificacao_postura,
+            'metricas': metricas[row.id]
+        } for row in rows]
         
         # Calcular comparação
         comparacao = {
@@ -302,32 +1375,69 @@ def compare_postures():
             }
         }
         
-        # Comparar métricas específicas
-        metricas_anteriores = avaliacoes[0]['metricas']
-        metricas_atuais = avaliacoes[1]['metricas']
+        for metrica, valor in diferencas:
+            area = {'area': metrica.replace('_', ' ').title(), 'diferenca': valor}
+            if valor > 0:  # Melhora significativa
+                comparacao['evolucao']['areas_melhoradas'].append(area)
+            else:  # Piora significativa
+                comparacao['evolucao']['areas_pioradas'].append(area)
         
-        metricas_comparar = ['head_alignment_score', 'shoulder_alignment_score', 'vertical_alignment_score']
+        return jsonify({
+            'success': True,
+            'comparacao': comparacao
+        }), 200
         
-        for metrica in metricas_comparar:
-            if metrica in metricas_anteriores and metrica in metricas_atuais:
-                diferenca = metricas_atuais[metrica] - metricas_anteriores[metrica]
-                if diferenca > 5:  # Melhora significativa
-                    comparacao['evolucao']['areas_melhoradas'].append({
-                        'area': metrica.replace('_', ' ').title(),
-                        'diferenca': diferenca
-                    })
-                elif diferenca < -5:  # Piora significativa
-                    comparacao['evolucao']['areas_pioradas'].append({
-                        'area': metrica.replace('_', ' ').title(),
-                        'diferenca': diferenca
-                    })
+    except Exception as e:
+        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
+
+
+@posture_bp.route('/metrics/aggregate', methods=['GET'])
+@jwt_required()
+def aggregate_metrics():
+    """
+    Estatísticas (quantidade, média, mínimo e máximo) das métricas das avaliações do usuário.
+    Filtros opcionais: metrica (pode repetir), estudante_id, escola_id, desde, ate (YYYY-MM-DD)
+    """
+    try:
+        current_user_id = get_jwt_identity()
         
-        conn.close()
+        query = (
+            db.select(AvaliacaoMetrica.metrica, db.func.count(), db.func.avg(AvaliacaoMetrica.valor),
+                      db.func.min(AvaliacaoMetrica.valor), db.func.max(AvaliacaoMetrica.valor))
+            .join(Avaliacao, Avaliacao.id == AvaliacaoMetrica.avaliacao_id)
+            .where(Avaliacao.usuario_id == current_user_id)
+            .group_by(AvaliacaoMetrica.metrica)
+            .order_by(AvaliacaoMetrica.metrica)
+        )
+        
+        metricas = request.args.getlist('metrica')
+        if metricas:
+            query = query.where(AvaliacaoMetrica.metrica.in_(metricas))
+        if request.args.get('estudante_id'):
+            query = query.where(Avaliacao.estudante_id == request.args.get('estudante_id', type=int))
+        if request.args.get('escola_id'):
+            query = query.where(Avaliacao.estudante_id.in_(
+                db.select(Estudante.id).where(Estudante.escola_id == request.args.get('escola_id', type=int))
+            ))
+        try:
+            if request.args.get('desde'):
+                query = query.where(Avaliacao.data_criacao >= datetime.strptime(request.args['desde'], '%Y-%m-%d'))
+            if request.args.get('ate'):
+                fim = datetime.strptime(request.args['ate'], '%Y-%m-%d') + timedelta(days=1)
+                query = query.where(Avaliacao.data_criacao < fim)
+        except ValueError:
+            return jsonify({'error': 'Datas devem estar no formato AAAA-MM-DD'}), 400
+        
+        with db.engine.connect() as conn:
+            rows = conn.execute(query).all()
         
         return jsonify({
             'success': True,
-            'comparacao': comparacao
+            'metricas': {
+                metrica: {'quantidade': count, 'media': media, 'minimo': minimo, 'maximo': maximo}
+                for metrica, count, media, minimo, maximo in rows
+            }
         }), 200
         
     except Exception as e:
-        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Erro interno do servidor: {str(e)}'}), 500
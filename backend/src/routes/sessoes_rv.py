@@ -1,10 +1,14 @@
 from flask import Blueprint, request, jsonify
-from src.models.user import db, SessaoRV, Estudante
+from src.models.user import db, SessaoRV, Estudante, Escola
 from src.routes.auth import token_required
+from src.routes.pagination import keyset_page, PaginationError
 import json
 
 sessoes_rv_bp = Blueprint('sessoes_rv', __name__)
 
+# Agrupamentos aceitos em ?periodo=
+PERIODOS = {'semana': 'week', 'mes': 'month'}
+
 @sessoes_rv_bp.route('/', methods=['GET'])
 @token_required
 def listar_sessoes_rv(current_user):
@@ -21,24 +25,25 @@ def listar_sessoes_rv(current_user):
                 estudante.id_usuario != current_user.id):
                 return jsonify({'message': 'Acesso negado!'}), 403
             
-            sessoes = SessaoRV.query.filter_by(id_estudante=estudante_id).all()
+            sessoes = SessaoRV.query.filter_by(id_estudante=estudante_id)
         else:
             # Listar todas as sessões baseado no tipo de usuário
             if current_user.tipo_usuario == 'admin':
-                sessoes = SessaoRV.query.all()
+                sessoes = SessaoRV.query
             elif current_user.tipo_usuario in ['profissional_saude', 'gestor_educacional']:
-                sessoes = SessaoRV.query.all()  # Simplificado por enquanto
+                sessoes = SessaoRV.query  # Simplificado por enquanto
             else:
                 # Estudantes só veem suas próprias sessões
                 estudante = Estudante.query.filter_by(id_usuario=current_user.id).first()
                 if estudante:
-                    sessoes = SessaoRV.query.filter_by(id_estudante=estudante.id).all()
+                    sessoes = SessaoRV.query.filter_by(id_estudante=estudante.id)
                 else:
-                    sessoes = []
+                    sessoes = SessaoRV.query.filter(db.false())
         
-        return jsonify({
-            'sessoes': [sessao.to_dict() for sessao in sessoes]
-        }), 200
+        return jsonify(keyset_page(sessoes, SessaoRV, 'sessoes')), 200
+        
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
         
     except Exception as e:
         return jsonify({'message': f'Erro ao listar sessões de RV: {str(e)}'}), 500
@@ -184,29 +189,97 @@ def obter_estatisticas_estudante(current_user, estudante_id):
             if estudante.id_usuario != current_user.id:
                 return jsonify({'message': 'Acesso negado!'}), 403
         
-        # Obter estatísticas das sessões
-        sessoes = SessaoRV.query.filter_by(id_estudante=estudante_id).all()
+        periodo = request.args.get('periodo')
+        if periodo and periodo not in PERIODOS:
+            return jsonify({'message': 'Período inválido! Use semana ou mes.'}), 400
         
-        total_sessoes = len(sessoes)
-        total_tempo = sum(s.duracao_minutos or 0 for s in sessoes)
-        pontuacao_media = sum(s.pontuacao or 0 for s in sessoes) / total_sessoes if total_sessoes > 0 else 0
+        return jsonify(calcular_estatisticas(SessaoRV.id_estudante == estudante_id, periodo)), 200
         
-        sessoes_por_tipo = {}
-        for sessao in sessoes:
-            tipo = sessao.tipo_sessao
-            if tipo not in sessoes_por_tipo:
-                sessoes_por_tipo[tipo] = 0
-            sessoes_por_tipo[tipo] += 1
+    except Exception as e:
+        return jsonify({'message': f'Erro ao obter estatísticas: {str(e)}'}), 500
+
+
+@sessoes_rv_bp.route('/estatisticas/escola/<int:escola_id>', methods=['GET'])
+@token_required
+def obter_estatisticas_escola(current_user, escola_id):
+    try:
+        if current_user.tipo_usuario not in ['admin', 'profissional_saude', 'gestor_educacional']:
+            return jsonify({'message': 'Acesso negado!'}), 403
         
-        return jsonify({
-            'estatisticas': {
-                'total_sessoes': total_sessoes,
-                'total_tempo_minutos': total_tempo,
-                'pontuacao_media': round(pontuacao_media, 2),
-                'sessoes_por_tipo': sessoes_por_tipo
-            }
-        }), 200
+        escola = Escola.query.get(escola_id)
+        if not escola:
+            return jsonify({'message': 'Escola não encontrada!'}), 404
+        
+        periodo = request.args.get('periodo')
+        if periodo and periodo not in PERIODOS:
+            return jsonify({'message': 'Período inválido! Use semana ou mes.'}), 400
+        
+        estudantes_da_escola = db.select(Estudante.id).where(Estudante.escola_id == escola_id)
+        resultado = calcular_estatisticas(SessaoRV.id_estudante.in_(estudantes_da_escola), periodo)
+        resultado['estatisticas']['total_estudantes'] = db.session.scalar(
+            db.select(db.func.count(db.distinct(SessaoRV.id_estudante))).where(
+                SessaoRV.id_estudante.in_(estudantes_da_escola))
+        )
+        return jsonify(resultado), 200
         
     except Exception as e:
         return jsonify({'message': f'Erro ao obter estatísticas: {str(e)}'}), 500
 
+def _inicio_periodo(periodo):
+    """Expressão SQL com a data de início da semana (segunda-feira) ou do mês de cada sessão"""
+    if db.engine.dialect.name == 'postgresql':
+        return db.func.to_char(db.func.date_trunc(PERIODOS[periodo], SessaoRV.data_sessao), 'YYYY-MM-DD')
+    if periodo == 'semana':
+        return db.func.date(SessaoRV.data_sessao, 'weekday 0', '-6 days')
+    return db.func.strftime('%Y-%m-01', SessaoRV.data_sessao)
+
+def calcular_estatisticas(filtro, periodo=None):
+    """
+    Estatísticas das sessões que satisfazem `filtro`, calculadas no banco
+    (GROUP BY), sem carregar as sessões em memória.
+    """
+    # Sessões sem pontuação contam como zero na média
+    pontuacao = db.func.coalesce(SessaoRV.pontuacao, 0)
+    
+    total_sessoes, total_tempo, pontuacao_media = db.session.execute(
+        db.select(
+            db.func.count(SessaoRV.id),
+            db.func.coalesce(db.func.sum(SessaoRV.duracao_minutos), 0),
+            db.func.avg(pontuacao)
+        ).where(filtro)
+    ).one()
+    
+    sessoes_por_tipo = dict(db.session.execute(
+        db.select(SessaoRV.tipo_sessao, db.func.count(SessaoRV.id))
+        .where(filtro)
+        .group_by(SessaoRV.tipo_sessao)
+    ).all())
+    
+    resultado = {
+        'estatisticas': {
+            'total_sessoes': total_sessoes,
+            'total_tempo_minutos': total_tempo,
+            'pontuacao_media': round(pontuacao_media or 0, 2),
+            'sessoes_por_tipo': sessoes_por_tipo
+        }
+    }
+    
+    if periodo:
+        inicio = _inicio_periodo(periodo).label('inicio')
+        linhas = db.session.execute(
+            db.select(
+                inicio,
+                db.func.count(SessaoRV.id),
+                db.func.coalesce(db.func.sum(SessaoRV.duracao_minutos), 0),
+                db.func.avg(pontuacao)
+            ).where(filtro).group_by(inicio).order_by(inicio)
+        ).all()
+        resultado['series'] = [{
+            'inicio': inicio_periodo,
+            'total_sessoes': quantidade,
+            'total_tempo_minutos': tempo,
+            'pontuacao_media': round(media or 0, 2)
+        } for inicio_periodo, quantidade, tempo, media in linhas]
+        resultado['periodo'] = periodo
+    
+    return resultado
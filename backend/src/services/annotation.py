@@ -0,0 +1,169 @@
+"""
+Desenho e codificação da imagem anotada da análise postural.
+
+A anotação depende só da imagem, dos landmarks normalizados e das métricas,
+então pode ser gerada logo após a inferência ou depois, a partir do que foi
+gravado na avaliação (GET /api/posture/images/<id>/anotada), sem executar o modelo.
+
+Modos de renderização:
+- none: nenhuma imagem (só as métricas), o padrão da API;
+- thumbnail: miniatura com o esqueleto e as linhas de referência, sem o quadro de texto;
+- full: imagem completa, como o frontend exibe.
+"""
+import os
+import base64
+from typing import Dict, List, Optional, Union
+
+import cv2
+import numpy as np
+import mediapipe as mp
+from mediapipe.framework.formats import landmark_pb2
+
+RENDER_MODES = ('none', 'thumbnail', 'full')
+# Formato: (extensão, mimetype, parâmetro de qualidade do cv2.imencode)
+IMAGE_FORMATS = {
+    'jpeg': ('jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+ANNOTATION_FORMAT = os.environ.get('POSTURE_ANNOTATION_FORMAT', 'jpeg')
+ANNOTATION_QUALITY = int(os.environ.get('POSTURE_ANNOTATION_QUALITY', 95))
+THUMBNAIL_QUALITY = int(os.environ.get('POSTURE_THUMBNAIL_QUALITY', 80))
+THUMBNAIL_SIDE = int(os.environ.get('POSTURE_THUMBNAIL_SIDE', 320))
+
+mp_pose = mp.solutions.pose
+mp_drawing = mp.solutions.drawing_utils
+mp_drawing_styles = mp.solutions.drawing_styles
+
+
+def landmark_list(landmarks: Union[List[Dict], np.ndarray]) -> landmark_pb2.NormalizedLandmarkList:
+    """
+    Converte os landmarks (dicts com x, y, z, visibility ou o array (33, 4) de
+    services/landmarks.py) para o formato do MediaPipe
+    """
+    if isinstance(landmarks, np.ndarray):
+        rows = landmarks.tolist()
+    else:
+        rows = [(lm['x'], lm['y'], lm['z'], lm['visibility']) for lm in landmarks]
+    return landmark_pb2.NormalizedLandmarkList(landmark=[
+        landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=visibility)
+        for x, y, z, visibility in rows
+    ])
+
+
+def draw_annotation(image: np.ndarray, landmarks: List[Dict], metrics: Dict, info_box: bool = True) -> np.ndarray:
+    """Desenha o esqueleto, as linhas de referência e (opcionalmente) as métricas sobre uma cópia da imagem RGB"""
+    annotated_image = image.copy()
+    pose_landmarks = landmark_list(landmarks)
+
+    mp_drawing.draw_landmarks(
+        annotated_image,
+        pose_landmarks,
+        mp_pose.POSE_CONNECTIONS,
+        landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style()
+    )
+
+    landmarks = pose_landmarks.landmark
+    height, width = image.shape[:2]
+
+    # Linha vertical de referência (linha de gravidade)
+    ankle_avg_x = (landmarks[mp_pose.PoseLandmark.LEFT_ANKLE].x +
+                   landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE].x) / 2
+
+    cv2.line(annotated_image,
+             (int(ankle_avg_x * width), 0),
+             (int(ankle_avg_x * width), height),
+             (255, 255, 0), 2)
+
+    # Linha horizontal dos ombros
+    left_shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER]
+    right_shoulder = landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER]
+    cv2.line(annotated_image,
+             (int(left_shoulder.x * width), int(left_shoulder.y * height)),
+             (int(right_shoulder.x * width), int(right_shoulder.y * height)),
+             (255, 0, 255), 2)
+
+    # Linha horizontal dos quadris
+    left_hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP]
+    right_hip = landmarks[mp_pose.PoseLandmark.RIGHT_HIP]
+    cv2.line(annotated_image,
+             (int(left_hip.x * width), int(left_hip.y * height)),
+             (int(right_hip.x * width), int(right_hip.y * height)),
+             (0, 255, 255), 2)
+
+    if not info_box:
+        return annotated_image
+
+    # Adicionar informações detalhadas
+    info_box_height = 200
+    # Fundo preto com 70% de opacidade: escurece só a região da caixa, sem copiar a imagem inteira
+    box = annotated_image[10:info_box_height + 1, 10:451]
+    box[:] = cv2.convertScaleAbs(box, alpha=0.3)
+
+    # Texto com métricas
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.6
+    color = (255, 255, 255)
+    thickness = 2
+    lines = [
+        f"Score Geral: {metrics.get('overall_posture_score', 0):.1f}%",
+        f"Classificacao: {metrics.get('posture_classification', 'N/A')}",
+        f"Cabeca (Lateral): {metrics.get('head_alignment_score', 0):.1f}%",
+        f"Lateral (Assimetria): {metrics.get('lateral_alignment_score', 0):.1f}%",
+        f"Vertical (Perfil): {metrics.get('vertical_alignment_score', 0):.1f}%",
+        f"Membros Inf.: {metrics.get('lower_limb_score', 0):.1f}%",
+    ]
+    for i, text in enumerate(lines):
+        cv2.putText(annotated_image, text, (15, 35 + 25 * i), font, font_scale, color, thickness)
+
+    return annotated_image
+
+
+def encode_image(image: np.ndarray, image_format: str = ANNOTATION_FORMAT,
+                 quality: int = ANNOTATION_QUALITY) -> bytes:
+    """
+    Codifica uma imagem RGB em JPEG ou WebP. A imagem é convertida para BGR
+    no próprio buffer, então não deve ser usada depois.
+    """
+    ext, _, quality_flag = IMAGE_FORMATS[image_format]
+    image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=image)
+    ok, buffer = cv2.imencode(f'.{ext}', image_bgr, [int(quality_flag), int(quality)])
+    if not ok:
+        raise ValueError(f"Falha ao codificar a imagem em {image_format}")
+    return buffer.tobytes()
+
+
+def thumbnail(image: np.ndarray, side: int = THUMBNAIL_SIDE) -> np.ndarray:
+    scale = side / max(image.shape[:2])
+    if scale >= 1:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def render_annotation(image: np.ndarray, landmarks: List[Dict], metrics: Dict, render: str = 'full',
+                      image_format: Optional[str] = None, quality: Optional[int] = None) -> Optional[bytes]:
+    """Imagem anotada codificada no modo pedido (None para render=none)"""
+    if render not in RENDER_MODES:
+        raise ValueError(f"Modo de renderização inválido: {render}. Use {', '.join(RENDER_MODES)}")
+    if render == 'none':
+        return None
+    image_format = image_format or ANNOTATION_FORMAT
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Formato de imagem inválido: {image_format}. Use {', '.join(IMAGE_FORMATS)}")
+
+    if render == 'thumbnail':
+        annotated = draw_annotation(thumbnail(image), landmarks, metrics, info_box=False)
+        return encode_image(annotated, image_format, quality or THUMBNAIL_QUALITY)
+    annotated = draw_annotation(image, landmarks, metrics)
+    return encode_image(annotated, image_format, quality or ANNOTATION_QUALITY)
+
+
+def mimetype(image_format: Optional[str] = None) -> str:
+    return IMAGE_FORMATS[image_format or ANNOTATION_FORMAT][1]
+
+
+def extension(image_format: Optional[str] = None) -> str:
+    return IMAGE_FORMATS[image_format or ANNOTATION_FORMAT][0]
+
+
+def to_data_uri(data: bytes, image_format: Optional[str] = None) -> str:
+    return f"data:{mimetype(image_format)};base64,{base64.b64encode(data).decode('utf-8')}"
@@ -1,17 +1,146 @@
 import os
-from openai import OpenAI
+import hashlib
+import threading
 from typing import List, Dict, Optional
 import logging
-	from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-# O segredo OPENAI_API_KEY está disponível no ambiente
-client = OpenAI()
+TTS_MODEL = os.environ.get('TTS_MODEL', 'tts-1')
+TTS_VOICE = os.environ.get('TTS_VOICE', 'nova')
+
+# Diretório onde os áudios são armazenados (um arquivo por narrativa/voz/modelo)
+AUDIO_DIR = os.path.join(os.path.dirname(__file__), '..', 'uploads', 'exercise_audio')
+
+# Mapeamento de fatores de risco para exercícios sugeridos
+EXERCISE_MAP = {
+    "Projeção anterior da cabeça": "Para a projeção anterior da cabeça, vamos fazer um exercício de retração cervical. Sente-se ou fique em pé com a coluna reta. Lentamente, deslize o queixo para trás, como se estivesse fazendo um 'queixo duplo', mantendo o olhar para a frente. Segure por cinco segundos e relaxe. Repita dez vezes. Isso ajuda a realinhar a cabeça e fortalecer os músculos profundos do pescoço.",
+    "Assimetria dos Ombros": "Para a assimetria dos ombros, faremos o alongamento do trapézio superior. Incline a cabeça para o lado oposto do ombro mais alto, usando a mão para aplicar uma leve pressão. Você deve sentir o alongamento na lateral do pescoço. Mantenha por vinte segundos em cada lado. Este exercício ajuda a equilibrar a altura dos ombros.",
+    "Assimetria Pélvica": "Para a assimetria pélvica, vamos fortalecer o glúteo médio. Deite-se de lado, com os joelhos dobrados e os pés juntos. Mantenha os pés em contato e levante o joelho superior, como se fosse abrir uma concha. Mantenha o movimento lento e controlado, sem girar o tronco. Faça quinze repetições em cada lado.",
+    "Desvio de Eixo dos Joelhos": "Para o desvio dos joelhos, faremos agachamento isométrico com faixa. Coloque uma faixa elástica logo acima dos joelhos. Agache lentamente até um ângulo de quarenta e cinco graus, empurrando os joelhos contra a faixa para ativar os glúteos. Mantenha a posição por trinta segundos. Este exercício estabiliza os joelhos e melhora o alinhamento."
+}
+
+NARRATIVE_NO_RISK = "Parabéns, sua postura está excelente! Mantenha os bons hábitos posturais."
+NARRATIVE_INTRO = "Com base na sua avaliação postural, vamos começar com um exercício focado nas suas áreas de atenção. "
+NARRATIVE_GENERAL = "Seu principal ponto de atenção é o alinhamento geral. Vamos fazer uma 'postura da montanha' para consciência corporal. Fique em pé, distribua o peso igualmente nos pés, relaxe os ombros, e imagine um fio puxando o topo da sua cabeça para o céu. Mantenha esta postura por um minuto, respirando profundamente."
+NARRATIVE_OUTRO = " Lembre-se de respirar profundamente durante todo o exercício. Vamos lá!"
+
+
+class OpenAITTSBackend:
+    """Síntese de voz via OpenAI TTS. O cliente só é criado no primeiro uso."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from openai import OpenAI
+                # O segredo OPENAI_API_KEY está disponível no ambiente
+                self._client = OpenAI()
+            return self._client
+
+    def synthesize(self, text: str, output_path: str, voice: str, model: str):
+        response = self.client.audio.speech.create(
+            model=model,
+            voice=voice,
+            input=text
+        )
+        response.stream_to_file(output_path)
+
+
+class StubTTSBackend:
+    """Backend local para testes offline: grava um MP3 silencioso, sem acesso à rede."""
+
+    # Cabeçalho de um quadro MPEG-1 Layer III (128 kbps, 44.1 kHz) seguido de silêncio
+    SILENT_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+
+    def synthesize(self, text: str, output_path: str, voice: str, model: str):
+        # Um quadro (~26 ms) a cada 10 caracteres, para a duração acompanhar o texto
+        frames = max(1, len(text) // 10)
+        with open(output_path, 'wb') as f:
+            f.write(self.SILENT_FRAME * frames)
+
+
+def _backend_from_env():
+    if os.environ.get('TTS_BACKEND', 'openai') == 'stub':
+        return StubTTSBackend()
+    return OpenAITTSBackend()
+
+
+tts_backend = _backend_from_env()
+
+
+class AudioStore:
+    """
+    Armazenamento de áudios endereçado por conteúdo.
+
+    Cada combinação (narrativa, voz, modelo) é sintetizada uma única vez;
+    chamadas seguintes devolvem o arquivo já existente.
+    """
+
+    def __init__(self, directory: str, backend):
+        self.directory = directory
+        self.backend = backend
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, voice: str, model: str) -> str:
+        return hashlib.sha256(f"{model}|{voice}|{text}".encode('utf-8')).hexdigest()
+
+    def filename_for(self, text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL) -> str:
+        return f"exercise_{self.make_key(text, voice, model)}.mp3"
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def lookup(self, text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL) -> Optional[str]:
+        """Retorna o nome do arquivo se o áudio já existir, sem sintetizar"""
+        filename = self.filename_for(text, voice, model)
+        return filename if os.path.exists(os.path.join(self.directory, filename)) else None
+
+    def get_or_create(self, text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL) -> Optional[str]:
+        """Retorna o nome do arquivo de áudio da narrativa, sintetizando apenas se necessário"""
+        filename = self.filename_for(text, voice, model)
+        output_path = os.path.join(self.directory, filename)
+
+        # Evita que duas requisições sintetizem a mesma narrativa ao mesmo tempo
+        with self._key_lock(filename):
+            if os.path.exists(output_path):
+                self.hits += 1
+                return filename
+
+            self.misses += 1
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{output_path}.{os.getpid()}.tmp"
+            try:
+                logger.info(f"Gerando áudio para o texto: {text[:50]}...")
+                self.backend.synthesize(text, tmp_path, voice, model)
+                os.replace(tmp_path, output_path)
+                logger.info(f"Áudio gerado com sucesso em: {output_path}")
+                return filename
+            except Exception as e:
+                logger.error(f"Erro ao gerar áudio TTS: {str(e)}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return None
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+audio_store = AudioStore(AUDIO_DIR, tts_backend)
+
 
 def generate_audio_for_exercise(text: str, output_path: str, voice: str = "nova") -> Optional[str]:
     """
-    Gera um arquivo de áudio MP3 a partir de um texto usando o OpenAI TTS.
+    Gera um arquivo de áudio MP3 a partir de um texto usando o backend de TTS configurado.
 
     Args:
         text (str): O texto da narrativa do exercício.
@@ -23,19 +152,10 @@ def generate_audio_for_exercise(text: str, output_path: str, voice: str = "nova"
     """
     try:
         logger.info(f"Gerando áudio para o texto: {text[:50]}...")
-        
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
-        )
-        
-        # Salvar o áudio no caminho especificado
-        response.stream_to_file(output_path)
-        
+        tts_backend.synthesize(text, output_path, voice, TTS_MODEL)
         logger.info(f"Áudio gerado com sucesso em: {output_path}")
         return output_path
-        
+
     except Exception as e:
         logger.error(f"Erro ao gerar áudio TTS: {str(e)}")
         return None
@@ -43,60 +163,68 @@ def generate_audio_for_exercise(text: str, output_path: str, voice: str = "nova"
 def generate_exercise_narrative(risk_factors: List[Dict]) -> str:
     """
     Gera uma narrativa de exercício baseada nos fatores de risco identificados.
-    
+
     Args:
         risk_factors (List[Dict]): Lista de fatores de risco do relatório de análise.
-        
+
     Returns:
         str: A narrativa completa do exercício.
     """
     if not risk_factors:
-        return "Parabéns, sua postura está excelente! Mantenha os bons hábitos posturais."
-
-    narrative = "Com base na sua avaliação postural, vamos começar com um exercício focado nas suas áreas de atenção. "
-    
-    # Mapeamento de fatores de risco para exercícios sugeridos
-    exercise_map = {
-        "Projeção anterior da cabeça": "Para a projeção anterior da cabeça, vamos fazer um exercício de retração cervical. Sente-se ou fique em pé com a coluna reta. Lentamente, deslize o queixo para trás, como se estivesse fazendo um 'queixo duplo', mantendo o olhar para a frente. Segure por cinco segundos e relaxe. Repita dez vezes. Isso ajuda a realinhar a cabeça e fortalecer os músculos profundos do pescoço.",
-        "Assimetria dos Ombros": "Para a assimetria dos ombros, faremos o alongamento do trapézio superior. Incline a cabeça para o lado oposto do ombro mais alto, usando a mão para aplicar uma leve pressão. Você deve sentir o alongamento na lateral do pescoço. Mantenha por vinte segundos em cada lado. Este exercício ajuda a equilibrar a altura dos ombros.",
-        "Assimetria Pélvica": "Para a assimetria pélvica, vamos fortalecer o glúteo médio. Deite-se de lado, com os joelhos dobrados e os pés juntos. Mantenha os pés em contato e levante o joelho superior, como se fosse abrir uma concha. Mantenha o movimento lento e controlado, sem girar o tronco. Faça quinze repetições em cada lado.",
-        "Desvio de Eixo dos Joelhos": "Para o desvio dos joelhos, faremos agachamento isométrico com faixa. Coloque uma faixa elástica logo acima dos joelhos. Agache lentamente até um ângulo de quarenta e cinco graus, empurrando os joelhos contra a faixa para ativar os glúteos. Mantenha a posição por trinta segundos. Este exercício estabiliza os joelhos e melhora o alinhamento."
-    }
-    
+        return NARRATIVE_NO_RISK
+
+    narrative = NARRATIVE_INTRO
+
     # Selecionar o exercício mais relevante (o primeiro fator de risco)
     main_risk = risk_factors[0]['factor']
-    
-    if main_risk in exercise_map:
-        narrative += f"Seu principal ponto de atenção é: **{main_risk}**. O exercício que faremos é: {exercise_map[main_risk]}"
+
+    if main_risk in EXERCISE_MAP:
+        narrative += f"Seu principal ponto de atenção é: **{main_risk}**. O exercício que faremos é: {EXERCISE_MAP[main_risk]}"
     else:
-        narrative += "Seu principal ponto de atenção é o alinhamento geral. Vamos fazer uma 'postura da montanha' para consciência corporal. Fique em pé, distribua o peso igualmente nos pés, relaxe os ombros, e imagine um fio puxando o topo da sua cabeça para o céu. Mantenha esta postura por um minuto, respirando profundamente."
-        
-    narrative += " Lembre-se de respirar profundamente durante todo o exercício. Vamos lá!"
-    
+        narrative += NARRATIVE_GENERAL
+
+    narrative += NARRATIVE_OUTRO
+
     return narrative
 
+def all_exercise_narratives() -> List[str]:
+    """Todas as narrativas distintas que generate_exercise_narrative pode produzir"""
+    narratives = [generate_exercise_narrative([]), generate_exercise_narrative([{'factor': None}])]
+    narratives.extend(generate_exercise_narrative([{'factor': factor}]) for factor in EXERCISE_MAP)
+    return narratives
+
+def prewarm_exercise_audio(voice: str = TTS_VOICE, model: str = TTS_MODEL) -> Dict:
+    """
+    Sintetiza antecipadamente o áudio de todas as narrativas possíveis,
+    para que nenhuma análise precise esperar pelo TTS.
+    """
+    generated = 0
+    for narrative in all_exercise_narratives():
+        if audio_store.get_or_create(narrative, voice, model):
+            generated += 1
+    logger.info(f"Pré-aquecimento de áudio concluído: {generated} narrativas disponíveis")
+    return {'narrativas': generated, **audio_store.stats()}
+
+def find_exercise_audio(risk_factors: List[Dict]) -> Optional[str]:
+    """
+    Retorna o caminho relativo do áudio do exercício se ele já tiver sido
+    sintetizado; não chama o TTS.
+    """
+    filename = audio_store.lookup(generate_exercise_narrative(risk_factors))
+    return os.path.join('uploads', 'exercise_audio', filename) if filename else None
+
 def generate_and_save_exercise_audio(risk_factors: List[Dict], user_id: str) -> Optional[str]:
     """
     Gera a narrativa e o áudio do exercício, salvando-o na pasta de uploads.
+
+    O áudio é reaproveitado entre usuários: narrativas iguais apontam para o mesmo arquivo.
     """
     narrative = generate_exercise_narrative(risk_factors)
-    
-    # Definir o caminho para salvar o arquivo de áudio
-    # Usar a pasta de uploads existente
-    upload_dir = os.path.join(os.path.dirname(__file__), '..', 'uploads', 'exercise_audio')
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Nome do arquivo baseado no user_id e timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"exercise_audio_{user_id}_{timestamp}.mp3"
-    output_path = os.path.join(upload_dir, filename)
-    
-    audio_path = generate_audio_for_exercise(narrative, output_path)
-    
-    if audio_path:
+
+    filename = audio_store.get_or_create(narrative)
+
+    if filename:
         # Retornar o caminho relativo ou o nome do arquivo para ser armazenado no banco de dados
         return os.path.join('uploads', 'exercise_audio', filename)
     else:
         return None
-
-
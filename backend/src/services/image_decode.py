@@ -0,0 +1,172 @@
+"""
+Decodificação das imagens recebidas para análise.
+
+Os bytes enviados (upload multipart ou base64/data URI) são convertidos
+diretamente em um np.ndarray RGB com cv2.imdecode, sem PIL e sem arquivos
+temporários. Quando a foto é bem maior que o tamanho usado na inferência
+(POSTURE_MAX_SIDE), JPEGs são decodificados já reduzidos (IMREAD_REDUCED_*),
+evitando decodificar pixels que seriam descartados em seguida. As dimensões
+originais vêm do cabeçalho do arquivo, para que as métricas em pixels
+continuem na escala da foto enviada. A imagem anotada completa (render=full)
+é desenhada sobre a foto no tamanho original, decodificada de novo sem
+redução apenas nesse caso (DecodedImage.full_resolution).
+
+OpenCV e NumPy só são importados na primeira decodificação.
+"""
+import os
+import base64
+import binascii
+import struct
+from typing import Optional, Tuple
+
+# Maior lado (px) da imagem enviada ao MediaPipe; 0 desativa a redução.
+# O modelo trabalha com entradas de 256px, então fotos de celular em resolução
+# cheia só tornam a decodificação, a conversão de cor e o CLAHE mais lentos.
+MAX_SIDE = int(os.environ.get('POSTURE_MAX_SIDE', 1280))
+
+# Fatores de redução suportados pelo decodificador JPEG do OpenCV
+REDUCTION_FACTORS = (8, 4, 2)
+
+
+class ImageDecodeError(ValueError):
+    """Os bytes recebidos não são uma imagem válida."""
+
+
+class DecodedImage:
+    """
+    Imagem RGB decodificada (possivelmente reduzida), as dimensões da original
+    e, quando decodificada de bytes, os próprios bytes (ver full_resolution)
+    """
+
+    def __init__(self, rgb, width: int, height: int, data: Optional[bytes] = None):
+        self.rgb = rgb
+        self.width = width
+        self.height = height
+        self.data = data
+
+    @property
+    def reduced(self) -> bool:
+        return self.rgb.shape[:2] != (self.height, self.width)
+
+    def full_resolution(self):
+        """
+        RGB no tamanho original. Se a imagem foi decodificada reduzida, os bytes
+        são decodificados de novo sem redução (usado pela anotação render=full).
+        """
+        if not self.reduced or self.data is None:
+            return self.rgb
+        return decode_image(self.data, 0).rgb
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        """Formato (altura, largura, canais) da imagem original"""
+        return (self.height, self.width, 3)
+
+
+def data_from_base64(image_base64: str) -> bytes:
+    """Bytes da imagem de uma string base64, com ou sem o prefixo data:image/...;base64,"""
+    if ',' in image_base64:
+        header, image_base64 = image_base64.split(',', 1)
+        if not header.startswith('data:image/'):
+            raise ImageDecodeError('Formato de imagem inválido')
+    try:
+        return base64.b64decode(image_base64)
+    except (binascii.Error, ValueError):
+        raise ImageDecodeError('Formato de imagem inválido')
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (largura, altura) lidas do cabeçalho de um JPEG, PNG, GIF ou WebP, sem
+    decodificar os pixels. None se o formato não for reconhecido.
+    """
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:4] == b'GIF8' and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return width & 0x3fff, height & 0x3fff
+        if chunk == b'VP8L':
+            bits = int.from_bytes(data[21:25], 'little')
+            return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        if chunk == b'VP8X':
+            return int.from_bytes(data[24:27], 'little') + 1, int.from_bytes(data[27:30], 'little') + 1
+        return None
+    if data[:2] == b'\xff\xd8':
+        # Percorre os segmentos até o marcador SOF, que traz as dimensões
+        offset = 2
+        while offset + 9 <= len(data):
+            if data[offset] != 0xff:
+                return None
+            marker = data[offset + 1]
+            if marker == 0xff:
+                offset += 1
+                continue
+            if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7:
+                offset += 2
+                continue
+            length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+            if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+                return width, height
+            offset += 2 + length
+    return None
+
+
+def reduction_factor(width: int, height: int, max_side: int) -> int:
+    """Maior fator de redução na decodificação que ainda deixa o maior lado >= max_side"""
+    if not max_side:
+        return 1
+    longest = max(width, height)
+    for factor in REDUCTION_FACTORS:
+        if longest // factor >= max_side:
+            return factor
+    return 1
+
+
+def _imread_flags(factor: int) -> int:
+    import cv2
+
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+    if hasattr(cv2, 'IMREAD_COLOR_RGB'):
+        # OpenCV >= 4.10: o decodificador já entrega RGB, sem conversão posterior
+        flags = (flags & ~cv2.IMREAD_COLOR) | cv2.IMREAD_COLOR_RGB
+    return flags
+
+
+def decode_image(data: bytes, max_side: int = MAX_SIDE) -> DecodedImage:
+    """
+    Decodifica os bytes de uma imagem para RGB. Se max_side for informado, o
+    JPEG pode ser decodificado reduzido (2x, 4x ou 8x), sem ficar menor que max_side.
+    """
+    import cv2
+    import numpy as np
+
+    if not data:
+        raise ImageDecodeError('Imagem vazia')
+    size = image_size(data)
+    factor = reduction_factor(*size, max_side) if size else 1
+
+    flags = _imread_flags(factor)
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if image is None:
+        raise ImageDecodeError('Erro ao carregar imagem')
+    if not flags & getattr(cv2, 'IMREAD_COLOR_RGB', 0):
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+    height, width = image.shape[:2]
+    if size is None:
+        return DecodedImage(image, width, height, data)
+    original_width, original_height = size
+    # O OpenCV aplica a orientação EXIF; nesse caso o cabeçalho tem as dimensões trocadas
+    if (width > height) != (original_width > original_height) and width != height:
+        original_width, original_height = original_height, original_width
+    return DecodedImage(image, original_width, original_height, data)
+
+
+def decode_base64_image(image_base64: str, max_side: int = MAX_SIDE) -> DecodedImage:
+    return decode_image(data_from_base64(image_base64), max_side)
@@ -0,0 +1,129 @@
+"""
+Armazenamento de imagens endereçado por conteúdo.
+
+As imagens ficam no sistema de arquivos, em diretórios particionados pelo
+hash (ab/cd/abcd....jpg), e o banco guarda apenas a chave. Imagens
+idênticas são gravadas uma única vez.
+"""
+import os
+import re
+import base64
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}\.(jpg|png|gif|webp)$')
+# Qualquer valor maior que isso na coluna é uma imagem base64 antiga, não uma chave
+MAX_KEY_LENGTH = 69
+
+
+def guess_extension(data: bytes) -> str:
+    """Identifica o formato da imagem pelos bytes iniciais"""
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:4] == b'GIF8':
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return 'jpg'
+
+
+def is_image_key(value: Optional[str]) -> bool:
+    return bool(value) and KEY_PATTERN.match(value) is not None
+
+
+def decode_data_uri(image_base64: str) -> bytes:
+    """Bytes de uma imagem em base64 (com ou sem prefixo data:image/...)"""
+    return base64.b64decode(image_base64.split(',', 1)[1] if ',' in image_base64 else image_base64)
+
+
+class ImageStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def location(self, key: str) -> Tuple[str, str]:
+        """Retorna (diretório, nome do arquivo) de uma chave"""
+        if not is_image_key(key):
+            raise ValueError(f"Chave de imagem inválida: {key}")
+        return os.path.join(self.root, key[:2], key[2:4]), key
+
+    def path_for(self, key: str) -> str:
+        directory, filename = self.location(key)
+        return os.path.join(directory, filename)
+
+    def exists(self, key: str) -> bool:
+        return is_image_key(key) and os.path.exists(self.path_for(key))
+
+    def key_for(self, data: bytes, extension: Optional[str] = None) -> str:
+        """Chave que a imagem terá no armazenamento, sem gravá-la"""
+        return f"{hashlib.sha256(data).hexdigest()}.{extension or guess_extension(data)}"
+
+    def put(self, data: bytes, extension: Optional[str] = None) -> str:
+        """Grava os bytes da imagem (se ainda não existirem) e retorna a chave"""
+        key = self.key_for(data, extension)
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return key
+
+    def put_data_uri(self, image_base64: str) -> str:
+        """Grava uma imagem recebida em base64 (com ou sem prefixo data:image/...)"""
+        return self.put(decode_data_uri(image_base64))
+
+    def read(self, key: str) -> bytes:
+        with open(self.path_for(key), 'rb') as f:
+            return f.read()
+
+
+def migrate_inline_images(engine, batch_size: int = 200) -> int:
+    """
+    Extrai as imagens base64 gravadas diretamente na tabela avaliacao para o
+    armazenamento de imagens, substituindo-as pelas chaves. Retorna o número
+    de avaliações migradas.
+    """
+    select_batch = text('''
+        SELECT id, imagem_original, imagem_anotada FROM avaliacao
+        WHERE id > :last_id AND (length(imagem_original) > :max_length OR length(imagem_anotada) > :max_length)
+        ORDER BY id LIMIT :batch_size
+    ''')
+    update_row = text('UPDATE avaliacao SET imagem_original = :original, imagem_anotada = :anotada WHERE id = :id')
+
+    migrated = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_batch, {
+                'last_id': last_id, 'max_length': MAX_KEY_LENGTH, 'batch_size': batch_size
+            }).all()
+            if not rows:
+                break
+
+            for avaliacao_id, original, anotada in rows:
+                last_id = avaliacao_id
+                try:
+                    original_key = original if not original or is_image_key(original) else image_store.put_data_uri(original)
+                    anotada_key = anotada if not anotada or is_image_key(anotada) else image_store.put_data_uri(anotada)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Avaliação {avaliacao_id}: imagem inválida, mantida no banco ({str(e)})")
+                    continue
+                conn.execute(update_row, {'original': original_key, 'anotada': anotada_key, 'id': avaliacao_id})
+                migrated += 1
+
+    return migrated
+
+
+# Instância global do armazenamento de imagens
+image_store = ImageStore(os.environ.get(
+    'IMAGE_STORE_DIR',
+    os.path.join(os.path.dirname(__file__), '..', '..', 'uploads', 'images')
+))
@@ -0,0 +1,354 @@
+"""
+Pool de processos para inferência de pose.
+
+Cada processo do pool possui sua própria instância de PostureAnalyzerV2
+(e, portanto, seu próprio grafo do MediaPipe), permitindo que várias
+análises rodem em paralelo, uma por núcleo, sem bloquear a thread da
+requisição HTTP com o GIL.
+"""
+import os
+import time
+import queue
+import logging
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Métodos do analisador que podem ser executados remotamente
+ALLOWED_METHODS = {'analyze_posture', 'analyze_posture_from_base64', 'analyze_image_bytes'}
+# Espera antes de reiniciar um processo que morreu de novo sem chegar a ficar pronto
+# (dobra a cada falha seguida: 1s, 2s, 4s... até RESTART_BACKOFF_MAX)
+RESTART_BACKOFF_MAX = float(os.environ.get('POSTURE_POOL_RESTART_BACKOFF_MAX', 60))
+
+
+class InferencePoolFull(Exception):
+    """Fila do pool cheia; o cliente deve tentar novamente mais tarde."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Fila de inferência cheia, tente novamente em {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferenceWorkerError(Exception):
+    """O processo de inferência morreu durante a execução da tarefa."""
+
+
+class InferenceTimeout(InferenceWorkerError):
+    """A análise não terminou dentro de task_timeout."""
+
+
+def _worker_main(worker_id: int, task_queue, result_queue):
+    """Loop principal de um processo de inferência."""
+    # Importação tardia: o MediaPipe só é carregado dentro do processo filho
+    from src.services.posture_analysis_v2 import get_posture_analyzer
+    analyzer = get_posture_analyzer()
+
+    result_queue.put(('ready', worker_id, os.getpid(), None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, method, args, kwargs = task
+        result_queue.put(('started', worker_id, task_id, None))
+        try:
+            result = getattr(analyzer, method)(*args, **kwargs)
+            result_queue.put(('done', worker_id, task_id, result))
+        except Exception as e:
+            result_queue.put(('failed', worker_id, task_id, f"{type(e).__name__}: {e}"))
+
+        if analyzer.result_cache is not None:
+            result_queue.put(('stats', worker_id, analyzer.result_cache.stats(), None))
+
+
+class InferencePool:
+    """
+    Gerencia N processos de inferência com fila limitada e backpressure.
+
+    Uso:
+        pool = InferencePool(num_workers=4, max_pending=16)
+        result = pool.analyze('analyze_posture', image)
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 task_timeout: float = 120.0, start_method: str = 'spawn'):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.num_workers * 4
+        self.task_timeout = task_timeout
+        self._ctx = mp.get_context(start_method)
+
+        self._task_queue = None
+        self._result_queue = None
+        self._processes: Dict[int, mp.Process] = {}
+        self._workers: Dict[int, Dict] = {}
+        self._futures: Dict[int, Future] = {}
+        self._task_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._collector = None
+        self._started = False
+        self._stopping = False
+        # Média móvel do tempo de inferência, usada para estimar o Retry-After
+        self._avg_task_seconds = 2.0
+
+    # ------------------------------------------------------------------ #
+    # Ciclo de vida
+    # ------------------------------------------------------------------ #
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._stopping = False
+            self._task_queue = self._ctx.Queue()
+            self._result_queue = self._ctx.Queue()
+            for worker_id in range(self.num_workers):
+                self._spawn_worker(worker_id)
+            self._collector = threading.Thread(target=self._collect_results,
+                                               name='inference-pool-collector', daemon=True)
+            self._collector.start()
+            self._started = True
+            logger.info(f"Pool de inferência iniciado com {self.num_workers} processos")
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if not self._started:
+                return
+            self._stopping = True
+            for _ in self._processes:
+                self._task_queue.put(None)
+        if wait:
+            for process in list(self._processes.values()):
+                process.join(timeout=10)
+                if process.is_alive():
+                    process.terminate()
+        with self._lock:
+            for future in self._futures.values():
+                if not future.done():
+                    future.set_exception(InferenceWorkerError("Pool de inferência encerrado"))
+            self._futures.clear()
+            self._started = False
+
+    def _spawn_worker(self, worker_id: int):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._task_queue, self._result_queue),
+            name=f'posture-inference-{worker_id}',
+            daemon=True
+        )
+        process.start()
+        self._processes[worker_id] = process
+        previous = self._workers.get(worker_id, {})
+        self._workers[worker_id] = {
+            'pid': process.pid,
+            'ready': False,
+            'current_task': None,
+            'tasks_completed': 0,
+            'tasks_failed': 0,
+            'restarts': previous.get('restarts', -1) + 1,
+            # Mortes seguidas sem o processo ficar pronto (zerado em 'ready')
+            'consecutive_failures': previous.get('consecutive_failures', 0),
+            'restart_at': None,
+            'task_started': None,
+            'last_seen': time.time(),
+            'cache': None
+        }
+
+    # ------------------------------------------------------------------ #
+    # Submissão de tarefas
+    # ------------------------------------------------------------------ #
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._futures)
+
+    def submit(self, method: str, *args, **kwargs) -> Future:
+        """Envia uma tarefa ao pool. Levanta InferencePoolFull se a fila estiver cheia."""
+        if method not in ALLOWED_METHODS:
+            raise ValueError(f"Método não permitido no pool: {method}")
+
+        self.start()
+        with self._lock:
+            if len(self._futures) >= self.max_pending:
+                raise InferencePoolFull(self._estimate_retry_after())
+            task_id = next(self._task_ids)
+            future = Future()
+            future.submitted_at = time.time()
+            future.task_id = task_id
+            self._futures[task_id] = future
+
+        self._task_queue.put((task_id, method, args, kwargs))
+        return future
+
+    def analyze(self, method: str, *args, **kwargs) -> Dict:
+        """
+        Executa a análise no pool e aguarda o resultado. Levanta InferenceTimeout
+        se ela não terminar em task_timeout.
+        """
+        future = self.submit(method, *args, **kwargs)
+        try:
+            return future.result(timeout=self.task_timeout)
+        except FutureTimeoutError:
+            # A tarefa deixa de contar em max_pending; o processo que ainda estiver
+            # com ela é encerrado por _check_workers
+            with self._lock:
+                self._futures.pop(future.task_id, None)
+            future.cancel()
+            raise InferenceTimeout(f"A análise não terminou em {self.task_timeout:.0f}s")
+
+    def _estimate_retry_after(self) -> int:
+        backlog = len(self._futures) / max(1, self.num_workers)
+        return max(1, int(round(backlog * self._avg_task_seconds)))
+
+    # ------------------------------------------------------------------ #
+    # Coleta de resultados e supervisão dos processos
+    # ------------------------------------------------------------------ #
+    def _collect_results(self):
+        last_check = time.time()
+        while not (self._stopping and not self._futures):
+            if time.time() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.time()
+            try:
+                kind, worker_id, payload, result = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                worker = self._workers.get(worker_id)
+                if worker is not None:
+                    worker['last_seen'] = time.time()
+
+                if kind == 'ready':
+                    worker['ready'] = True
+                    worker['pid'] = payload
+                    worker['consecutive_failures'] = 0
+                    continue
+
+                if kind == 'started':
+                    worker['current_task'] = payload
+                    worker['task_started'] = time.time()
+                    continue
+
+                if kind == 'stats':
+                    worker['cache'] = payload
+                    continue
+
+                future = self._futures.pop(payload, None)
+                worker['current_task'] = None
+                worker['task_started'] = None
+                if kind == 'done':
+                    worker['tasks_completed'] += 1
+                else:
+                    worker['tasks_failed'] += 1
+
+            if future is None:
+                continue
+
+            elapsed = time.time() - future.submitted_at
+            self._avg_task_seconds = 0.8 * self._avg_task_seconds + 0.2 * elapsed
+            if kind == 'done':
+                future.set_result(result)
+            else:
+                future.set_exception(InferenceWorkerError(result))
+
+    def _check_workers(self):
+        """
+        Encerra processos presos em uma tarefa por mais de task_timeout, reinicia
+        os que morreram (com espera crescente se morrem antes de ficar prontos)
+        e falha as tarefas que estavam com eles.
+        """
+        with self._lock:
+            if self._stopping:
+                return
+            now = time.time()
+            for worker_id, process in list(self._processes.items()):
+                worker = self._workers[worker_id]
+                if process.is_alive():
+                    if worker['task_started'] is None or now - worker['task_started'] <= self.task_timeout:
+                        continue
+                    logger.error(f"Processo de inferência {worker_id} (pid {process.pid}) ocupado há mais "
+                                 f"de {self.task_timeout:.0f}s; encerrando")
+                    process.terminate()
+                    process.join(timeout=5)
+
+                if worker['restart_at'] is None:
+                    task_id = worker['current_task']
+                    future = self._futures.pop(task_id, None) if task_id is not None else None
+                    if future is not None and not future.done():
+                        future.set_exception(InferenceWorkerError(
+                            f"Processo de inferência {worker_id} morreu durante a análise"))
+                    worker['current_task'] = None
+                    worker['task_started'] = None
+
+                    failures = worker['consecutive_failures'] + (0 if worker['ready'] else 1)
+                    delay = min(2 ** (failures - 1), RESTART_BACKOFF_MAX) if failures else 0
+                    worker['consecutive_failures'] = failures
+                    worker['restart_at'] = now + delay
+                    logger.error(f"Processo de inferência {worker_id} (pid {process.pid}) morreu com código "
+                                 f"{process.exitcode}; reiniciando em {delay:.0f}s")
+                if now >= worker['restart_at']:
+                    self._spawn_worker(worker_id)
+
+    def health(self) -> Dict:
+        """Estado de cada processo do pool."""
+        with self._lock:
+            now = time.time()
+            workers = []
+            for worker_id, info in sorted(self._workers.items()):
+                process = self._processes.get(worker_id)
+                workers.append({
+                    'worker_id': worker_id,
+                    'pid': info['pid'],
+                    'alive': bool(process and process.is_alive()),
+                    'ready': info['ready'],
+                    'busy': info['current_task'] is not None,
+                    'tasks_completed': info['tasks_completed'],
+                    'tasks_failed': info['tasks_failed'],
+                    'restarts': info['restarts'],
+                    'consecutive_failures': info['consecutive_failures'],
+                    'seconds_since_last_seen': round(now - info['last_seen'], 1),
+                    'cache': info['cache']
+                })
+
+            alive = sum(1 for w in workers if w['alive'])
+            return {
+                'status': 'healthy' if self._started and alive == self.num_workers else
+                          ('degraded' if alive else 'down'),
+                'started': self._started,
+                'num_workers': self.num_workers,
+                'pending': len(self._futures),
+                'max_pending': self.max_pending,
+                'avg_task_seconds': round(self._avg_task_seconds, 3),
+                'workers': workers
+            }
+
+
+    def cache_stats(self) -> Dict:
+        """Soma dos contadores do cache de resultados de todos os processos"""
+        totals = {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0}
+        with self._lock:
+            for info in self._workers.values():
+                for name in totals:
+                    totals[name] += (info['cache'] or {}).get(name, 0)
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = round(totals['hits'] / lookups, 4) if lookups else 0.0
+        return totals
+
+
+def _pool_from_env() -> Optional[InferencePool]:
+    num_workers = int(os.environ.get('POSTURE_POOL_WORKERS', os.cpu_count() or 1))
+    if num_workers <= 0:
+        return None
+    max_pending = int(os.environ.get('POSTURE_POOL_MAX_PENDING', num_workers * 4))
+    task_timeout = float(os.environ.get('POSTURE_POOL_TASK_TIMEOUT', 120))
+    start_method = os.environ.get('POSTURE_POOL_START_METHOD', 'spawn')
+    return InferencePool(num_workers, max_pending, task_timeout, start_method)
+
+
+# Instância global do pool (None quando POSTURE_POOL_WORKERS=0)
+inference_pool = _pool_from_env()
@@ -0,0 +1,295 @@
+"""
+Fila de tarefas local, persistida em SQLite.
+
+Permite que trabalhos pesados (como a análise postural completa) sejam
+executados fora da requisição HTTP, sem depender de um broker externo.
+Vários processos podem compartilhar o mesmo arquivo: a reserva de cada
+tarefa é feita dentro de uma transação IMMEDIATE, então cada tarefa é
+executada por um único worker.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from .inference_pool import InferencePoolFull
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Tarefas que encontram o pool de inferência cheio voltam para a fila e só são
+# reservadas de novo depois do Retry-After estimado pelo pool (limitado a este valor)
+RETRY_MAX_DELAY = float(os.environ.get('JOB_QUEUE_RETRY_MAX_DELAY', 30))
+
+
+class JobQueue:
+    """
+    Fila de tarefas com workers em threads.
+
+    Uso:
+        job_queue.register_handler('minha_tarefa', funcao)
+        job_id = job_queue.enqueue('minha_tarefa', {'x': 1})
+        job_queue.get(job_id)
+    """
+
+    def __init__(self, db_path: str, num_workers: int = 2, poll_interval: float = 0.5,
+                 stale_after: float = 600.0):
+        self.db_path = db_path
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.app = None
+        self._handlers: Dict[str, Callable] = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._schema_ready = False
+
+    # ------------------------------------------------------------------ #
+    # Configuração
+    # ------------------------------------------------------------------ #
+    def init_app(self, app, start: bool = True):
+        """
+        Associa a fila ao app Flask (os handlers rodam dentro do app context) e
+        inicia os workers. Com start=False, os workers só começam em start().
+        """
+        self.app = app
+        if start:
+            self.start()
+
+    def register_handler(self, kind: str, handler: Callable):
+        """Registra a função que processa as tarefas do tipo `kind`: handler(payload, blob) -> dict"""
+        self._handlers[kind] = handler
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    user_id TEXT,
+                    payload TEXT,
+                    blob BLOB,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    run_after REAL
+                )
+            ''')
+            # Arquivos criados antes da coluna run_after
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'run_after' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN run_after REAL')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)')
+        finally:
+            conn.close()
+        self._schema_ready = True
+
+    # ------------------------------------------------------------------ #
+    # API pública
+    # ------------------------------------------------------------------ #
+    def enqueue(self, kind: str, payload: Optional[Dict] = None, user_id=None,
+                blob: Optional[bytes] = None) -> str:
+        """Cria uma tarefa pendente e retorna seu ID"""
+        if kind not in self._handlers:
+            raise ValueError(f"Tipo de tarefa desconhecido: {kind}")
+
+        self._ensure_schema()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, status, user_id, payload, blob, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, STATUS_PENDING, None if user_id is None else str(user_id),
+                 json.dumps(payload or {}), blob, time.time())
+            )
+        finally:
+            conn.close()
+
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Retorna o estado de uma tarefa (ou None se não existir)"""
+        self._ensure_schema()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT id, kind, status, user_id, result, error, attempts, created_at, started_at, finished_at '
+                'FROM jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat() if ts else None
+
+        return {
+            'job_id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'user_id': row['user_id'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'attempts': row['attempts'],
+            'created_at': iso(row['created_at']),
+            'started_at': iso(row['started_at']),
+            'finished_at': iso(row['finished_at'])
+        }
+
+    def stats(self) -> Dict:
+        """Quantidade de tarefas por status"""
+        self._ensure_schema()
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        finally:
+            conn.close()
+        return {status: count for status, count in rows}
+
+    # ------------------------------------------------------------------ #
+    # Workers
+    # ------------------------------------------------------------------ #
+    def start(self):
+        with self._lock:
+            if self._threads or self.num_workers <= 0:
+                return
+            self._ensure_schema()
+            self._requeue_stale()
+            self._stopping = False
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"Fila de tarefas iniciada com {self.num_workers} workers ({self.db_path})")
+
+    def shutdown(self):
+        self._stopping = True
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _requeue_stale(self):
+        """Devolve à fila tarefas que ficaram 'running' porque o processo morreu"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET status = ? WHERE status = ? AND started_at < ?',
+                (STATUS_PENDING, STATUS_RUNNING, time.time() - self.stale_after)
+            )
+        finally:
+            conn.close()
+
+    def _claim(self, conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        """Reserva atomicamente a tarefa pendente mais antiga"""
+        kinds = list(self._handlers)
+        if not kinds:
+            return None
+        placeholders = ','.join('?' * len(kinds))
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                f'SELECT id, kind, user_id, payload, blob FROM jobs '
+                f'WHERE status = ? AND kind IN ({placeholders}) AND (run_after IS NULL OR run_after <= ?) '
+                f'ORDER BY created_at LIMIT 1',
+                (STATUS_PENDING, *kinds, time.time())
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?',
+                    (STATUS_RUNNING, time.time(), row['id'])
+                )
+            conn.execute('COMMIT')
+            return row
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _worker_loop(self):
+        conn = self._connect()
+        while not self._stopping:
+            try:
+                job = self._claim(conn)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Falha ao reservar tarefa: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            self._run(conn, job)
+        conn.close()
+
+    def _run(self, conn: sqlite3.Connection, job: sqlite3.Row):
+        handler = self._handlers[job['kind']]
+        payload = json.loads(job['payload']) if job['payload'] else {}
+        payload.setdefault('user_id', job['user_id'])
+
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    result = handler(payload, job['blob'])
+            else:
+                result = handler(payload, job['blob'])
+            status, result_json, error = STATUS_DONE, json.dumps(result, default=str), None
+        except InferencePoolFull as e:
+            # A tarefa já foi aceita: espera vaga no pool em vez de falhar
+            delay = min(e.retry_after, RETRY_MAX_DELAY)
+            logger.info(f"Tarefa {job['id']} ({job['kind']}) aguardando o pool de inferência ({delay:.0f}s)")
+            conn.execute(
+                'UPDATE jobs SET status = ?, started_at = NULL, run_after = ? WHERE id = ?',
+                (STATUS_PENDING, time.time() + delay, job['id'])
+            )
+            return
+        except Exception as e:
+            logger.error(f"Tarefa {job['id']} ({job['kind']}) falhou: {str(e)}")
+            status, result_json, error = STATUS_FAILED, None, str(e)
+
+        # A imagem enviada não é mais necessária depois do processamento
+        conn.execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, blob = NULL, finished_at = ? WHERE id = ?',
+            (status, result_json, error, time.time(), job['id'])
+        )
+
+
+# Instância global da fila de tarefas
+job_queue = JobQueue(
+    db_path=os.environ.get(
+        'JOB_QUEUE_DB',
+        os.path.join(os.path.dirname(__file__), '..', 'database', 'jobs.db')
+    ),
+    num_workers=int(os.environ.get('JOB_QUEUE_WORKERS', 2))
+)
@@ -0,0 +1,89 @@
+"""
+Gravação e leitura dos landmarks das avaliações.
+
+Avaliações novas guardam os landmarks empacotados em avaliacao.landmarks_bin
+(ver encode_landmarks em services/landmarks.py); as gravadas antes disso têm
+a lista de dicts em JSON em avaliacao.landmarks, que continua sendo lida e
+pode ser convertida com `flask posture pack-landmarks`.
+"""
+import json
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from . import landmarks as lm
+
+logger = logging.getLogger(__name__)
+
+
+def landmark_columns(landmark_dicts) -> Dict:
+    """Colunas da tabela avaliacao com os landmarks do resultado de uma análise"""
+    return {'landmarks': None, 'landmarks_bin': lm.encode_landmarks(lm.from_dicts(landmark_dicts))}
+
+
+def load_landmarks(landmarks_bin, landmarks_json) -> Optional[np.ndarray]:
+    """Array (33, 4) a partir das colunas gravadas (None se não houver landmarks válidos)"""
+    try:
+        if landmarks_bin is not None:
+            return lm.decode_landmarks(landmarks_bin)
+        if landmarks_json:
+            skeleton = lm.from_dicts(json.loads(landmarks_json))
+            if skeleton.shape == (lm.NUM_LANDMARKS, 4):
+                return skeleton
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def load_landmarks_batch(rows) -> List[Optional[np.ndarray]]:
+    """
+    load_landmarks para vários pares (landmarks_bin, landmarks) de uma vez: os
+    binários são decodificados juntos com um único np.frombuffer
+    """
+    packed = [landmarks_bin for landmarks_bin, _ in rows if landmarks_bin is not None]
+    try:
+        decoded = iter(lm.decode_batch(packed))
+    except lm.LandmarkDecodeError:
+        # Codificações ou tamanhos diferentes no lote: um por vez, ignorando os inválidos
+        decoded = iter([load_landmarks(landmarks_bin, None) for landmarks_bin in packed])
+    return [
+        next(decoded) if landmarks_bin is not None else load_landmarks(None, landmarks_json)
+        for landmarks_bin, landmarks_json in rows
+    ]
+
+
+def pack_stored_landmarks(engine, encoding: str = lm.STORAGE_ENCODING, batch_size: int = 2000) -> int:
+    """
+    Converte os landmarks em JSON das avaliações antigas para o formato
+    binário, apagando o JSON. Retorna o número de avaliações convertidas.
+    """
+    select_batch = text('''
+        SELECT id, landmarks FROM avaliacao
+        WHERE id > :last_id AND landmarks IS NOT NULL AND landmarks_bin IS NULL
+        ORDER BY id LIMIT :batch_size
+    ''')
+    update_row = text('UPDATE avaliacao SET landmarks_bin = :packed, landmarks = NULL WHERE id = :id')
+
+    packed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_batch, {'last_id': last_id, 'batch_size': batch_size}).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            updates = []
+            for avaliacao_id, landmarks_json in rows:
+                skeleton = load_landmarks(None, landmarks_json)
+                if skeleton is None:
+                    logger.warning(f"Avaliação {avaliacao_id}: landmarks inválidos, mantidos em JSON")
+                    continue
+                updates.append({'id': avaliacao_id, 'packed': lm.encode_landmarks(skeleton, encoding)})
+            if updates:
+                conn.execute(update_row, updates)
+            packed += len(updates)
+
+    return packed
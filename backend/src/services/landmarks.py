@@ -0,0 +1,198 @@
+"""
+Representação compacta dos landmarks do BlazePose.
+
+Um esqueleto é um array float32 de forma (33, 4) com as colunas x, y, z e
+visibility (x e y normalizados entre 0 e 1, como o MediaPipe devolve), e um
+conjunto de esqueletos é um array (N, 33, 4). Os índices das linhas são as
+constantes abaixo (os mesmos de mp.solutions.pose.PoseLandmark), de modo que
+o código que só lê landmarks não precisa importar o MediaPipe.
+
+Os campos do protobuf do MediaPipe já são float32, então a conversão não
+perde precisão: o array reproduz exatamente os valores da detecção.
+
+Para gravação, encode_landmarks() empacota o array em bytes com um cabeçalho
+de 4 bytes (marcador, versão do formato, codificação e número de landmarks):
+
+- f32: float32 sem perda, 532 bytes;
+- f16: float16, 268 bytes (precisão de ~0,5 px em uma foto de 1000 px);
+- q16: uint16 quantizado em faixas fixas por coluna, 268 bytes (precisão de
+  ~0,05 px em 1000 px; valores fora das faixas são limitados a elas).
+
+A lista de dicts equivalente em JSON ocupa cerca de 5 KB.
+decode_landmarks() lê os bytes com np.frombuffer, sem cópia no caso f32.
+"""
+import os
+import struct
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+# Colunas
+X, Y, Z, VISIBILITY = range(4)
+
+NOSE = 0
+LEFT_EYE_INNER = 1
+LEFT_EYE = 2
+LEFT_EYE_OUTER = 3
+RIGHT_EYE_INNER = 4
+RIGHT_EYE = 5
+RIGHT_EYE_OUTER = 6
+LEFT_EAR = 7
+RIGHT_EAR = 8
+MOUTH_LEFT = 9
+MOUTH_RIGHT = 10
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_ELBOW = 13
+RIGHT_ELBOW = 14
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+LEFT_PINKY = 17
+RIGHT_PINKY = 18
+LEFT_INDEX = 19
+RIGHT_INDEX = 20
+LEFT_THUMB = 21
+RIGHT_THUMB = 22
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_KNEE = 25
+RIGHT_KNEE = 26
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+LEFT_HEEL = 29
+RIGHT_HEEL = 30
+LEFT_FOOT_INDEX = 31
+RIGHT_FOOT_INDEX = 32
+
+LANDMARK_NAMES = (
+    'NOSE', 'LEFT_EYE_INNER', 'LEFT_EYE', 'LEFT_EYE_OUTER', 'RIGHT_EYE_INNER', 'RIGHT_EYE',
+    'RIGHT_EYE_OUTER', 'LEFT_EAR', 'RIGHT_EAR', 'MOUTH_LEFT', 'MOUTH_RIGHT', 'LEFT_SHOULDER',
+    'RIGHT_SHOULDER', 'LEFT_ELBOW', 'RIGHT_ELBOW', 'LEFT_WRIST', 'RIGHT_WRIST', 'LEFT_PINKY',
+    'RIGHT_PINKY', 'LEFT_INDEX', 'RIGHT_INDEX', 'LEFT_THUMB', 'RIGHT_THUMB', 'LEFT_HIP', 'RIGHT_HIP',
+    'LEFT_KNEE', 'RIGHT_KNEE', 'LEFT_ANKLE', 'RIGHT_ANKLE', 'LEFT_HEEL', 'RIGHT_HEEL',
+    'LEFT_FOOT_INDEX', 'RIGHT_FOOT_INDEX',
+)
+
+
+def from_proto(landmarks) -> np.ndarray:
+    """Array (33, 4) a partir de results.pose_landmarks.landmark do MediaPipe"""
+    return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks], dtype=np.float32)
+
+
+def from_dicts(landmarks: List[Dict]) -> np.ndarray:
+    """Array (33, 4) a partir dos landmarks gravados (dicts com x, y, z e visibility)"""
+    return np.array([(lm['x'], lm['y'], lm['z'], lm['visibility']) for lm in landmarks], dtype=np.float32)
+
+
+def to_dicts(landmarks: np.ndarray) -> List[Dict]:
+    """Formato da API: um dict por landmark, com id e nome"""
+    return [
+        {
+            "id": i,
+            "name": LANDMARK_NAMES[i],
+            "x": x,
+            "y": y,
+            "z": z,
+            "visibility": visibility
+        }
+        for i, (x, y, z, visibility) in enumerate(landmarks.tolist())
+    ]
+
+
+def to_columns(landmarks: np.ndarray) -> Dict:
+    """
+    Formato colunar da API (landmarks_format=columnar): os nomes uma vez só e
+    um array por coordenada, na ordem dos nomes
+    """
+    x, y, z, visibility = landmarks.T.tolist()
+    return {"names": list(LANDMARK_NAMES), "x": x, "y": y, "z": z, "visibility": visibility}
+
+
+# ---------------------------------------------------------------------- #
+# Codificação binária
+# ---------------------------------------------------------------------- #
+MAGIC = 0x4C  # 'L'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<BBBB')  # marcador, versão, codificação, número de landmarks
+ENCODINGS = {'f32': 1, 'f16': 2, 'q16': 3}
+ENCODING_NAMES = {code: name for name, code in ENCODINGS.items()}
+STORAGE_ENCODING = os.environ.get('POSTURE_LANDMARK_ENCODING', 'f32')
+# Faixas de quantização de q16 por coluna: x e y normalizados podem sair um pouco
+# da imagem, z tem aproximadamente a escala de x, visibility fica entre 0 e 1
+Q16_MIN = np.array([-1.0, -1.0, -2.0, 0.0], dtype=np.float32)
+Q16_MAX = np.array([2.0, 2.0, 2.0, 1.0], dtype=np.float32)
+Q16_SCALE = (Q16_MAX - Q16_MIN) / 65535
+
+
+class LandmarkDecodeError(ValueError):
+    pass
+
+
+def encode_landmarks(landmarks: np.ndarray, encoding: str = STORAGE_ENCODING) -> bytes:
+    """Empacota um esqueleto (33, 4) no formato binário versionado"""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Codificação inválida: {encoding}. Use {', '.join(ENCODINGS)}")
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, ENCODINGS[encoding], landmarks.shape[0])
+    if encoding == 'f32':
+        body = landmarks.astype('<f4', copy=False)
+    elif encoding == 'f16':
+        body = landmarks.astype('<f2')
+    else:
+        body = np.rint((np.clip(landmarks, Q16_MIN, Q16_MAX) - Q16_MIN) / Q16_SCALE).astype('<u2')
+    return header + body.tobytes()
+
+
+def _header(data: bytes):
+    if len(data) < HEADER.size:
+        raise LandmarkDecodeError("Landmarks codificados incompletos")
+    magic, version, code, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION or code not in ENCODING_NAMES:
+        raise LandmarkDecodeError("Formato de landmarks desconhecido")
+    encoding = ENCODING_NAMES[code]
+    dtype = np.dtype({'f32': '<f4', 'f16': '<f2', 'q16': '<u2'}[encoding])
+    if len(data) != HEADER.size + count * 4 * dtype.itemsize:
+        raise LandmarkDecodeError("Tamanho dos landmarks codificados inválido")
+    return encoding, dtype, count
+
+
+def view_landmarks(data: bytes) -> np.ndarray:
+    """
+    Array (N, 4) somente leitura sobre os próprios bytes, no tipo gravado
+    (float32, float16 ou uint16 quantizado), sem cópia
+    """
+    _, dtype, count = _header(data)
+    return np.frombuffer(data, dtype=dtype, offset=HEADER.size).reshape(count, 4)
+
+
+def _to_float32(values: np.ndarray, encoding: str) -> np.ndarray:
+    if encoding == 'f32':
+        return values
+    if encoding == 'f16':
+        return values.astype(np.float32)
+    return values * Q16_SCALE + Q16_MIN
+
+
+def decode_landmarks(data: bytes) -> np.ndarray:
+    """Array float32 (33, 4); para f32 é a própria view sobre os bytes (somente leitura)"""
+    encoding, _, _ = _header(data)
+    return _to_float32(view_landmarks(data), encoding)
+
+
+def decode_batch(payloads: Sequence[bytes]) -> np.ndarray:
+    """
+    Lote (N, 33, 4) float32. Quando todos os esqueletos usam a mesma
+    codificação, os bytes são concatenados e lidos com um único np.frombuffer.
+    """
+    if not payloads:
+        return np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32)
+    if len({bytes(data[:HEADER.size]) for data in payloads}) > 1:
+        return np.stack([decode_landmarks(data) for data in payloads])
+    encoding, dtype, count = _header(payloads[0])
+    if any(len(data) != len(payloads[0]) for data in payloads):
+        raise LandmarkDecodeError("Tamanho dos landmarks codificados inválido")
+    # Cada linha: cabeçalho seguido dos valores; o cabeçalho (4 bytes) é descartado pela fatia
+    rows = np.frombuffer(b''.join(payloads), dtype=dtype).reshape(len(payloads), -1)
+    values = rows[:, HEADER.size // dtype.itemsize:].reshape(len(payloads), count, 4)
+    return _to_float32(values, encoding)
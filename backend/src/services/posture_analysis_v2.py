@@ -1,69 +1,108 @@
 import mediapipe as mp
 import numpy as np
-import math
-from typing import Dict, List, Tuple, Optional
-import base64
-from io import BytesIO
-from PIL import Image
+from typing import Dict, List, Optional
 import logging
+import os
 import json
+import time
+import threading
 import cv2 # Importar cv2, pois é usado no código lido
 from datetime import datetime
+from .result_cache import analysis_cache
+from .image_decode import MAX_SIDE, DecodedImage, ImageDecodeError, decode_image, decode_base64_image
+from .preprocessing import ImagePreprocessor
+from .annotation import render_annotation, to_data_uri
+from . import landmarks as lm
+from .scoring import SCORING_VERSION, ANALYSIS_PARAMS, score_landmarks, identify_risk_factors, generate_report
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Níveis de qualidade e o modelo do BlazePose usado em cada um
+# (0 = lite, 1 = full, 2 = heavy)
+QUALITY_TIERS = {
+    'fast': 0,
+    'balanced': 1,
+    'accurate': 2
+}
+DEFAULT_QUALITY = os.environ.get('POSTURE_DEFAULT_QUALITY', 'accurate')
+# Níveis carregados junto com o analisador; os demais são carregados no primeiro uso
+PRELOAD_QUALITIES = [q for q in os.environ.get('POSTURE_PRELOAD_QUALITIES', DEFAULT_QUALITY).split(',') if q]
+
 class PostureAnalyzerV2:
     def __init__(self):
         self.mp_pose = mp.solutions.pose
         self.mp_drawing = mp.solutions.drawing_utils
         self.mp_drawing_styles = mp.solutions.drawing_styles
         
-        # Configuração otimizada para melhor precisão
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=True,
-            model_complexity=2,
-            enable_segmentation=False,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
-        )
-        
-        # Parâmetros de análise (ajustados para as novas métricas)
-        self.analysis_params = {
-            'head_forward_threshold': 30,  # pixels
-            'shoulder_slope_threshold': 5,  # graus
-            'vertical_alignment_threshold': 25,  # pixels
-            'confidence_threshold': 0.5,
-            'hip_slope_threshold': 3, # graus
-            'knee_valgus_varus_threshold': 5, # graus
-            'foot_arch_threshold': 10 # pixels
-        }
-        
-    def analyze_posture_from_base64(self, image_base64: str, user_id: Optional[str] = None) -> Dict:
-        # Lógica de decodificação e validação (mantida do original)
+        # Modelo usado quando a requisição não escolhe a qualidade
+        self.default_quality = DEFAULT_QUALITY
+        self.model_complexity = QUALITY_TIERS[self.default_quality]
+        self.enable_preprocessing = True
+        self.preprocessor = ImagePreprocessor()
+        self.max_side = MAX_SIDE
+        # Um grafo do MediaPipe por model_complexity, criado sob demanda
+        self._poses = {}
+        self._poses_lock = threading.Lock()
+        for quality in PRELOAD_QUALITIES:
+            self.get_pose(quality)
+        
+        # Parâmetros de análise (ver services/scoring.py)
+        self.analysis_params = dict(ANALYSIS_PARAMS)
+        
+        # Cache de resultados por conteúdo da imagem (None se desabilitado)
+        self.result_cache = analysis_cache
+        
+    @property
+    def pose(self):
+        """Grafo do nível de qualidade padrão"""
+        return self.get_pose(self.default_quality)
+
+    def resolve_quality(self, quality: Optional[str]) -> str:
+        if quality is None:
+            return self.default_quality
+        if quality not in QUALITY_TIERS:
+            raise ValueError(f"Qualidade inválida: {quality}. Use {', '.join(QUALITY_TIERS)}")
+        return quality
+
+    def get_pose(self, quality: Optional[str] = None):
+        """Grafo do MediaPipe do nível de qualidade, criado no primeiro uso"""
+        complexity = QUALITY_TIERS[self.resolve_quality(quality)]
+        pose = self._poses.get(complexity)
+        if pose is None:
+            with self._poses_lock:
+                pose = self._poses.get(complexity)
+                if pose is None:
+                    started = time.perf_counter()
+                    pose = self.mp_pose.Pose(
+                        static_image_mode=True,
+                        model_complexity=complexity,
+                        enable_segmentation=False,
+                        min_detection_confidence=0.7,
+                        min_tracking_confidence=0.5
+                    )
+                    self._poses[complexity] = pose
+                    logger.info(f"Modelo de pose {complexity} carregado em {time.perf_counter() - started:.2f}s")
+        return pose
+
+    def analyze_posture_from_base64(self, image_base64: str, user_id: Optional[str] = None,
+                                    quality: Optional[str] = None, render: str = 'full') -> Dict:
         try:
             logger.info(f"Iniciando análise postural V2 para usuário: {user_id}")
             
-            # Validar formato base64
-            if not self._validate_base64_image(image_base64):
+            # Decodificar imagem base64 direto para RGB
+            try:
+                image = decode_base64_image(image_base64, self.max_side)
+            except ImageDecodeError:
                 return {"error": "Formato de imagem inválido"}
             
-            # Decodificar imagem base64
-            image_data = base64.b64decode(image_base64.split(',')[1] if ',' in image_base64 else image_base64)
-            image = Image.open(BytesIO(image_data))
-            
             # Validar dimensões da imagem
-            if not self._validate_image_dimensions(image):
+            if not self._validate_image_dimensions(image.width, image.height):
                 return {"error": "Dimensões da imagem inadequadas para análise"}
             
-            # Converter para formato OpenCV
-            # O código original usava cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            # É necessário garantir que cv2 esteja importado (já fiz isso)
-            image_rgb = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
             # Realizar análise
-            result = self.analyze_posture(image_rgb, user_id)
+            result = self.analyze_decoded(image, user_id, quality, render)
             
             # Adicionar metadados
             result['metadata'] = {
@@ -80,520 +119,175 @@ class PostureAnalyzerV2:
             logger.error(f"Erro ao processar imagem: {str(e)}")
             return {"error": f"Erro ao processar imagem: {str(e)}"}
 
-    def analyze_posture(self, image: np.ndarray, user_id: Optional[str] = None) -> Dict:
+    def analyze_image_bytes(self, data: bytes, user_id: Optional[str] = None,
+                            quality: Optional[str] = None, render: str = 'full') -> Dict:
+        """Análise a partir dos bytes do arquivo (upload multipart ou fila de tarefas)"""
+        try:
+            image = decode_image(data, self.max_side)
+        except ImageDecodeError:
+            return {"error": "Erro ao carregar imagem"}
+        return self.analyze_decoded(image, user_id, quality, render)
+
+    def analyze_posture(self, image: np.ndarray, user_id: Optional[str] = None,
+                        quality: Optional[str] = None, render: str = 'full') -> Dict:
+        """Análise de uma imagem BGR já decodificada (ex.: cv2.imread)"""
+        height, width = image.shape[:2]
+        return self.analyze_decoded(DecodedImage(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), width, height),
+                                    user_id, quality, render)
+
+    def analyze_decoded(self, image: DecodedImage, user_id: Optional[str] = None,
+                        quality: Optional[str] = None, render: str = 'full') -> Dict:
+        """
+        Análise completa de uma imagem decodificada. `render` (none, thumbnail ou
+        full) define se a imagem anotada é gerada; ela não faz parte do cache,
+        que guarda só o resultado da inferência.
+        """
         try:
-            # Converter BGR para RGB
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            quality = self.resolve_quality(quality)
+            model = {'quality': quality, 'model_complexity': QUALITY_TIERS[quality]}
+            
+            # Consultar o cache antes de executar o MediaPipe
+            cache_key = None
+            if self.result_cache is not None:
+                params = dict(self._cache_params(quality), original_size=[image.width, image.height])
+                cache_key = self.result_cache.make_key(image.rgb, params)
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    cached['cache_hit'] = True
+                    return self._with_annotation(cached, image, render)
             
-            # Pré-processamento da imagem para melhor detecção
-            processed_image = self._preprocess_image(image_rgb)
+            # Reduzir a imagem antes do pré-processamento e da inferência; os landmarks
+            # voltam normalizados (0-1) e as métricas usam as dimensões originais
+            inference_rgb = self._downscale(image.rgb)
+            model['input_dimensions'] = f"{inference_rgb.shape[1]}x{inference_rgb.shape[0]}"
             
-            # Processar a imagem
-            results = self.pose.process(processed_image)
+            # Pré-processamento da imagem para melhor detecção (pulado se a imagem já tem bom contraste)
+            processed_image = self._preprocess_image(inference_rgb) if self.enable_preprocessing else inference_rgb
+            model['preprocessed'] = processed_image is not inference_rgb
+            
+            # Processar a imagem com o modelo do nível de qualidade escolhido
+            pose = self.get_pose(quality)
+            results = pose.process(processed_image)
+            
+            # As estatísticas da imagem inteira não garantem contraste suficiente no corpo:
+            # se a detecção falhar sem a equalização, tenta de novo com ela
+            if self.enable_preprocessing and not model['preprocessed'] and self.preprocessor.mode == 'auto' and (
+                    not results.pose_landmarks or
+                    not self._validate_landmarks_quality(lm.from_proto(results.pose_landmarks.landmark))):
+                processed_image = self.preprocessor.process(inference_rgb, force=True)
+                model['preprocessed'] = True
+                results = pose.process(processed_image)
             
             if not results.pose_landmarks:
                 return {"error": "Nenhuma pessoa detectada na imagem. Certifique-se de que a pessoa esteja completamente visível."}
             
+            # Extrair pontos de referência (array (33, 4): x, y, z, visibility)
+            landmarks = lm.from_proto(results.pose_landmarks.landmark)
+            
             # Validar qualidade dos landmarks
-            if not self._validate_landmarks_quality(results.pose_landmarks.landmark):
+            if not self._validate_landmarks_quality(landmarks):
                 return {"error": "Qualidade da detecção insuficiente. Tente uma imagem com melhor iluminação e posicionamento."}
             
-            # Extrair pontos de referência
-            landmarks = results.pose_landmarks.landmark
-            
             # Calcular métricas posturais aprimoradas (AGORA COM AS NOVAS MÉTRICAS)
             metrics = self._calculate_enhanced_posture_metrics(landmarks, image.shape)
             
-            # Gerar visualização melhorada (manter o original por enquanto)
-            annotated_image = self._draw_enhanced_posture_analysis(image_rgb, results, metrics)
-            
-            # Converter imagem anotada para base64
-            annotated_base64 = self._image_to_base64(annotated_image)
-            
             # Gerar relatório detalhado
             report = self._generate_comprehensive_report(metrics)
             
             # Calcular tendências (simulado)
             trends = self._calculate_trends(metrics, user_id)
             
-            return {
+            result = {
                 "success": True,
                 "metrics": metrics,
                 "report": report,
                 "trends": trends,
-                "annotated_image": annotated_base64,
-                "landmarks": self._landmarks_to_dict(landmarks),
-                "confidence_scores": self._calculate_confidence_scores(landmarks)
+                "landmarks": lm.to_dicts(landmarks),
+                "confidence_scores": self._calculate_confidence_scores(landmarks),
+                "model": model,
+                "image_size": [image.width, image.height],
+                "scoring_version": SCORING_VERSION
             }
             
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result)
+            result['cache_hit'] = False
+            
+            return self._with_annotation(result, image, render)
+            
+        except ValueError as e:
+            return {"error": str(e)}
         except Exception as e:
             logger.error(f"Erro na análise postural: {str(e)}")
             return {"error": f"Erro na análise postural: {str(e)}"}
 
+    def _with_annotation(self, result: Dict, image: DecodedImage, render: str) -> Dict:
+        """Adiciona a imagem anotada (data URI) ao resultado, conforme o modo de renderização"""
+        # Entradas antigas do cache ainda trazem a imagem anotada
+        result.pop('annotated_image', None)
+        # A inferência pode ter usado a foto decodificada reduzida; a anotação completa
+        # é desenhada no tamanho original
+        rgb = image.full_resolution() if render == 'full' else image.rgb
+        data = render_annotation(rgb, result['landmarks'], result['metrics'], render)
+        if data is not None:
+            result['annotated_image'] = to_data_uri(data)
+        result['render'] = render
+        return result
+
+    def _cache_params(self, quality: Optional[str] = None) -> Dict:
+        """Parâmetros que influenciam o resultado e, portanto, fazem parte da chave do cache"""
+        return {
+            'analysis_params': self.analysis_params,
+            'scoring_version': SCORING_VERSION,
+            'model_complexity': QUALITY_TIERS[self.resolve_quality(quality)],
+            'preprocessing': self.preprocessor.cache_params() if self.enable_preprocessing else False,
+            'max_side': self.max_side
+        }
+
     # Métodos auxiliares (mantidos do original, exceto onde necessário)
-    def _validate_base64_image(self, image_base64: str) -> bool:
-        try:
-            if ',' in image_base64:
-                header, data = image_base64.split(',', 1)
-                if not header.startswith('data:image/'):
-                    return False
-            else:
-                data = image_base64
-            
-            image_data = base64.b64decode(data)
-            Image.open(BytesIO(image_data))
-            return True
-        except:
-            return False
-    
-    def _validate_image_dimensions(self, image: Image.Image) -> bool:
+    def _validate_image_dimensions(self, width: int, height: int) -> bool:
         min_width, min_height = 300, 400
         max_width, max_height = 4000, 6000
         
-        return (min_width <= image.width <= max_width and 
-                min_height <= image.height <= max_height)
+        return (min_width <= width <= max_width and 
+                min_height <= height <= max_height)
     
-    def _validate_landmarks_quality(self, landmarks) -> bool:
-        key_landmarks = [
-            self.mp_pose.PoseLandmark.NOSE,
-            self.mp_pose.PoseLandmark.LEFT_SHOULDER,
-            self.mp_pose.PoseLandmark.RIGHT_SHOULDER,
-            self.mp_pose.PoseLandmark.LEFT_HIP,
-            self.mp_pose.PoseLandmark.RIGHT_HIP
-        ]
-        
-        for landmark_idx in key_landmarks:
-            if landmarks[landmark_idx].visibility < self.analysis_params['confidence_threshold']:
-                return False
-        
-        return True
+    def _validate_landmarks_quality(self, landmarks: np.ndarray) -> bool:
+        key_landmarks = [lm.NOSE, lm.LEFT_SHOULDER, lm.RIGHT_SHOULDER, lm.LEFT_HIP, lm.RIGHT_HIP]
+        return bool(np.all(landmarks[key_landmarks, lm.VISIBILITY] >= self.analysis_params['confidence_threshold']))
     
+    def _downscale(self, image: np.ndarray) -> np.ndarray:
+        """Reduz a imagem para que o maior lado tenha no máximo self.max_side pixels"""
+        height, width = image.shape[:2]
+        longest = max(height, width)
+        if not self.max_side or longest <= self.max_side:
+            return image
+        scale = self.max_side / longest
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # INTER_AREA faz a média dos pixels, evitando o serrilhado da redução
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
     def _preprocess_image(self, image: np.ndarray) -> np.ndarray:
-        # Função de pré-processamento (mantida do original)
-        lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB)
-        l, a, b = cv2.split(lab)
-        
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        l = clahe.apply(l)
-        
-        enhanced = cv2.merge([l, a, b])
-        enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2RGB)
-        
-        return enhanced
+        # CLAHE no canal L com buffers reaproveitados (ver services/preprocessing.py)
+        return self.preprocessor.process(image)
     
-    def _calculate_angle(self, p1: Tuple[float, float], p2: Tuple[float, float], p3: Tuple[float, float]) -> float:
-        """Calcula o ângulo em graus entre três pontos (p2 é o vértice)"""
-        p1 = np.array(p1)
-        p2 = np.array(p2)
-        p3 = np.array(p3)
-        
-        v1 = p1 - p2
-        v2 = p3 - p2
-        
-        dot_product = np.dot(v1, v2)
-        norm_v1 = np.linalg.norm(v1)
-        norm_v2 = np.linalg.norm(v2)
-        
-        if norm_v1 == 0 or norm_v2 == 0:
-            return 0.0
-            
-        angle_rad = np.arccos(np.clip(dot_product / (norm_v1 * norm_v2), -1.0, 1.0))
-        return np.degrees(angle_rad)
-
-    def _calculate_enhanced_posture_metrics(self, landmarks, image_shape) -> Dict:
+    def _calculate_enhanced_posture_metrics(self, landmarks: np.ndarray, image_shape) -> Dict:
         """
         Calcula métricas aprimoradas de postura com base nas três vistas
+        (ver services/posture_metrics.py)
         """
         height, width = image_shape[:2]
-        
-        # Função auxiliar para obter coordenadas normalizadas
-        def get_coords(landmark_name):
-            lm = landmarks[getattr(self.mp_pose.PoseLandmark, landmark_name)]
-            return (lm.x * width, lm.y * height)
+        return self.score_landmarks(landmarks, width, height)[0]
 
-        metrics = {}
-        
-        # --- MÉTRICAS GLOBAIS E VISTA LATERAL (Perfil) ---
-        
-        # 1. Projeção Anterior da Cabeça (Head Forward Posture)
-        ear_avg = ((landmarks[self.mp_pose.PoseLandmark.LEFT_EAR].x + landmarks[self.mp_pose.PoseLandmark.RIGHT_EAR].x) / 2,
-                   (landmarks[self.mp_pose.PoseLandmark.LEFT_EAR].y + landmarks[self.mp_pose.PoseLandmark.RIGHT_EAR].y) / 2)
-        shoulder_avg = ((landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER].x + landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER].x) / 2,
-                        (landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER].y + landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER].y) / 2)
-        
-        head_forward_distance = abs(ear_avg[0] - shoulder_avg[0]) * width
-        metrics['head_forward_distance'] = head_forward_distance
-        metrics['head_alignment_score'] = max(0, 100 - (head_forward_distance * 1.5))
-        
-        # 2. Curvatura Cervical (Ângulo entre Orelha, Ombro e Quadril - Simulado pela relação)
-        # O MediaPipe Pose não é ideal para curvaturas em perfil, mas podemos usar a relação entre pontos.
-        # Cabeça: anteriorizada ou alinhada ao tronco.
-        # Pescoço e cervical: retificação ou hiperlordose.
-        
-        # 3. Anteversão/Retroversão Pélvica (Hip Angle - Simulado)
-        # Usando o ângulo entre ombro, quadril e joelho (em perfil)
-        # Como a imagem não especifica a vista, a análise será mais robusta para a vista frontal/posterior.
-        
-        # 4. Hiperextensão/Semiflexão dos Joelhos
-        # Ângulo do joelho (quadril, joelho, tornozelo) - idealmente em perfil
-        # Para simplificar, vamos focar em métricas mais robustas para as vistas fornecidas.
-        
-        # --- NOVAS MÉTRICAS VISTA ANTERIOR (Frente) ---
-        
-        # 5. Inclinação/Rotação da Cabeça (Head Tilt)
-        left_ear_c = get_coords('LEFT_EAR')
-        right_ear_c = get_coords('RIGHT_EAR')
-        
-        head_tilt_angle = math.degrees(math.atan2(
-            (right_ear_c[1] - left_ear_c[1]),
-            (right_ear_c[0] - left_ear_c[0])
-        ))
-        metrics['head_tilt_angle'] = abs(head_tilt_angle)
-        
-        # 6. Altura dos Ombros (Shoulder Height Difference)
-        left_shoulder_c = get_coords('LEFT_SHOULDER')
-        right_shoulder_c = get_coords('RIGHT_SHOULDER')
-        
-        shoulder_height_diff = abs(left_shoulder_c[1] - right_shoulder_c[1])
-        metrics['shoulder_height_difference'] = shoulder_height_diff
-        
-        # 7. Desalinhamento das Clavículas e Escápulas (Simulado pela diferença de altura dos ombros e hips)
-        # Clavículas e escápulas: desalinhadas.
-        # Usar a métrica de ombros e quadris para inferir.
-        
-        # 8. Rotação do Tronco (Simulado pela diferença lateral entre ombros e quadris)
-        left_hip_c = get_coords('LEFT_HIP')
-        right_hip_c = get_coords('RIGHT_HIP')
-        
-        shoulder_mid_x = (left_shoulder_c[0] + right_shoulder_c[0]) / 2
-        hip_mid_x = (left_hip_c[0] + right_hip_c[0]) / 2
-        
-        trunk_rotation_offset = abs(shoulder_mid_x - hip_mid_x)
-        metrics['trunk_rotation_offset'] = trunk_rotation_offset
-        
-        # 9. Diferença de Altura dos Quadris (Hip Height Difference)
-        hip_height_diff = abs(left_hip_c[1] - right_hip_c[1])
-        metrics['hip_height_difference'] = hip_height_diff
-        
-        # 10. Genu Valgo (em “X”) ou Varo (em “O”)
-        # Ângulo entre Quadril, Joelho e Tornozelo (vista frontal)
-        left_knee_c = get_coords('LEFT_KNEE')
-        left_ankle_c = get_coords('LEFT_ANKLE')
-        
-        right_knee_c = get_coords('RIGHT_KNEE')
-        right_ankle_c = get_coords('RIGHT_ANKLE')
-        
-        # Ângulo QJT (Quadril-Joelho-Tornozelo)
-        left_knee_angle = self._calculate_angle(left_hip_c, left_knee_c, left_ankle_c)
-        right_knee_angle = self._calculate_angle(right_hip_c, right_knee_c, right_ankle_c)
-        
-        metrics['left_knee_angle'] = left_knee_angle
-        metrics['right_knee_angle'] = right_knee_angle
-        
-        # 11. Pés (Apoio desigual, rotação externa/interna, arco plantar alterado)
-        # O MediaPipe não fornece landmarks de pé ideais para análise de arco plantar.
-        # Vamos usar a distância entre os tornozelos para inferir.
-        
-        # --- NOVAS MÉTRICAS VISTA POSTERIOR (Costas) ---
-        
-        # 12. Alinhamento da Coluna (Escoliose ou desvio lateral)
-        # Desvio lateral da linha central (simulado pela diferença de altura dos ombros e quadris)
-        metrics['spinal_lateral_deviation'] = (shoulder_height_diff + hip_height_diff) / 2
-        
-        # 13. Rotação Interna ou Externa dos Joelhos (Usa os ângulos QJT já calculados)
-        # O ângulo QJT (normalmente entre 170-180 graus) pode indicar desvios.
-        
-        # 14. Calcâneos (Valgo ou Varo)
-        # Requer landmarks de calcanhar e tornozelo que o MediaPipe não fornece com precisão para essa análise.
-        # Vamos inferir a partir do alinhamento do tornozelo.
-        
-        # --- CÁLCULO DE SCORES E CLASSIFICAÇÃO (Atualizado) ---
-        
-        # Score de Alinhamento Lateral (Vistas Frontal/Posterior)
-        lateral_misalignment = (
-            metrics['head_tilt_angle'] + 
-            metrics['shoulder_height_difference'] + 
-            metrics['hip_height_difference'] + 
-            metrics['trunk_rotation_offset']
-        )
-        metrics['lateral_alignment_score'] = max(0, 100 - (lateral_misalignment * 5))
-        
-        # Score de Alinhamento Vertical (Vista Lateral)
-        # Reutilizando a lógica original do alinhamento vertical
-        head_x = landmarks[self.mp_pose.PoseLandmark.NOSE].x
-        shoulder_x = shoulder_avg[0]
-        hip_x = hip_mid_x / width # Normalizar novamente
-        ankle_x = (landmarks[self.mp_pose.PoseLandmark.LEFT_ANKLE].x + landmarks[self.mp_pose.PoseLandmark.RIGHT_ANKLE].x) / 2
-        
-        head_shoulder_offset = abs(head_x - shoulder_x) * width
-        shoulder_hip_offset = abs(shoulder_x - hip_x) * width
-        hip_ankle_offset = abs(hip_x - ankle_x) * width
-        
-        total_vertical_deviation = head_shoulder_offset + shoulder_hip_offset + hip_ankle_offset
-        metrics['vertical_alignment_score'] = max(0, 100 - (total_vertical_deviation * 2))
-        
-        # Score de Desvios de Membros Inferiores
-        knee_deviation = abs(180 - left_knee_angle) + abs(180 - right_knee_angle)
-        metrics['lower_limb_score'] = max(0, 100 - (knee_deviation * 5))
-        
-        # Score Geral de Postura (Atualizado com novos pesos)
-        scores = [
-            metrics['head_alignment_score'],
-            metrics['lateral_alignment_score'],
-            metrics['vertical_alignment_score'],
-            metrics['lower_limb_score']
-        ]
-        
-        weights = [0.25, 0.30, 0.30, 0.15]
-        metrics['overall_posture_score'] = sum(score * weight for score, weight in zip(scores, weights))
-        
-        # Classificação (Mantida)
-        overall_score = metrics['overall_posture_score']
-        if overall_score >= 85:
-            metrics['posture_classification'] = "Excelente"
-            metrics['posture_color'] = "#28a745"
-            metrics['posture_icon'] = "🟢"
-        elif overall_score >= 70:
-            metrics['posture_classification'] = "Boa"
-            metrics['posture_color'] = "#4ecdc4"
-            metrics['posture_icon'] = "🔵"
-        elif overall_score >= 50:
-            metrics['posture_classification'] = "Regular"
-            metrics['posture_color'] = "#ffc107"
-            metrics['posture_icon'] = "🟡"
-        elif overall_score >= 30:
-            metrics['posture_classification'] = "Ruim"
-            metrics['posture_color'] = "#fd7e14"
-            metrics['posture_icon'] = "🟠"
-        else:
-            metrics['posture_classification'] = "Crítica"
-            metrics['posture_color'] = "#dc3545"
-            metrics['posture_icon'] = "🔴"
-        
-        # 15. Fatores de Risco (Atualizado)
-        metrics['risk_factors'] = self._identify_risk_factors(metrics)
-        
-        return metrics
+    def score_landmarks(self, landmarks: np.ndarray, width, height) -> List[Dict]:
+        """Métricas completas de um esqueleto ou de um lote (ver services/scoring.py)"""
+        return score_landmarks(landmarks, width, height, self.analysis_params)
 
     def _identify_risk_factors(self, metrics: Dict) -> List[Dict]:
-        """Identifica fatores de risco baseados nas novas métricas"""
-        risk_factors = []
-        
-        # Vista Lateral
-        if metrics['head_forward_distance'] > self.analysis_params['head_forward_threshold']:
-            risk_factors.append({
-                "factor": "Projeção anterior da cabeça",
-                "severity": "Alto" if metrics['head_forward_distance'] > 50 else "Médio",
-                "description": "Pode causar dores no pescoço e tensão muscular (Vista Lateral)"
-            })
-        
-        # Vista Anterior/Posterior
-        if metrics['head_tilt_angle'] > self.analysis_params['shoulder_slope_threshold']: # Reutilizando o threshold de inclinação
-            risk_factors.append({
-                "factor": "Inclinação/Rotação da Cabeça",
-                "severity": "Alto" if metrics['head_tilt_angle'] > 10 else "Médio",
-                "description": "Desvio de alinhamento lateral da cabeça (Vista Frontal/Posterior)"
-            })
-            
-        if metrics['shoulder_height_difference'] > self.analysis_params['vertical_alignment_threshold']:
-            risk_factors.append({
-                "factor": "Assimetria dos Ombros",
-                "severity": "Alto" if metrics['shoulder_height_difference'] > 50 else "Médio",
-                "description": "Diferença de altura entre os ombros, sugerindo desequilíbrio (Vista Frontal/Posterior)"
-            })
-            
-        if metrics['hip_height_difference'] > self.analysis_params['vertical_alignment_threshold']:
-            risk_factors.append({
-                "factor": "Assimetria Pélvica",
-                "severity": "Alto" if metrics['hip_height_difference'] > 50 else "Médio",
-                "description": "Diferença de altura entre as cristas ilíacas (Vista Frontal/Posterior)"
-            })
-        
-        # Membros Inferiores
-        if abs(180 - metrics['left_knee_angle']) > self.analysis_params['knee_valgus_varus_threshold'] or \
-           abs(180 - metrics['right_knee_angle']) > self.analysis_params['knee_valgus_varus_threshold']:
-            risk_factors.append({
-                "factor": "Desvio de Eixo dos Joelhos",
-                "severity": "Médio",
-                "description": "Indícios de Genu Valgo ou Varo (Vista Frontal)"
-            })
-            
-        # Adicionar mais fatores de risco conforme a necessidade (ex: rotação de tronco)
-        
-        return risk_factors
-
-    def _draw_enhanced_posture_analysis(self, image: np.ndarray, results, metrics: Dict) -> np.ndarray:
-        # Manter a função de desenho original por enquanto, pois o foco é a lógica de análise.
-        annotated_image = image.copy()
-        
-        self.mp_drawing.draw_landmarks(
-            annotated_image,
-            results.pose_landmarks,
-            self.mp_pose.POSE_CONNECTIONS,
-            landmark_drawing_spec=self.mp_drawing_styles.get_default_pose_landmarks_style()
-        )
-        
-        landmarks = results.pose_landmarks.landmark
-        height, width = image.shape[:2]
-        
-        # Linha vertical de referência (linha de gravidade)
-        ankle_avg_x = (landmarks[self.mp_pose.PoseLandmark.LEFT_ANKLE].x + 
-                      landmarks[self.mp_pose.PoseLandmark.RIGHT_ANKLE].x) / 2
-        
-        cv2.line(annotated_image, 
-                (int(ankle_avg_x * width), 0), 
-                (int(ankle_avg_x * width), height), 
-                (255, 255, 0), 2)
-        
-        # Linha horizontal dos ombros
-        left_shoulder = landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER]
-        right_shoulder = landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER]
-        cv2.line(annotated_image,
-                (int(left_shoulder.x * width), int(left_shoulder.y * height)),
-                (int(right_shoulder.x * width), int(right_shoulder.y * height)),
-                (255, 0, 255), 2)
-        
-        # Linha horizontal dos quadris
-        left_hip = landmarks[self.mp_pose.PoseLandmark.LEFT_HIP]
-        right_hip = landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP]
-        cv2.line(annotated_image,
-                (int(left_hip.x * width), int(left_hip.y * height)),
-                (int(right_hip.x * width), int(right_hip.y * height)),
-                (0, 255, 255), 2)
-        
-        # Adicionar informações detalhadas
-        info_box_height = 200 # Aumentar para caber mais métricas
-        overlay = annotated_image.copy()
-        cv2.rectangle(overlay, (10, 10), (450, info_box_height), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.7, annotated_image, 0.3, 0, annotated_image)
-        
-        # Texto com métricas
-        y_offset = 35
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.6
-        color = (255, 255, 255)
-        thickness = 2
-        
-        cv2.putText(annotated_image, f"Score Geral: {metrics.get('overall_posture_score', 0):.1f}%", 
-                   (15, y_offset), font, font_scale, color, thickness)
-        y_offset += 25
-        
-        cv2.putText(annotated_image, f"Classificacao: {metrics.get('posture_classification', 'N/A')}", 
-                   (15, y_offset), font, font_scale, color, thickness)
-        y_offset += 25
-        
-        cv2.putText(annotated_image, f"Cabeca (Lateral): {metrics.get('head_alignment_score', 0):.1f}%", 
-                   (15, y_offset), font, font_scale, color, thickness)
-        y_offset += 25
-        
-        cv2.putText(annotated_image, f"Lateral (Assimetria): {metrics.get('lateral_alignment_score', 0):.1f}%", 
-                   (15, y_offset), font, font_scale, color, thickness)
-        y_offset += 25
-
-        cv2.putText(annotated_image, f"Vertical (Perfil): {metrics.get('vertical_alignment_score', 0):.1f}%", 
-                   (15, y_offset), font, font_scale, color, thickness)
-        y_offset += 25
-
-        cv2.putText(annotated_image, f"Membros Inf.: {metrics.get('lower_limb_score', 0):.1f}%", 
-                   (15, y_offset), font, font_scale, color, thickness)
-        
-        return annotated_image
+        return identify_risk_factors(metrics, self.analysis_params)
 
     def _generate_comprehensive_report(self, metrics: Dict) -> Dict:
-        """
-        Gera um relatório abrangente da análise postural (Atualizado para as novas métricas)
-        """
-        report = {
-            "summary": {
-                "overall_score": metrics['overall_posture_score'],
-                "classification": metrics['posture_classification'],
-                "color": metrics['posture_color'],
-                "icon": metrics['posture_icon']
-            },
-            "details": [],
-            "recommendations": [],
-            "risk_factors": metrics['risk_factors'],
-            "priority_areas": []
-        }
-        
-        # Análise detalhada de cada área (Atualizada)
-        areas = [
-            {
-                "name": "Alinhamento da Cabeça (Lateral)",
-                "score": metrics['head_alignment_score'],
-                "threshold": 70,
-                "good_desc": "Posicionamento adequado da cabeça em relação aos ombros (Vista Lateral)",
-                "poor_desc": f"Projeção anterior da cabeça detectada ({metrics['head_forward_distance']:.1f}px). Risco de hiperlordose cervical.",
-                "recommendations": [
-                    "Pratique exercícios de fortalecimento dos músculos cervicais profundos",
-                    "Realize alongamentos dos músculos peitorais e suboccipitais",
-                    "Mantenha consciência postural durante atividades diárias"
-                ]
-            },
-            {
-                "name": "Assimetria Lateral (Frontal/Posterior)",
-                "score": metrics['lateral_alignment_score'],
-                "threshold": 70,
-                "good_desc": "Boa simetria e alinhamento lateral",
-                "poor_desc": f"Assimetria detectada: Ombros ({metrics['shoulder_height_difference']:.1f}px) ou Quadris ({metrics['hip_height_difference']:.1f}px) desalinhados. Risco de escoliose funcional.",
-                "recommendations": [
-                    "Realize exercícios de fortalecimento unilateral para corrigir desequilíbrios",
-                    "Pratique atividades que promovam simetria corporal",
-                    "Evite carregar peso sempre do mesmo lado"
-                ]
-            },
-            {
-                "name": "Alinhamento Vertical (Perfil)",
-                "score": metrics['vertical_alignment_score'],
-                "threshold": 70,
-                "good_desc": "Excelente alinhamento da linha de gravidade corporal",
-                "poor_desc": f"Desvio no alinhamento vertical ({metrics['vertical_alignment_score']:.1f}%). Risco de sobrecarga na coluna vertebral.",
-                "recommendations": [
-                    "Fortaleça os músculos do core (abdominais e lombares)",
-                    "Pratique exercícios de propriocepção e equilíbrio",
-                    "Trabalhe a consciência corporal com exercícios específicos"
-                ]
-            },
-            {
-                "name": "Alinhamento dos Membros Inferiores",
-                "score": metrics['lower_limb_score'],
-                "threshold": 70,
-                "good_desc": "Alinhamento adequado dos joelhos e tornozelos (Vista Frontal)",
-                "poor_desc": f"Desvios no eixo dos joelhos (Valgo/Varo) detectados. Risco de problemas articulares.",
-                "recommendations": [
-                    "Fortaleça os músculos do quadríceps e glúteos",
-                    "Realize exercícios de estabilização do joelho e tornozelo",
-                    "Considere avaliação ortopédica e/ou fisioterapêutica para análise de marcha"
-                ]
-            }
-        ]
-        
-        # Processar cada área
-        for area in areas:
-            status = "Bom" if area["score"] >= area["threshold"] else "Atenção necessária"
-            description = area["good_desc"] if area["score"] >= area["threshold"] else area["poor_desc"]
-            
-            report['details'].append({
-                "area": area["name"],
-                "score": area["score"],
-                "status": status,
-                "description": description
-            })
-            
-            # Adicionar recomendações se necessário
-            if area["score"] < area["threshold"]:
-                report['recommendations'].extend(area["recommendations"])
-                report['priority_areas'].append(area["name"])
-        
-        # Remover recomendações duplicadas
-        report['recommendations'] = list(set(report['recommendations']))
-        
-        # Adicionar recomendações gerais baseadas na classificação
-        if metrics['overall_posture_score'] < 50:
-            report['recommendations'].insert(0, "Considere consultar um fisioterapeuta para avaliação detalhada")
-            report['recommendations'].append("Implemente pausas regulares durante atividades prolongadas")
-        
-        return report
+        return generate_report(metrics)
 
     def _calculate_trends(self, metrics: Dict, user_id: Optional[str]) -> Dict:
         # Simulado
@@ -604,44 +298,20 @@ class PostureAnalyzerV2:
             "total_analyses": 3
         }
     
-    def _calculate_confidence_scores(self, landmarks) -> Dict:
-        # Mantido do original
-        confidence_scores = {}
+    def _calculate_confidence_scores(self, landmarks: np.ndarray) -> Dict:
+        # Visibilidade média dos landmarks de cada região
         regions = {
-            "head": [self.mp_pose.PoseLandmark.NOSE, self.mp_pose.PoseLandmark.LEFT_EAR, self.mp_pose.PoseLandmark.RIGHT_EAR],
-            "shoulders": [self.mp_pose.PoseLandmark.LEFT_SHOULDER, self.mp_pose.PoseLandmark.RIGHT_SHOULDER],
-            "torso": [self.mp_pose.PoseLandmark.LEFT_HIP, self.mp_pose.PoseLandmark.RIGHT_HIP],
-            "legs": [self.mp_pose.PoseLandmark.LEFT_KNEE, self.mp_pose.PoseLandmark.RIGHT_KNEE, 
-                    self.mp_pose.PoseLandmark.LEFT_ANKLE, self.mp_pose.PoseLandmark.RIGHT_ANKLE]
+            "head": [lm.NOSE, lm.LEFT_EAR, lm.RIGHT_EAR],
+            "shoulders": [lm.LEFT_SHOULDER, lm.RIGHT_SHOULDER],
+            "torso": [lm.LEFT_HIP, lm.RIGHT_HIP],
+            "legs": [lm.LEFT_KNEE, lm.RIGHT_KNEE, lm.LEFT_ANKLE, lm.RIGHT_ANKLE]
         }
         
-        for region, landmark_indices in regions.items():
-            visibilities = [landmarks[idx].visibility for idx in landmark_indices]
-            confidence_scores[region] = sum(visibilities) / len(visibilities)
-        
-        return confidence_scores
-    
-    def _landmarks_to_dict(self, landmarks) -> List[Dict]:
-        # Mantido do original
-        return [
-            {
-                "id": i,
-                "name": self.mp_pose.PoseLandmark(i).name,
-                "x": landmark.x,
-                "y": landmark.y,
-                "z": landmark.z,
-                "visibility": landmark.visibility
-            }
-            for i, landmark in enumerate(landmarks)
-        ]
-    
-    def _image_to_base64(self, image: np.ndarray) -> str:
-        # Mantido do original
-        image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
-        _, buffer = cv2.imencode('.jpg', image_bgr, encode_param)
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
-        return f"data:image/jpeg;base64,{image_base64}"
+        visibility = landmarks[:, lm.VISIBILITY].tolist()
+        return {
+            region: sum(visibility[idx] for idx in landmark_indices) / len(landmark_indices)
+            for region, landmark_indices in regions.items()
+        }
     
     def get_analysis_summary(self, metrics: Dict) -> str:
         # Mantido do original
@@ -661,11 +331,30 @@ class PostureAnalyzerV2:
         
         return summary
 
-# Instância global do analisador
-posture_analyzer_v2 = PostureAnalyzerV2()
+# Instância global do analisador, criada no primeiro uso: carregar o grafo do
+# MediaPipe leva segundos e não deve atrasar a inicialização da aplicação
+_posture_analyzer = None
+_posture_analyzer_lock = threading.Lock()
+
+def get_posture_analyzer() -> PostureAnalyzerV2:
+    global _posture_analyzer
+    if _posture_analyzer is None:
+        with _posture_analyzer_lock:
+            if _posture_analyzer is None:
+                started = time.perf_counter()
+                _posture_analyzer = PostureAnalyzerV2()
+                logger.info(f"Analisador postural carregado em {time.perf_counter() - started:.2f}s")
+    return _posture_analyzer
+
+def __getattr__(name):
+    # Compatibilidade com `from posture_analysis_v2 import posture_analyzer_v2`
+    if name == 'posture_analyzer_v2':
+        return get_posture_analyzer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-def analyze_posture_quick_v2(image_base64: str, user_id: Optional[str] = None) -> Dict:
-    return posture_analyzer_v2.analyze_posture_from_base64(image_base64, user_id)
+def analyze_posture_quick_v2(image_base64: str, user_id: Optional[str] = None,
+                             quality: Optional[str] = None, render: str = 'full') -> Dict:
+    return get_posture_analyzer().analyze_posture_from_base64(image_base64, user_id, quality, render)
 
 def health_check_v2() -> Dict:
     try:
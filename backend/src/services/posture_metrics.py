@@ -0,0 +1,144 @@
+"""
+Cálculo vetorizado das métricas posturais.
+
+compute_metrics() recebe um esqueleto (33, 4) ou um lote (N, 33, 4) de
+landmarks (ver services/landmarks.py) e calcula todos os ângulos e scores
+com operações NumPy sobre o lote inteiro, em float64 e na mesma ordem de
+operações do cálculo original feito ponto a ponto. O resultado de um
+esqueleto não depende do lote em que ele é calculado: uma foto analisada
+agora e o mesmo esqueleto recalculado depois junto com milhares de outros
+dão exatamente os mesmos valores. Em relação ao cálculo antigo (np.dot e
+math.atan2 por ponto) a diferença é só de arredondamento, abaixo de 1e-8.
+"""
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+from .landmarks import (X, Y, NOSE, LEFT_EAR, RIGHT_EAR, LEFT_SHOULDER, RIGHT_SHOULDER,
+                        LEFT_HIP, RIGHT_HIP, LEFT_KNEE, RIGHT_KNEE, LEFT_ANKLE, RIGHT_ANKLE)
+
+# Pesos do score geral: cabeça, alinhamento lateral, alinhamento vertical, membros inferiores
+SCORE_WEIGHTS = (0.25, 0.30, 0.30, 0.15)
+# (score mínimo, classificação, cor, ícone), do melhor para o pior
+CLASSIFICATIONS = (
+    (85, "Excelente", "#28a745", "🟢"),
+    (70, "Boa", "#4ecdc4", "🔵"),
+    (50, "Regular", "#ffc107", "🟡"),
+    (30, "Ruim", "#fd7e14", "🟠"),
+    (None, "Crítica", "#dc3545", "🔴"),
+)
+
+Size = Union[int, float, np.ndarray]
+
+
+def _angles(px: np.ndarray, py: np.ndarray, first: int, vertex: int, last: int) -> np.ndarray:
+    """Ângulo em graus no vértice para cada esqueleto; 0 se algum segmento tiver comprimento zero"""
+    v1x, v1y = px[:, first] - px[:, vertex], py[:, first] - py[:, vertex]
+    v2x, v2y = px[:, last] - px[:, vertex], py[:, last] - py[:, vertex]
+    dot_product = v1x * v2x + v1y * v2y
+    norms = np.sqrt(v1x * v1x + v1y * v1y) * np.sqrt(v2x * v2x + v2y * v2y)
+    valid = norms != 0
+    cosine = np.divide(dot_product, norms, out=np.zeros_like(dot_product), where=valid)
+    return np.where(valid, np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0))), 0.0)
+
+
+def compute_metrics(landmarks: np.ndarray, width: Size, height: Size) -> Dict[str, np.ndarray]:
+    """
+    Métricas numéricas de um lote de esqueletos.
+
+    landmarks: (33, 4) ou (N, 33, 4), com x e y normalizados.
+    width, height: dimensões da imagem original, um valor para o lote inteiro
+    ou um por esqueleto (N,).
+    Retorna um dict de arrays (N,), com as chaves na ordem do resultado da análise.
+    """
+    points = np.asarray(landmarks, dtype=np.float64)
+    if points.ndim == 2:
+        points = points[np.newaxis]
+    # (1,) ou (N,): o NumPy estende um valor único para o lote inteiro
+    width = np.asarray(width, dtype=np.float64).reshape(-1)
+    height = np.asarray(height, dtype=np.float64).reshape(-1)
+
+    x = points[:, :, X]
+    y = points[:, :, Y]
+    # Coordenadas em pixels (N, 33)
+    px = x * width[:, np.newaxis]
+    py = y * height[:, np.newaxis]
+
+    metrics = {}
+
+    # Projeção anterior da cabeça (vista lateral)
+    ear_avg_x = (x[:, LEFT_EAR] + x[:, RIGHT_EAR]) / 2
+    shoulder_avg_x = (x[:, LEFT_SHOULDER] + x[:, RIGHT_SHOULDER]) / 2
+    metrics['head_forward_distance'] = np.abs(ear_avg_x - shoulder_avg_x) * width
+    metrics['head_alignment_score'] = np.maximum(0, 100 - (metrics['head_forward_distance'] * 1.5))
+
+    # Inclinação da cabeça (vista anterior)
+    metrics['head_tilt_angle'] = np.abs(np.degrees(np.arctan2(py[:, RIGHT_EAR] - py[:, LEFT_EAR],
+                                                              px[:, RIGHT_EAR] - px[:, LEFT_EAR])))
+
+    # Altura dos ombros
+    shoulder_height_diff = np.abs(py[:, LEFT_SHOULDER] - py[:, RIGHT_SHOULDER])
+    metrics['shoulder_height_difference'] = shoulder_height_diff
+
+    # Rotação do tronco (diferença lateral entre o centro dos ombros e o dos quadris)
+    shoulder_mid_x = (px[:, LEFT_SHOULDER] + px[:, RIGHT_SHOULDER]) / 2
+    hip_mid_x = (px[:, LEFT_HIP] + px[:, RIGHT_HIP]) / 2
+    metrics['trunk_rotation_offset'] = np.abs(shoulder_mid_x - hip_mid_x)
+
+    # Altura dos quadris
+    hip_height_diff = np.abs(py[:, LEFT_HIP] - py[:, RIGHT_HIP])
+    metrics['hip_height_difference'] = hip_height_diff
+
+    # Ângulo quadril-joelho-tornozelo (genu valgo/varo)
+    metrics['left_knee_angle'] = _angles(px, py, LEFT_HIP, LEFT_KNEE, LEFT_ANKLE)
+    metrics['right_knee_angle'] = _angles(px, py, RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE)
+
+    # Desvio lateral da coluna (vista posterior)
+    metrics['spinal_lateral_deviation'] = (shoulder_height_diff + hip_height_diff) / 2
+
+    # Score de alinhamento lateral (vistas frontal/posterior)
+    lateral_misalignment = (
+        metrics['head_tilt_angle'] +
+        metrics['shoulder_height_difference'] +
+        metrics['hip_height_difference'] +
+        metrics['trunk_rotation_offset']
+    )
+    metrics['lateral_alignment_score'] = np.maximum(0, 100 - (lateral_misalignment * 5))
+
+    # Score de alinhamento vertical (vista lateral)
+    head_x = x[:, NOSE]
+    hip_x = hip_mid_x / width
+    ankle_x = (x[:, LEFT_ANKLE] + x[:, RIGHT_ANKLE]) / 2
+    total_vertical_deviation = (
+        np.abs(head_x - shoulder_avg_x) * width +
+        np.abs(shoulder_avg_x - hip_x) * width +
+        np.abs(hip_x - ankle_x) * width
+    )
+    metrics['vertical_alignment_score'] = np.maximum(0, 100 - (total_vertical_deviation * 2))
+
+    # Score dos membros inferiores
+    knee_deviation = np.abs(180 - metrics['left_knee_angle']) + np.abs(180 - metrics['right_knee_angle'])
+    metrics['lower_limb_score'] = np.maximum(0, 100 - (knee_deviation * 5))
+
+    # Score geral
+    scores = (metrics['head_alignment_score'], metrics['lateral_alignment_score'],
+              metrics['vertical_alignment_score'], metrics['lower_limb_score'])
+    overall = scores[0] * SCORE_WEIGHTS[0]
+    for score, weight in zip(scores[1:], SCORE_WEIGHTS[1:]):
+        overall = overall + score * weight
+    metrics['overall_posture_score'] = overall
+
+    return metrics
+
+
+def metrics_row(metrics: Dict[str, np.ndarray], index: int = 0) -> Dict[str, float]:
+    """Métricas de um esqueleto do lote, como floats do Python (serializáveis em JSON)"""
+    return {name: float(values[index]) for name, values in metrics.items()}
+
+
+def classify(score: float) -> Tuple[str, str, str]:
+    """(classificação, cor, ícone) de um score geral"""
+    for minimum, classification, color, icon in CLASSIFICATIONS:
+        if minimum is None or score >= minimum:
+            return classification, color, icon
+
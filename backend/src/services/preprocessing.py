@@ -0,0 +1,106 @@
+"""
+Pré-processamento das imagens antes da inferência.
+
+Equaliza o contraste com CLAHE no canal L (espaço LAB), como o analisador
+sempre fez, mas sem criar uma cópia da imagem a cada etapa:
+
+- RGB -> LAB, extração do canal L, CLAHE e LAB -> RGB escrevem em buffers
+  pré-alocados por thread, reaproveitados enquanto o tamanho da imagem não muda;
+- o CLAHE é aplicado no próprio buffer do canal L, e o objeto CLAHE é criado
+  uma vez por thread (o cv2.CLAHE não pode ser usado por duas threads ao mesmo tempo);
+- no modo 'auto', a equalização é pulada quando a luminância de uma miniatura
+  da imagem mostra iluminação e contraste já adequados (o analisador repete a
+  inferência com a equalização se a detecção falhar sem ela).
+"""
+import os
+import time
+import threading
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+# 'auto' pula imagens que não precisam de equalização; 'always' e 'never' forçam
+PREPROCESS_MODE = os.environ.get('POSTURE_PREPROCESS', 'auto')
+CLAHE_CLIP_LIMIT = 2.0
+CLAHE_TILE_GRID = (8, 8)
+# No modo 'auto', imagens com luminância média nesta faixa e desvio padrão
+# a partir do mínimo são enviadas ao modelo sem equalização
+SKIP_MIN_MEAN = float(os.environ.get('POSTURE_PREPROCESS_MIN_MEAN', 70))
+SKIP_MAX_MEAN = float(os.environ.get('POSTURE_PREPROCESS_MAX_MEAN', 185))
+SKIP_MIN_STD = float(os.environ.get('POSTURE_PREPROCESS_MIN_STD', 55))
+# Lado da miniatura usada para as estatísticas de luminância
+STATS_SIZE = 64
+
+
+class ImagePreprocessor:
+    """
+    Equalização CLAHE com buffers reaproveitados.
+
+    A imagem devolvida por process() é um buffer da thread atual, válido até a
+    próxima chamada na mesma thread; quem precisar guardá-la deve copiá-la.
+    """
+
+    def __init__(self, mode: str = PREPROCESS_MODE):
+        if mode not in ('auto', 'always', 'never'):
+            raise ValueError(f"Modo de pré-processamento inválido: {mode}")
+        self.mode = mode
+        self._local = threading.local()
+
+    def cache_params(self) -> Dict:
+        """Parâmetros que mudam o resultado (entram na chave do cache de análises)"""
+        params = {'mode': self.mode, 'clip_limit': CLAHE_CLIP_LIMIT, 'tile_grid': CLAHE_TILE_GRID}
+        if self.mode == 'auto':
+            params['skip'] = [SKIP_MIN_MEAN, SKIP_MAX_MEAN, SKIP_MIN_STD]
+        return params
+
+    def _buffers(self, shape):
+        local = self._local
+        if getattr(local, 'clahe', None) is None:
+            local.clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+        if getattr(local, 'shape', None) != shape:
+            local.shape = shape
+            local.lab = np.empty(shape, np.uint8)
+            local.lightness = np.empty(shape[:2], np.uint8)
+            local.output = np.empty(shape, np.uint8)
+        return local
+
+    def needs_equalization(self, image: np.ndarray) -> bool:
+        """Se a imagem (RGB) está escura, clara demais ou com pouco contraste"""
+        if self.mode != 'auto':
+            return self.mode == 'always'
+        thumbnail = cv2.resize(image, (STATS_SIZE, STATS_SIZE), interpolation=cv2.INTER_AREA)
+        mean, std = cv2.meanStdDev(cv2.cvtColor(thumbnail, cv2.COLOR_RGB2GRAY))
+        mean, std = float(mean[0][0]), float(std[0][0])
+        return not (SKIP_MIN_MEAN <= mean <= SKIP_MAX_MEAN and std >= SKIP_MIN_STD)
+
+    def process(self, image: np.ndarray, timings: Optional[Dict] = None, force: bool = False) -> np.ndarray:
+        """
+        Retorna a imagem RGB equalizada, ou a própria imagem se a equalização
+        não for necessária (a menos que `force` seja verdadeiro). Se `timings`
+        for informado, recebe o tempo (ms) de cada etapa.
+        """
+        started = time.perf_counter()
+
+        def lap(stage):
+            nonlocal started
+            if timings is not None:
+                now = time.perf_counter()
+                timings[stage] = (now - started) * 1000
+                started = now
+
+        if not force and not self.needs_equalization(image):
+            lap('stats')
+            return image
+        lap('stats')
+
+        buffers = self._buffers(image.shape)
+        cv2.cvtColor(image, cv2.COLOR_RGB2LAB, dst=buffers.lab)
+        cv2.extractChannel(buffers.lab, 0, dst=buffers.lightness)
+        lap('to_lab')
+        buffers.clahe.apply(buffers.lightness, buffers.lightness)
+        lap('clahe')
+        cv2.insertChannel(buffers.lightness, buffers.lab, 0)
+        cv2.cvtColor(buffers.lab, cv2.COLOR_LAB2RGB, dst=buffers.output)
+        lap('to_rgb')
+        return buffers.output
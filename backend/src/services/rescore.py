@@ -0,0 +1,175 @@
+"""
+Recálculo das avaliações gravadas com as regras de pontuação atuais.
+
+Quando ANALYSIS_PARAMS, os pesos do score geral ou as faixas de
+classificação mudam (e SCORING_VERSION é incrementada), as avaliações
+antigas são atualizadas a partir dos landmarks guardados no banco, sem
+executar o modelo de novo: os esqueletos de cada lote são pontuados com uma
+única chamada ao cálculo vetorizado e comparados com as métricas gravadas em
+metricas_detalhadas. Só as avaliações cujas métricas (scores, classificação
+ou fatores de risco) mudaram são regravadas, em uma transação por lote, e na
+tabela avaliacao_metrica só são gravados os valores que mudaram (mudanças só
+nos limiares dos fatores de risco, por exemplo, não alteram nenhuma métrica).
+A leitura das fotos (para avaliações sem dimensões gravadas) e a pontuação
+ficam fora da transação de escrita.
+
+Avaliações gravadas antes de os landmarks serem guardados não podem ser
+recalculadas e são contadas como ignoradas.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from .image_store import image_store
+from .landmark_store import load_landmarks_batch
+from .scoring import SCORING_VERSION, score_landmarks, generate_report, metric_rows
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+
+
+def _image_dimensions(imagem_original) -> Optional[tuple]:
+    """Dimensões da foto original, para avaliações gravadas antes de elas serem guardadas"""
+    from .image_decode import ImageDecodeError, decode_image
+    if not image_store.exists(imagem_original):
+        return None
+    try:
+        image = decode_image(image_store.read(imagem_original), 256)
+    except ImageDecodeError:
+        return None
+    return image.width, image.height
+
+
+def _stored_metrics(value) -> Optional[Dict]:
+    """Métricas gravadas em metricas_detalhadas (None se ausentes ou ilegíveis)"""
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return None
+
+
+def rescore_avaliacoes(engine, usuario_id=None, estudante_id=None, since: Optional[datetime] = None,
+                       force: bool = False, batch_size: int = BATCH_SIZE,
+                       progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Recalcula as avaliações com versão de pontuação anterior à atual (ou
+    todas, com force=True), opcionalmente filtradas por usuário, estudante ou
+    data de criação. Retorna as contagens do recálculo; `progress` recebe as
+    contagens parciais ao fim de cada lote.
+    """
+    conditions = ['id > :last_id', '(landmarks_bin IS NOT NULL OR landmarks IS NOT NULL)']
+    params = {'version': SCORING_VERSION, 'batch_size': batch_size}
+    if not force:
+        conditions.append('(versao_pontuacao IS NULL OR versao_pontuacao < :version)')
+    if usuario_id is not None:
+        conditions.append('usuario_id = :usuario_id')
+        params['usuario_id'] = usuario_id
+    if estudante_id is not None:
+        conditions.append('estudante_id = :estudante_id')
+        params['estudante_id'] = estudante_id
+    if since is not None:
+        conditions.append('data_criacao >= :since')
+        params['since'] = since
+
+    select_batch = text(f'''
+        SELECT id, landmarks_bin, landmarks, largura_imagem, altura_imagem, imagem_original,
+            classificacao_postura, metricas_detalhadas, versao_pontuacao
+        FROM avaliacao WHERE {' AND '.join(conditions)}
+        ORDER BY id LIMIT :batch_size
+    ''')
+    update_row = text('''
+        UPDATE avaliacao SET metricas_detalhadas = :metricas, relatorio_completo = :relatorio,
+            score_geral = :score, classificacao_postura = :classificacao, versao_pontuacao = :version,
+            largura_imagem = :largura, altura_imagem = :altura
+        WHERE id = :id
+    ''')
+    update_report = text(
+        'UPDATE avaliacao SET relatorio_completo = :relatorio, versao_pontuacao = :version WHERE id = :id'
+    )
+    upsert_metric = text('''
+        INSERT INTO avaliacao_metrica (avaliacao_id, metrica, valor) VALUES (:avaliacao_id, :metrica, :valor)
+        ON CONFLICT (avaliacao_id, metrica) DO UPDATE SET valor = excluded.valor
+    ''')
+
+    counts = {'version': SCORING_VERSION, 'rescored': 0, 'skipped': 0, 'reclassified': 0, 'unchanged': 0,
+              'metrics_changed': 0}
+    last_id = 0
+    while True:
+        # Leitura e pontuação (incluindo a leitura das fotos, para avaliações
+        # sem dimensões gravadas) ficam fora da transação de escrita
+        with engine.connect() as conn:
+            rows = conn.execute(select_batch, dict(params, last_id=last_id)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        entries = []
+        skeletons = load_landmarks_batch([(row.landmarks_bin, row.landmarks) for row in rows])
+        for row, skeleton in zip(rows, skeletons):
+            size = (row.largura_imagem, row.altura_imagem)
+            if not all(size):
+                size = _image_dimensions(row.imagem_original)
+            if size is None or skeleton is None:
+                logger.warning(f"Avaliação {row.id}: landmarks ou dimensões da imagem indisponíveis")
+                counts['skipped'] += 1
+                continue
+            entries.append((row, skeleton, size))
+        if not entries:
+            continue
+
+        sizes = np.array([size for _, _, size in entries])
+        scored = score_landmarks(np.stack([skeleton for _, skeleton, _ in entries]), sizes[:, 0], sizes[:, 1])
+
+        # Só as avaliações cujas métricas mudaram são regravadas; as de outra
+        # versão com as mesmas métricas recebem apenas o relatório e a versão,
+        # e as já na versão atual (recálculo com force) não são tocadas
+        updates, reports, changed = [], [], []
+        unchanged = 0
+        for (row, _, (width, height)), metrics in zip(entries, scored):
+            stored = _stored_metrics(row.metricas_detalhadas)
+            if stored == metrics and row.largura_imagem and row.altura_imagem:
+                unchanged += 1
+                if row.versao_pontuacao != SCORING_VERSION:
+                    reports.append({'id': row.id, 'version': SCORING_VERSION,
+                                    'relatorio': json.dumps(generate_report(metrics), default=float)})
+                continue
+
+            updates.append({
+                'id': row.id,
+                'metricas': json.dumps(metrics, default=float),
+                'relatorio': json.dumps(generate_report(metrics), default=float),
+                'score': metrics['overall_posture_score'],
+                'classificacao': metrics['posture_classification'],
+                'version': SCORING_VERSION,
+                'largura': int(width),
+                'altura': int(height)
+            })
+            if metrics['posture_classification'] != row.classificacao_postura:
+                counts['reclassified'] += 1
+            changed.extend(
+                metric for metric in metric_rows(row.id, metrics)
+                if (stored or {}).get(metric['metrica']) != metric['valor']
+            )
+
+        with engine.begin() as conn:
+            if updates:
+                conn.execute(update_row, updates)
+            if reports:
+                conn.execute(update_report, reports)
+            if changed:
+                conn.execute(upsert_metric, changed)
+        counts['rescored'] += len(entries)
+        counts['unchanged'] += unchanged
+        counts['metrics_changed'] += len(changed)
+
+        if progress is not None:
+            progress(dict(counts))
+
+    logger.info(f"Recálculo (regras v{SCORING_VERSION}): {counts['rescored']} avaliações, "
+                f"{counts['reclassified']} reclassificadas, {counts['skipped']} ignoradas")
+    return counts
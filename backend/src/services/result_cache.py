@@ -0,0 +1,176 @@
+"""
+Cache de resultados de análise postural endereçado por conteúdo.
+
+A chave é o hash dos pixels decodificados junto com os parâmetros que
+influenciam o resultado, então reenviar a mesma foto devolve a análise
+anterior sem executar o MediaPipe novamente. Os resultados ficam em um
+LRU em memória e em disco (compartilhado entre processos), com limite
+de tamanho e remoção dos itens menos usados.
+"""
+import os
+import copy
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """LRU em memória + armazenamento em disco com limite de tamanho"""
+
+    def __init__(self, cache_dir: str, max_memory_items: int = 128,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image, params: Dict) -> str:
+        """Hash dos pixels da imagem (np.ndarray) + parâmetros da análise"""
+        import numpy as np
+
+        digest = hashlib.blake2b(digest_size=32)
+        digest.update(f"{image.shape}|{image.dtype}|".encode())
+        digest.update(np.ascontiguousarray(image).data)
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._memory[key])
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)  # Marca como usado recentemente para a remoção LRU em disco
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, copy.deepcopy(value))
+        return value
+
+    def put(self, key: str, value: Dict):
+        with self._lock:
+            self._remember(key, copy.deepcopy(value))
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, default=float)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o cache em disco: {str(e)}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_usage()
+            else:
+                self._disk_bytes += size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _remember(self, key: str, value: Dict):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _list_disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_disk_usage(self) -> int:
+        return sum(size for _, size, _ in self._list_disk_entries())
+
+    def _evict_disk(self):
+        """Remove os arquivos menos usados até ficar abaixo de 90% do limite"""
+        entries = sorted(self._list_disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for _, _, path in self._list_disk_entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'memory_items': len(self._memory),
+                'disk_bytes': self._disk_bytes,
+                'evictions': self.evictions
+            }
+
+
+def _cache_from_env() -> Optional[ResultCache]:
+    if os.environ.get('POSTURE_CACHE_ENABLED', '1') == '0':
+        return None
+    return ResultCache(
+        cache_dir=os.environ.get(
+            'POSTURE_CACHE_DIR',
+            os.path.join(os.path.dirname(__file__), '..', '..', 'cache', 'analysis')
+        ),
+        max_memory_items=int(os.environ.get('POSTURE_CACHE_MEMORY_ITEMS', 128)),
+        max_disk_bytes=int(os.environ.get('POSTURE_CACHE_MAX_MB', 512)) * 1024 * 1024
+    )
+
+
+# Instância global do cache (None quando POSTURE_CACHE_ENABLED=0)
+analysis_cache = _cache_from_env()
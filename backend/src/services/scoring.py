@@ -0,0 +1,258 @@
+"""
+Regras de pontuação da análise postural.
+
+Transformam os landmarks de uma avaliação em métricas, classificação,
+fatores de risco e relatório, sem executar o modelo: são usadas tanto na
+análise de uma foto quanto no recálculo das avaliações já gravadas
+(services/rescore.py), a partir dos landmarks guardados no banco.
+
+SCORING_VERSION identifica o conjunto de regras e é gravado em cada
+avaliação (avaliacao.versao_pontuacao). Ao mudar ANALYSIS_PARAMS, os pesos
+e faixas de classificação de services/posture_metrics.py ou o relatório,
+incremente a versão e rode `flask posture rescore` (ou POST
+/api/posture/rescore) para atualizar o histórico.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .posture_metrics import SCORE_WEIGHTS, CLASSIFICATIONS, compute_metrics, metrics_row, classify
+
+SCORING_VERSION = 1
+
+# Parâmetros de análise (ajustados para as novas métricas)
+ANALYSIS_PARAMS = {
+    'head_forward_threshold': 30,  # pixels
+    'shoulder_slope_threshold': 5,  # graus
+    'vertical_alignment_threshold': 25,  # pixels
+    'confidence_threshold': 0.5,
+    'hip_slope_threshold': 3, # graus
+    'knee_valgus_varus_threshold': 5, # graus
+    'foot_arch_threshold': 10 # pixels
+}
+
+
+def scoring_rules(params: Optional[Dict] = None) -> Dict:
+    """Descrição das regras em vigor (versão, limiares, pesos e faixas de classificação)"""
+    return {
+        'version': SCORING_VERSION,
+        'analysis_params': params or ANALYSIS_PARAMS,
+        'score_weights': list(SCORE_WEIGHTS),
+        'classifications': [[minimum, classification] for minimum, classification, _, _ in CLASSIFICATIONS]
+    }
+
+
+def score_landmarks(landmarks: np.ndarray, width, height, params: Optional[Dict] = None) -> List[Dict]:
+    """
+    Métricas completas (scores, classificação e fatores de risco) de um
+    esqueleto (33, 4) ou de um lote (N, 33, 4), em uma única chamada ao
+    cálculo vetorizado. width/height: um valor ou um por esqueleto.
+    """
+    batch = compute_metrics(landmarks, width, height)
+    results = []
+    for index in range(len(batch['overall_posture_score'])):
+        metrics = metrics_row(batch, index)
+        (metrics['posture_classification'], metrics['posture_color'],
+         metrics['posture_icon']) = classify(metrics['overall_posture_score'])
+        metrics['risk_factors'] = identify_risk_factors(metrics, params)
+        results.append(metrics)
+    return results
+
+
+# Avaliação com várias fotos: vistas aceitas e, para cada métrica, as vistas em que
+# ela é medida de fato (com mais de uma, o valor é a média entre elas). As métricas de
+# perfil só fazem sentido na foto lateral; as de simetria, de frente ou de costas.
+VIEWS = ('frontal', 'lateral', 'posterior')
+METRIC_VIEWS = {
+    'head_forward_distance': ('lateral',),
+    'head_alignment_score': ('lateral',),
+    'head_tilt_angle': ('frontal', 'posterior'),
+    'shoulder_height_difference': ('frontal', 'posterior'),
+    'trunk_rotation_offset': ('frontal', 'posterior'),
+    'hip_height_difference': ('frontal', 'posterior'),
+    'left_knee_angle': ('frontal',),
+    'right_knee_angle': ('frontal',),
+    'spinal_lateral_deviation': ('posterior',),
+    'lateral_alignment_score': ('frontal', 'posterior'),
+    'vertical_alignment_score': ('lateral',),
+    'lower_limb_score': ('frontal',),
+}
+
+
+def merge_views(view_metrics: Dict[str, Dict], params: Optional[Dict] = None):
+    """
+    Combina as métricas das fotos de cada vista ({vista: métricas}) em uma
+    avaliação só: cada métrica vem das vistas em METRIC_VIEWS (ou, se nenhuma
+    delas foi enviada, da média de todas), e o score geral, a classificação e
+    os fatores de risco são recalculados a partir delas.
+    Retorna (métricas, {métrica: vistas usadas}).
+    """
+    metrics = {}
+    sources = {}
+    for name, views in METRIC_VIEWS.items():
+        used = [view for view in views if view in view_metrics] or list(view_metrics)
+        metrics[name] = sum(view_metrics[view][name] for view in used) / len(used)
+        sources[name] = used
+
+    scores = (metrics['head_alignment_score'], metrics['lateral_alignment_score'],
+              metrics['vertical_alignment_score'], metrics['lower_limb_score'])
+    metrics['overall_posture_score'] = sum(score * weight for score, weight in zip(scores, SCORE_WEIGHTS))
+    (metrics['posture_classification'], metrics['posture_color'],
+     metrics['posture_icon']) = classify(metrics['overall_posture_score'])
+    metrics['risk_factors'] = identify_risk_factors(metrics, params)
+    return metrics, sources
+
+
+def metric_rows(avaliacao_id, metrics):
+    """Linhas de avaliacao_metrica com as métricas numéricas de uma análise"""
+    return [
+        {'avaliacao_id': avaliacao_id, 'metrica': name, 'valor': float(value)}
+        for name, value in metrics.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+
+
+def identify_risk_factors(metrics: Dict, params: Optional[Dict] = None) -> List[Dict]:
+    """Identifica fatores de risco baseados nas novas métricas"""
+    params = params or ANALYSIS_PARAMS
+    risk_factors = []
+    
+    # Vista Lateral
+    if metrics['head_forward_distance'] > params['head_forward_threshold']:
+        risk_factors.append({
+            "factor": "Projeção anterior da cabeça",
+            "severity": "Alto" if metrics['head_forward_distance'] > 50 else "Médio",
+            "description": "Pode causar dores no pescoço e tensão muscular (Vista Lateral)"
+        })
+    
+    # Vista Anterior/Posterior
+    if metrics['head_tilt_angle'] > params['shoulder_slope_threshold']: # Reutilizando o threshold de inclinação
+        risk_factors.append({
+            "factor": "Inclinação/Rotação da Cabeça",
+            "severity": "Alto" if metrics['head_tilt_angle'] > 10 else "Médio",
+            "description": "Desvio de alinhamento lateral da cabeça (Vista Frontal/Posterior)"
+        })
+        
+    if metrics['shoulder_height_difference'] > params['vertical_alignment_threshold']:
+        risk_factors.append({
+            "factor": "Assimetria dos Ombros",
+            "severity": "Alto" if metrics['shoulder_height_difference'] > 50 else "Médio",
+            "description": "Diferença de altura entre os ombros, sugerindo desequilíbrio (Vista Frontal/Posterior)"
+        })
+        
+    if metrics['hip_height_difference'] > params['vertical_alignment_threshold']:
+        risk_factors.append({
+            "factor": "Assimetria Pélvica",
+            "severity": "Alto" if metrics['hip_height_difference'] > 50 else "Médio",
+            "description": "Diferença de altura entre as cristas ilíacas (Vista Frontal/Posterior)"
+        })
+    
+    # Membros Inferiores
+    if abs(180 - metrics['left_knee_angle']) > params['knee_valgus_varus_threshold'] or \
+       abs(180 - metrics['right_knee_angle']) > params['knee_valgus_varus_threshold']:
+        risk_factors.append({
+            "factor": "Desvio de Eixo dos Joelhos",
+            "severity": "Médio",
+            "description": "Indícios de Genu Valgo ou Varo (Vista Frontal)"
+        })
+        
+    # Adicionar mais fatores de risco conforme a necessidade (ex: rotação de tronco)
+    
+    return risk_factors
+
+
+def generate_report(metrics: Dict) -> Dict:
+    """
+    Gera um relatório abrangente da análise postural (Atualizado para as novas métricas)
+    """
+    report = {
+        "summary": {
+            "overall_score": metrics['overall_posture_score'],
+            "classification": metrics['posture_classification'],
+            "color": metrics['posture_color'],
+            "icon": metrics['posture_icon']
+        },
+        "details": [],
+        "recommendations": [],
+        "risk_factors": metrics['risk_factors'],
+        "priority_areas": []
+    }
+    
+    # Análise detalhada de cada área (Atualizada)
+    areas = [
+        {
+            "name": "Alinhamento da Cabeça (Lateral)",
+            "score": metrics['head_alignment_score'],
+            "threshold": 70,
+            "good_desc": "Posicionamento adequado da cabeça em relação aos ombros (Vista Lateral)",
+            "poor_desc": f"Projeção anterior da cabeça detectada ({metrics['head_forward_distance']:.1f}px). Risco de hiperlordose cervical.",
+            "recommendations": [
+                "Pratique exercícios de fortalecimento dos músculos cervicais profundos",
+                "Realize alongamentos dos músculos peitorais e suboccipitais",
+                "Mantenha consciência postural durante atividades diárias"
+            ]
+        },
+        {
+            "name": "Assimetria Lateral (Frontal/Posterior)",
+            "score": metrics['lateral_alignment_score'],
+            "threshold": 70,
+            "good_desc": "Boa simetria e alinhamento lateral",
+            "poor_desc": f"Assimetria detectada: Ombros ({metrics['shoulder_height_difference']:.1f}px) ou Quadris ({metrics['hip_height_difference']:.1f}px) desalinhados. Risco de escoliose funcional.",
+            "recommendations": [
+                "Realize exercícios de fortalecimento unilateral para corrigir desequilíbrios",
+                "Pratique atividades que promovam simetria corporal",
+                "Evite carregar peso sempre do mesmo lado"
+            ]
+        },
+        {
+            "name": "Alinhamento Vertical (Perfil)",
+            "score": metrics['vertical_alignment_score'],
+            "threshold": 70,
+            "good_desc": "Excelente alinhamento da linha de gravidade corporal",
+            "poor_desc": f"Desvio no alinhamento vertical ({metrics['vertical_alignment_score']:.1f}%). Risco de sobrecarga na coluna vertebral.",
+            "recommendations": [
+                "Fortaleça os músculos do core (abdominais e lombares)",
+                "Pratique exercícios de propriocepção e equilíbrio",
+                "Trabalhe a consciência corporal com exercícios específicos"
+            ]
+        },
+        {
+            "name": "Alinhamento dos Membros Inferiores",
+            "score": metrics['lower_limb_score'],
+            "threshold": 70,
+            "good_desc": "Alinhamento adequado dos joelhos e tornozelos (Vista Frontal)",
+            "poor_desc": f"Desvios no eixo dos joelhos (Valgo/Varo) detectados. Risco de problemas articulares.",
+            "recommendations": [
+                "Fortaleça os músculos do quadríceps e glúteos",
+                "Realize exercícios de estabilização do joelho e tornozelo",
+                "Considere avaliação ortopédica e/ou fisioterapêutica para análise de marcha"
+            ]
+        }
+    ]
+    
+    # Processar cada área
+    for area in areas:
+        status = "Bom" if area["score"] >= area["threshold"] else "Atenção necessária"
+        description = area["good_desc"] if area["score"] >= area["threshold"] else area["poor_desc"]
+        
+        report['details'].append({
+            "area": area["name"],
+            "score": area["score"],
+            "status": status,
+            "description": description
+        })
+        
+        # Adicionar recomendações se necessário
+        if area["score"] < area["threshold"]:
+            report['recommendations'].extend(area["recommendations"])
+            report['priority_areas'].append(area["name"])
+    
+    # Remover recomendações duplicadas
+    report['recommendations'] = list(set(report['recommendations']))
+    
+    # Adicionar recomendações gerais baseadas na classificação
+    if metrics['overall_posture_score'] < 50:
+        report['recommendations'].insert(0, "Considere consultar um fisioterapeuta para avaliação detalhada")
+        report['recommendations'].append("Implemente pausas regulares durante atividades prolongadas")
+    
+    return report
@@ -202,7 +202,7 @@ class APIClient:
         try:
             response = requests.post(
                 f"{self.base_url}/posture/analyze",
-                json={"image": image_base64},
+                json={"image": image_base64, "render": "full"},
                 headers=self.get_headers()
             )
             if response.status_code == 200:
@@ -213,15 +213,24 @@ class APIClient:
             return {"error": f"Erro de conexão: {str(e)}"}
     
     def get_students(self):
+        # A listagem é paginada: segue paginacao.next_after até a última página
         try:
-            response = requests.get(
-                f"{self.base_url}/estudantes",
-                headers=self.get_headers()
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {"error": response.json().get("message", "Erro ao buscar estudantes")}
+            estudantes = []
+            params = {"limit": 500}
+            while True:
+                response = requests.get(
+                    f"{self.base_url}/estudantes",
+                    params=params,
+                    headers=self.get_headers()
+                )
+                if response.status_code != 200:
+                    return {"error": response.json().get("message", "Erro ao buscar estudantes")}
+                data = response.json()
+                estudantes.extend(data.get("estudantes", []))
+                next_after = data.get("paginacao", {}).get("next_after")
+                if next_after is None:
+                    return {"estudantes": estudantes}
+                params["after"] = next_after
         except Exception as e:
             return {"error": f"Erro de conexão: {str(e)}"}
     